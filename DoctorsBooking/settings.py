@@ -73,7 +73,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
-
+    # removes itself at startup unless PROFILING_ENABLED
+    'medifiti.profiling.ProfilingMiddleware',
 ]
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
@@ -189,6 +190,12 @@ EMAIL_HOST_PASSWORD = os.environ.get('DJANGO_EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.environ.get('DJANGO_DEFAULT_FROM_EMAIL', 'no-reply@hospitalcare.local')
 SERVER_EMAIL = DEFAULT_FROM_EMAIL
 
+# Notification emails are queued in the database and delivered by
+# `manage.py send_queued_emails`. Failed sends are retried with exponential
+# backoff starting at EMAIL_QUEUE_RETRY_SECONDS, up to EMAIL_QUEUE_MAX_ATTEMPTS.
+EMAIL_QUEUE_MAX_ATTEMPTS = int(os.environ.get('EMAIL_QUEUE_MAX_ATTEMPTS', 5))
+EMAIL_QUEUE_RETRY_SECONDS = int(os.environ.get('EMAIL_QUEUE_RETRY_SECONDS', 60))
+
 # Admin recipients for notifications (comma-separated env var) or fallback
 ADMINS_ENV = os.environ.get('DJANGO_ADMINS', '')
 if ADMINS_ENV:
@@ -208,6 +215,46 @@ else:
 # secrets manager or environment-only configuration to avoid committing
 # credentials into source control.
 
+# Appointment slot length in minutes, used to expand doctors' working hours into bookable slots
+APPOINTMENT_SLOT_MINUTES = int(os.environ.get('APPOINTMENT_SLOT_MINUTES', 30))
+
+# Seconds the admin dashboard counters stay cached before being recounted
+STATS_CACHE_TIMEOUT = int(os.environ.get('STATS_CACHE_TIMEOUT', 300))
+
+# Cache backend: per-process local memory by default. Set CACHE_BACKEND=file
+# (and optionally CACHE_LOCATION) so several worker processes share one cache.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', '/var/tmp/medifiti_cache'),
+            'TIMEOUT': None,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'medifiti',
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 5000))},
+        }
+    }
+
+# Seconds public pages and fragments stay cached; edits invalidate them immediately anyway
+PUBLIC_CACHE_TIMEOUT = int(os.environ.get('PUBLIC_CACHE_TIMEOUT', 60 * 60))
+
+# Shared secret lab instruments send as `Authorization: Bearer <token>`; the status API is disabled while unset
+LAB_API_TOKEN = os.environ.get('LAB_API_TOKEN', '')
+LAB_API_MAX_BATCH = int(os.environ.get('LAB_API_MAX_BATCH', 10000))
+
+# Request profiling (see medifiti/profiling.py): per-view query counts and timings collected
+# into ViewProfile. Memory tracing and cProfile dumps add overhead and are opt-in separately.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() in ('1', 'true', 'yes')
+PROFILING_FLUSH_EVERY = int(os.environ.get('PROFILING_FLUSH_EVERY', 50))
+PROFILING_TRACE_MEMORY = os.environ.get('PROFILING_TRACE_MEMORY', 'False').lower() in ('1', 'true', 'yes')
+PROFILING_CPROFILE_DIR = os.environ.get('PROFILING_CPROFILE_DIR', '')
+
 # Custom User Model
 AUTH_USER_MODEL = 'medifiti.CustomUser'
 
@@ -1,24 +1,35 @@
-from django.contrib import admin
+import datetime
+
+from django import forms
+from django.contrib import admin, messages
+from django.db import connections
+from django.db.models import Count, F, FloatField
+from django.db.models.functions import Cast
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
 from django.utils.html import format_html
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as _
 
+from . import patient_lookup, rollups, schedules, search, transitions
 from .models import (
-    CustomUser, Patient, PatientProfile, Appointment,
-    Service, Doctor, LabSample, Contact, Facility
+    CustomUser, Patient, PatientProfile, Appointment, AppointmentStatusChange, DailyRollup, DoctorForecast,
+    Service, Doctor, DoctorWorkingHours, LabSample, LabSampleEvent, Contact, Facility, OutboundEmail, ExportJob,
+    Symptom, Department, TriageRule, ViewProfile, MaintenanceRun, normalize_sample_id,
 )
 
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
     list_display = ('username', 'email', 'role', 'is_staff', 'is_active')
-    list_filter = ('role', 'is_staff', 'is_superuser', 'is_active')
+    list_filter = ('role', 'email_verified', 'is_staff', 'is_superuser', 'is_active')
     search_fields = ('username', 'email', 'phone')
     ordering = ('username',)
 
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
-        (_('Personal info'), {'fields': ('first_name', 'last_name', 'email', 'phone')}),
+        (_('Personal info'), {'fields': ('first_name', 'last_name', 'email', 'email_verified', 'phone')}),
         (_('Role & preferences'), {'fields': ('role', 'notification_email', 'notification_method')}),
         (_('Permissions'), {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
         (_('Important dates'), {'fields': ('last_login', 'date_joined')}),
@@ -39,7 +50,8 @@ admin.site.register(CustomUser, CustomUserAdmin)
 class ServiceAdmin(admin.ModelAdmin):
     list_display = ('title', 'slug', 'active', 'created_at', 'updated_at')
     prepopulated_fields = {'slug': ('title',)}
-    search_fields = ('title', 'short_description', 'description')
+    # title and description text is matched through the search index, see get_search_results
+    search_fields = ('slug',)
     list_filter = ('active', 'created_at', 'updated_at')
     readonly_fields = ('image_preview',)
     fieldsets = (
@@ -52,14 +64,47 @@ class ServiceAdmin(admin.ModelAdmin):
         return "(No image)"
     image_preview.short_description = "Image preview"
 
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            results |= queryset.filter(pk__in=search.matching_ids(search.SERVICE, search_term))
+        return results, may_have_duplicates
+
+
+class DoctorWorkingHoursInline(admin.TabularInline):
+    model = DoctorWorkingHours
+    extra = 0
+    fields = ('weekday', 'start_time', 'end_time')
+
+    def get_queryset(self, request):
+        # the row header renders DoctorWorkingHours.__str__, which reads the doctor
+        return super().get_queryset(request).select_related('doctor')
+
 
 class AppointmentInline(admin.TabularInline):
+    """
+    Only appointments from `PAST_DAYS` ago to `schedules.UPCOMING_DAYS` ahead, so a busy
+    doctor's form stays small; DoctorAdmin links to the full history in the changelist.
+    """
+    PAST_DAYS = 7
+
     model = Appointment
     extra = 0
+    verbose_name_plural = f'Appointments (past {PAST_DAYS} days and next {schedules.UPCOMING_DAYS} days)'
+    ordering = ('appointment_date', 'appointment_time')
     fields = ('get_patient_display', 'appointment_date', 'appointment_time', 'reason', 'status')
-    readonly_fields = ('get_patient_display',)
+    # status only changes through the appointment's own admin page or actions (see medifiti.transitions)
+    readonly_fields = ('get_patient_display', 'status')
     show_change_link = True
 
+    def get_queryset(self, request):
+        today = timezone.localdate()
+        # the row header renders Appointment.__str__, which reads the doctor and profile user
+        return super().get_queryset(request).filter(
+            appointment_date__gte=today - datetime.timedelta(days=self.PAST_DAYS),
+            appointment_date__lt=today + datetime.timedelta(days=schedules.UPCOMING_DAYS),
+        ).select_related('doctor', 'patient_user', 'patient_profile__user')
+
     def get_patient_display(self, obj):
         if obj.patient_name:
             return obj.patient_name
@@ -80,14 +125,34 @@ class AppointmentInline(admin.TabularInline):
 @admin.register(Doctor)
 class DoctorAdmin(admin.ModelAdmin):
     list_display = ('name', 'specialty', 'user', 'services_list', 'created_at', 'updated_at')
-    search_fields = ('name', 'specialty', 'description', 'user__username', 'user__email', 'services__title')
+    # name, specialty, description and service titles are matched through the search index
+    search_fields = ('user__username', 'user__email')
     list_filter = ('specialty', 'created_at', 'updated_at')
-    readonly_fields = ('image_preview', 'created_at', 'updated_at')
+    readonly_fields = ('image_preview', 'appointment_history', 'created_at', 'updated_at')
     fieldsets = (
         (None, {'fields': ('user', 'name', 'specialty', 'description', 'image', 'image_preview', 'services')}),
+        ('Appointments', {'fields': ('appointment_history',)}),
     )
     filter_horizontal = ('services',)
-    inlines = [AppointmentInline]
+    inlines = [DoctorWorkingHoursInline, AppointmentInline]
+    list_select_related = ('user',)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        # only the list shows services; the change view and inlines skip the GROUP BY
+        if not match or match.url_name != f'{self.opts.app_label}_{self.opts.model_name}_changelist':
+            return queryset
+        queryset = queryset.annotate(service_count=Count('services', distinct=True))
+        if connections[queryset.db].vendor == 'postgresql':
+            from django.contrib.postgres.aggregates import StringAgg
+
+            # the titles come from the same join and GROUP BY as the count
+            return queryset.annotate(
+                service_titles=StringAgg('services__title', ', ', distinct=True, ordering='services__title'),
+            )
+        # elsewhere services_list reads the prefetched services instead of one query per row
+        return queryset.prefetch_related('services')
 
     def image_preview(self, obj):
         if obj and getattr(obj, 'image', None):
@@ -95,19 +160,63 @@ class DoctorAdmin(admin.ModelAdmin):
         return "(No image)"
     image_preview.short_description = "Image preview"
 
+    @admin.display(description='Services', ordering='service_count')
     def services_list(self, obj):
+        if hasattr(obj, 'service_titles'):
+            return obj.service_titles or ''
         return ", ".join([s.title for s in obj.services.all()]) if obj.pk else ""
-    services_list.short_description = "Services"
+
+    @admin.display(description='History')
+    def appointment_history(self, obj):
+        if not obj or not obj.pk:
+            return '-'
+        url = reverse('admin:medifiti_appointment_changelist') + f'?doctor__id__exact={obj.pk}'
+        return format_html('<a href="{}">All appointments for this doctor</a>', url)
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            results |= queryset.filter(pk__in=search.matching_ids(search.DOCTOR, search_term))
+        return results, may_have_duplicates
+
+
+class AppointmentStatusChangeInline(admin.TabularInline):
+    """Read-only status timeline; rows are only ever appended by medifiti.transitions."""
+    model = AppointmentStatusChange
+    extra = 0
+    fields = ('at', 'from_code', 'to_code', 'source', 'changed_by')
+    readonly_fields = fields
+    can_delete = False
+    verbose_name_plural = 'Status timeline'
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('changed_by')
+
+
+class AppointmentAdminForm(forms.ModelForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk and 'status' in self.fields:
+            allowed = transitions.allowed_statuses(self.instance.status)
+            self.fields['status'].choices = [
+                (status, label) for status, label in Appointment.STATUS_CHOICES if status in allowed
+            ]
 
 
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin):
+    form = AppointmentAdminForm
+    inlines = [AppointmentStatusChangeInline]
     list_display = ('id', 'doctor', 'get_patient_display', 'appointment_date', 'appointment_time', 'status', 'created_at')
     list_filter = ('status', 'appointment_date', 'doctor')
     search_fields = ('patient_name', 'patient_email', 'patient_phone', 'doctor__name', 'patient_profile__user__username')
     date_hierarchy = 'appointment_date'
     ordering = ('-appointment_date', '-appointment_time')
-    actions = ['mark_as_confirmed', 'mark_as_pending', 'mark_as_cancelled']
+    list_select_related = ('doctor', 'patient_user', 'patient_profile__user')
+    actions = ['mark_as_confirmed', 'mark_as_pending', 'mark_as_completed', 'mark_as_cancelled']
 
     def get_patient_display(self, obj):
         if obj.patient_name:
@@ -125,42 +234,124 @@ class AppointmentAdmin(admin.ModelAdmin):
         return '(guest)'
     get_patient_display.short_description = 'Patient'
 
+    def save_model(self, request, obj, form, change):
+        new_status = obj.status
+        if change and 'status' in form.changed_data:
+            # save the other edits with the stored status, then move it through the state machine
+            obj.status = obj._loaded_status
+            super().save_model(request, obj, form, change)
+            try:
+                transitions.transition(obj, new_status, user=request.user)
+            except transitions.InvalidTransition as exc:
+                self.message_user(request, exc.message, messages.ERROR)
+        else:
+            super().save_model(request, obj, form, change)
+
+    def get_urls(self):
+        return [
+            path('throughput/', self.admin_site.admin_view(self.throughput_view), name='medifiti_appointment_throughput'),
+        ] + super().get_urls()
+
+    def throughput_view(self, request):
+        """Bookings and status moves per day, read from the status timeline."""
+        try:
+            days = max(1, min(int(request.GET.get('days', 14)), 366))
+        except ValueError:
+            days = 14
+        end = timezone.localdate()
+        start = end - datetime.timedelta(days=days - 1)
+        counts = transitions.daily_throughput(start, end)
+        columns = ['booked'] + [status for status, _label in Appointment.STATUS_CHOICES]
+        rows = []
+        for offset in range(days):
+            day = end - datetime.timedelta(days=offset)
+            rows.append((day, [counts.get(day, {}).get(column, 0) for column in columns]))
+        return TemplateResponse(request, 'admin/medifiti/appointment/throughput.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Appointment throughput',
+            'days': days,
+            'headers': ['Booked'] + [label for _status, label in Appointment.STATUS_CHOICES],
+            'rows': rows,
+        })
+
+    def _transition(self, request, queryset, status):
+        # "select all" hands over the whole filtered changelist; transitions works through it in chunks
+        result = transitions.apply(queryset, status, user=request.user)
+        self.message_user(request, result.summary(), messages.WARNING if result.rejected else messages.SUCCESS)
+
     def mark_as_confirmed(self, request, queryset):
-        updated = queryset.update(status=Appointment.STATUS_CONFIRMED)
-        self.message_user(request, f"{updated} appointment(s) marked as confirmed.")
+        self._transition(request, queryset, Appointment.STATUS_CONFIRMED)
     mark_as_confirmed.short_description = "Mark selected appointment(s) as confirmed"
 
     def mark_as_pending(self, request, queryset):
-        updated = queryset.update(status=Appointment.STATUS_PENDING)
-        self.message_user(request, f"{updated} appointment(s) marked as pending.")
+        self._transition(request, queryset, Appointment.STATUS_PENDING)
     mark_as_pending.short_description = "Mark selected appointment(s) as pending"
 
+    def mark_as_completed(self, request, queryset):
+        self._transition(request, queryset, Appointment.STATUS_COMPLETED)
+    mark_as_completed.short_description = "Mark selected appointment(s) as completed"
+
     def mark_as_cancelled(self, request, queryset):
-        updated = queryset.update(status=Appointment.STATUS_CANCELLED)
-        self.message_user(request, f"{updated} appointment(s) marked as cancelled.")
+        self._transition(request, queryset, Appointment.STATUS_CANCELLED)
     mark_as_cancelled.short_description = "Mark selected appointment(s) as cancelled"
 
 
 @admin.register(Patient)
 class PatientAdmin(admin.ModelAdmin):
     list_display = ('first_name', 'last_name', 'email', 'phone_number', 'created_at')
+    # matched as prefixes through the patient lookup keys, see get_search_results
     search_fields = ('first_name', 'last_name', 'email', 'phone_number')
+    search_help_text = 'Name, email or phone number (start of a word).'
     list_filter = ('created_at',)
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=patient_lookup.matching(patient_lookup.PATIENT, search_term)), False
+
 
 @admin.register(PatientProfile)
 class PatientProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'phone', 'blood_type', 'date_registered', 'last_updated')
-    search_fields = ('user__username', 'user__email', 'phone', 'insurance_provider', 'insurance_number')
+    list_select_related = ('user',)
+    # matched as prefixes through the patient lookup keys, see get_search_results
+    search_fields = ('user__username', 'user__email', 'phone', 'insurance_number')
+    search_help_text = 'Name, username, email, phone or insurance number (start of a word).'
     readonly_fields = ('date_registered', 'last_updated')
     list_filter = ('blood_type', 'date_registered')
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=patient_lookup.matching(patient_lookup.PROFILE, search_term)), False
+
+
+class LabSampleEventInline(admin.TabularInline):
+    """Read-only status timeline; events are only ever appended."""
+    model = LabSampleEvent
+    extra = 0
+    fields = ('recorded_at', 'status', 'notes', 'source')
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(LabSample)
 class LabSampleAdmin(admin.ModelAdmin):
-    list_display = ('sample_id', 'status', 'created_at')
-    search_fields = ('sample_id', 'notes')
+    list_display = ('sample_id', 'status', 'status_changed_at', 'created_at')
+    # sample ids are matched by normalized prefix, see get_search_results
+    search_fields = ('sample_id',)
     list_filter = ('status', 'created_at')
+    readonly_fields = ('status_changed_at',)
+    inlines = [LabSampleEventInline]
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.filter(sample_key__startswith=normalize_sample_id(search_term)), False
 
 
 @admin.register(Contact)
@@ -181,4 +372,197 @@ class FacilityAdmin(admin.ModelAdmin):
         if obj and getattr(obj, 'logo', None):
             return format_html('<img src="{}" style="max-height:150px;"/>', obj.logo.url)
         return "(No logo)"
-    logo_preview.short_description = "Logo preview"
\ No newline at end of file
+    logo_preview.short_description = "Logo preview"
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject',)
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=OutboundEmail.STATUS_SENT).update(
+            status=OutboundEmail.STATUS_PENDING, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"{updated} email(s) queued for immediate retry.")
+    retry_now.short_description = "Retry selected email(s) now"
+
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'dataset', 'format', 'compress', 'status', 'rows_written', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'dataset')
+    readonly_fields = ('last_pk', 'bytes_written', 'rows_written', 'error', 'created_at', 'updated_at', 'finished_at')
+    list_select_related = ('requested_by',)
+
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    """Rows are written by `build_rollups`; the admin only shows them and the report built on them."""
+    list_display = ('day', 'metric', 'dimension', 'key', 'count')
+    list_filter = ('metric', 'dimension')
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('report/', self.admin_site.admin_view(self.report_view), name='medifiti_dailyrollup_report'),
+        ] + super().get_urls()
+
+    def report_view(self, request):
+        """Per-period counts and top doctors / services over the last `days` days, read from the rollups."""
+        try:
+            days = max(1, min(int(request.GET.get('days', rollups.DEFAULT_DAYS)), 366))
+        except ValueError:
+            days = rollups.DEFAULT_DAYS
+        period = request.GET.get('period')
+        if period not in rollups.PERIODS:
+            period = 'day' if days <= 31 else 'week'
+        end = timezone.localdate()
+        start = end - datetime.timedelta(days=days - 1)
+
+        periods = {}
+        for metric, _label in DailyRollup.METRIC_CHOICES:
+            for when, n in rollups.series(metric, start=start, end=end, period=period).get('', []):
+                periods.setdefault(when, {})[metric] = n
+        rows = [
+            (when, [counts.get(metric, 0) for metric, _label in DailyRollup.METRIC_CHOICES])
+            for when, counts in sorted(periods.items(), reverse=True)
+        ]
+
+        def ranked(dimension, limit=10):
+            top = rollups.totals(DailyRollup.METRIC_APPOINTMENTS, dimension, start, end, limit)
+            names = rollups.labels(dimension, [key for key, _n in top])
+            return [(names[key], n) for key, n in top]
+
+        return TemplateResponse(request, 'admin/medifiti/dailyrollup/report.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Activity report',
+            'days': days,
+            'period': period,
+            'periods': list(rollups.PERIODS),
+            'headers': [label for _metric, label in DailyRollup.METRIC_CHOICES],
+            'rows': rows,
+            'doctors': ranked(DailyRollup.DIMENSION_DOCTOR),
+            'services': ranked(DailyRollup.DIMENSION_SERVICE),
+            'statuses': ranked(DailyRollup.DIMENSION_STATUS),
+        })
+
+
+@admin.register(DoctorForecast)
+class DoctorForecastAdmin(admin.ModelAdmin):
+    """Rows are written by `build_forecasts`."""
+    list_display = ('doctor', 'weekday', 'hour', 'expected_bookings', 'no_show_rate', 'samples', 'built_at')
+    list_filter = ('weekday',)
+    list_select_related = ('doctor',)
+    search_fields = ('doctor__name',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MaintenanceRun)
+class MaintenanceRunAdmin(admin.ModelAdmin):
+    """Runs are started and resumed with `run_maintenance`."""
+    list_display = ('id', 'job', 'status', 'chunks_done', 'chunks_total', 'rows_processed', 'workers', 'started_at', 'finished_at')
+    list_filter = ('status', 'job')
+    readonly_fields = ('error',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class TriageRuleInline(admin.TabularInline):
+    model = TriageRule
+    extra = 1
+    fields = ('department', 'weight')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('symptom', 'department')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'department':
+            # evaluate the choices once for the formset rather than once per rendered row
+            formfield.choices = list(formfield.choices)
+        return formfield
+
+
+@admin.register(Symptom)
+class SymptomAdmin(admin.ModelAdmin):
+    list_display = ('label', 'key', 'position', 'active')
+    list_editable = ('position', 'active')
+    list_filter = ('active',)
+    search_fields = ('label', 'key')
+    prepopulated_fields = {'key': ('label',)}
+    inlines = [TriageRuleInline]
+
+
+@admin.register(Department)
+class DepartmentAdmin(admin.ModelAdmin):
+    list_display = ('name', 'service')
+    list_select_related = ('service',)
+    search_fields = ('name',)
+    autocomplete_fields = ('service',)
+
+
+@admin.register(ViewProfile)
+class ViewProfileAdmin(admin.ModelAdmin):
+    """Per-view request cost collected by the profiling middleware; sort any column to find offenders."""
+    list_display = (
+        'view_name', 'requests', 'avg_queries', 'max_queries', 'avg_db_ms', 'avg_template_ms',
+        'avg_ms', 'max_ms_display', 'max_peak_kb', 'last_seen',
+    )
+    search_fields = ('view_name',)
+
+    def get_queryset(self, request):
+        def average(field):
+            return Cast(field, FloatField()) / F('requests')
+        return super().get_queryset(request).annotate(
+            avg_queries_value=average('total_queries'),
+            avg_db_ms_value=average('total_db_ms'),
+            avg_template_ms_value=average('total_template_ms'),
+            avg_ms_value=average('total_ms'),
+        ).order_by('-avg_queries_value')
+
+    @admin.display(description='Avg queries', ordering='avg_queries_value')
+    def avg_queries(self, obj):
+        return f'{obj.avg_queries_value:.1f}'
+
+    @admin.display(description='Avg DB ms', ordering='avg_db_ms_value')
+    def avg_db_ms(self, obj):
+        return f'{obj.avg_db_ms_value:.1f}'
+
+    @admin.display(description='Avg template ms', ordering='avg_template_ms_value')
+    def avg_template_ms(self, obj):
+        return f'{obj.avg_template_ms_value:.1f}'
+
+    @admin.display(description='Avg ms', ordering='avg_ms_value')
+    def avg_ms(self, obj):
+        return f'{obj.avg_ms_value:.1f}'
+
+    @admin.display(description='Max ms', ordering='max_ms')
+    def max_ms_display(self, obj):
+        return f'{obj.max_ms:.1f}'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,142 @@
+"""
+Doctor availability: expands weekly working-hour templates into fixed-length
+slots and subtracts booked appointments.
+
+Booked appointments are loaded once per lookup (one query over the
+`appt_doctor_slot_idx` index) into a per-doctor, per-day sorted list of
+minutes, so checking a slot is a bisect rather than a database round-trip.
+With `forecasts=True` each slot also carries the `DoctorForecast` of its
+hour (one more query), for overbooking hints.
+"""
+import datetime
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import forecasting
+from .models import Appointment, Doctor, DoctorWorkingHours
+
+# Used for doctors that have no working-hour template yet: Monday-Friday 09:00-17:00.
+DEFAULT_WORKING_HOURS = [(weekday, datetime.time(9, 0), datetime.time(17, 0)) for weekday in range(5)]
+
+DEFAULT_HORIZON_DAYS = 14
+
+Slot = namedtuple('Slot', ['doctor', 'date', 'time', 'forecast'], defaults=[None])
+
+
+def slot_minutes():
+    return getattr(settings, 'APPOINTMENT_SLOT_MINUTES', 30)
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _slot_starts(start, end, length):
+    """Minute offsets of every full slot between `start` and `end`."""
+    first, last = to_minutes(start), to_minutes(end)
+    return list(range(first, last - length + 1, length))
+
+
+def working_hours_index(doctor_ids, length=None):
+    """Map doctor id -> {weekday: [slot start minutes]} from the working-hour templates."""
+    length = length or slot_minutes()
+    index = {doctor_id: defaultdict(list) for doctor_id in doctor_ids}
+    rows = DoctorWorkingHours.objects.filter(doctor_id__in=doctor_ids).values_list(
+        'doctor_id', 'weekday', 'start_time', 'end_time'
+    )
+    for doctor_id, weekday, start, end in rows:
+        index[doctor_id][weekday].extend(_slot_starts(start, end, length))
+
+    for doctor_id, days in index.items():
+        if not days:
+            for weekday, start, end in DEFAULT_WORKING_HOURS:
+                days[weekday].extend(_slot_starts(start, end, length))
+        for weekday in days:
+            days[weekday] = sorted(set(days[weekday]))
+    return index
+
+
+def booked_index(doctor_ids, start_date, end_date):
+    """Map (doctor id, date) -> sorted booked minutes, from one indexed range query."""
+    index = defaultdict(list)
+    rows = (
+        Appointment.objects
+        .filter(doctor_id__in=doctor_ids, appointment_date__range=(start_date, end_date))
+        .exclude(status=Appointment.STATUS_CANCELLED)
+        .values_list('doctor_id', 'appointment_date', 'appointment_time')
+    )
+    for doctor_id, day, time in rows:
+        index[(doctor_id, day)].append(to_minutes(time))
+    for booked in index.values():
+        booked.sort()
+    return index
+
+
+def _is_free(booked, start, length):
+    """True when no booking starts within `length` minutes either side of `start`."""
+    if not booked:
+        return True
+    pos = bisect_right(booked, start - length)
+    return pos == len(booked) or booked[pos] >= start + length
+
+
+def is_free(booked, time):
+    """True when `time` does not overlap any of the sorted `booked` minutes."""
+    return _is_free(booked, to_minutes(time), slot_minutes())
+
+
+def next_free_slots(doctors, count=5, start=None, horizon_days=DEFAULT_HORIZON_DAYS, forecasts=False):
+    """
+    Return up to `count` of the earliest free `Slot`s across `doctors`.
+
+    `start` is an aware or naive local datetime; slots before it are skipped.
+    """
+    doctors = list(doctors)
+    if not doctors or count <= 0:
+        return []
+
+    length = slot_minutes()
+    now = timezone.localtime() if start is None else start
+    first_day = now.date()
+    last_day = first_day + datetime.timedelta(days=horizon_days - 1)
+    cutoff = to_minutes(now)
+
+    doctor_ids = [doctor.pk for doctor in doctors]
+    hours = working_hours_index(doctor_ids, length)
+    booked = booked_index(doctor_ids, first_day, last_day)
+
+    found = []
+    for offset in range(horizon_days):
+        day = first_day + datetime.timedelta(days=offset)
+        for doctor in doctors:
+            day_booked = booked.get((doctor.pk, day))
+            for start_minute in hours[doctor.pk].get(day.weekday(), ()):
+                if day == first_day and start_minute < cutoff:
+                    continue
+                if _is_free(day_booked, start_minute, length):
+                    found.append((start_minute, doctor.name, Slot(doctor, day, datetime.time(*divmod(start_minute, 60)))))
+        # days are visited in order, so once enough slots are found later days cannot beat them
+        if len(found) >= count:
+            break
+    found.sort(key=lambda item: (item[2].date, item[0], item[1]))
+    slots = [slot for _start, _name, slot in found[:count]]
+    if forecasts and slots:
+        index = forecasting.forecast_index(doctor_ids)
+        slots = [
+            slot._replace(forecast=index.get((slot.doctor.pk, slot.date.weekday(), slot.time.hour)))
+            for slot in slots
+        ]
+    return slots
+
+
+def doctor_free_slots(doctor, count=5, **kwargs):
+    return next_free_slots([doctor], count=count, **kwargs)
+
+
+def specialty_free_slots(specialty, count=5, **kwargs):
+    doctors = Doctor.objects.filter(specialty__iexact=specialty).order_by('name')
+    return next_free_slots(doctors, count=count, **kwargs)
+
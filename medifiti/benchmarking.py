@@ -0,0 +1,284 @@
+"""
+Benchmark data and runner.
+
+`seed` bulk-creates a synthetic hospital (doctors, patient users with
+profiles, legacy patient records, appointments and contact messages); every
+generated row is tagged with the `bench` prefix/domain so `clear` can remove
+it again. `run` drives the hot views through the test client against the
+configured database and reports latency percentiles and query counts;
+`compare` diffs a run against a saved baseline.
+
+bulk_create bypasses signals, so seeding fills `patient_key` itself, drops
+the cached dashboard counters and, with `index=True`, rebuilds the search
+and patient lookup indexes.
+"""
+import datetime
+import random
+import statistics
+import time
+from collections import namedtuple
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import caching, patient_lookup, search, stats
+from .models import Appointment, Contact, CustomUser, Doctor, Patient, PatientProfile
+
+PREFIX = 'bench'
+EMAIL_DOMAIN = 'bench.example'
+BATCH_SIZE = 5000
+SLOTS_PER_DAY = 16
+
+FIRST_NAMES = ['Amina', 'Brian', 'Cynthia', 'David', 'Esther', 'Felix', 'Grace', 'Hassan', 'Irene', 'James',
+               'Kevin', 'Lucy', 'Mercy', 'Noah', 'Olivia', 'Peter', 'Ruth', 'Samuel', 'Tabitha', 'Victor']
+LAST_NAMES = ['Achieng', 'Barasa', 'Cheruiyot', 'Duale', 'Njeri', 'Kamau', 'Mutua', 'Odhiambo', 'Wanjiru', 'Otieno']
+SPECIALTIES = ['General Physician', 'Cardiologist', 'Dentist', 'Pediatrician', 'Dermatologist', 'Neurologist']
+STATUSES = [Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED, Appointment.STATUS_CANCELLED]
+
+Scenario = namedtuple('Scenario', 'name role url')
+
+
+def _bulk(model, objects, batch_size):
+    """bulk_create a generator of unsaved rows, one transaction per batch."""
+    created = 0
+    iterator = iter(objects)
+    while batch := list(islice(iterator, batch_size)):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+    return created
+
+
+def _name(rng):
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+
+def clear():
+    """Delete every generated row; returns the number of rows deleted."""
+    deleted = 0
+    for queryset in (
+        Appointment.objects.filter(doctor__name__startswith=f'{PREFIX} '),
+        Appointment.objects.filter(patient_key__endswith=f'@{EMAIL_DOMAIN}'),
+        Contact.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}'),
+        Patient.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}'),
+        Doctor.objects.filter(name__startswith=f'{PREFIX} '),
+        CustomUser.objects.filter(username__startswith=f'{PREFIX}_'),
+    ):
+        deleted += queryset.delete()[0]
+    stats.invalidate_appointments()
+    caching.invalidate(caching.DOCTORS)
+    return deleted
+
+
+def seed(doctors=1000, patient_users=10000, patients=500000, appointments=1000000, contacts=100000,
+         batch_size=BATCH_SIZE, random_seed=0, index=False, log=None):
+    """Generate benchmark rows; returns {model name: rows created}."""
+    rng = random.Random(random_seed)
+    log = log or (lambda message: None)
+    password = make_password(PREFIX)
+    created = {}
+    run = int(time.time())
+
+    users = (
+        CustomUser(username=f'{PREFIX}_doctor_{run}_{i}', role=CustomUser.ROLE_DOCTOR, password=password,
+                   email=f'doctor{run}.{i}@{EMAIL_DOMAIN}')
+        for i in range(doctors)
+    )
+    created['doctor users'] = _bulk(CustomUser, users, batch_size)
+    doctor_users = list(CustomUser.objects.filter(username__startswith=f'{PREFIX}_doctor_{run}_').values_list('pk', flat=True))
+    created['doctors'] = _bulk(Doctor, (
+        Doctor(user_id=user_id, name=f'{PREFIX} {" ".join(_name(rng))} {i}', specialty=rng.choice(SPECIALTIES))
+        for i, user_id in enumerate(doctor_users)
+    ), batch_size)
+    log(f"doctors: {created['doctors']}")
+
+    def patient_user(i):
+        first, last = _name(rng)
+        # verified, so their bookings below are keyed by email like a confirmed account's
+        return CustomUser(username=f'{PREFIX}_patient_{run}_{i}', role=CustomUser.ROLE_PATIENT, password=password,
+                          first_name=first, last_name=last, email=f'patient{run}.{i}@{EMAIL_DOMAIN}',
+                          email_verified=True)
+    created['patient users'] = _bulk(CustomUser, (patient_user(i) for i in range(patient_users)), batch_size)
+    patient_rows = list(
+        CustomUser.objects.filter(username__startswith=f'{PREFIX}_patient_{run}_').values_list('pk', 'email')
+    )
+    created['patient profiles'] = _bulk(PatientProfile, (
+        PatientProfile(user_id=user_id, phone=f'+2547{rng.randrange(10 ** 8):08d}') for user_id, _email in patient_rows
+    ), batch_size)
+    log(f"patient users: {created['patient users']}")
+
+    def legacy_patient(i):
+        first, last = _name(rng)
+        return Patient(first_name=first, last_name=last, age=rng.randrange(1, 95),
+                       email=f'record{run}.{i}@{EMAIL_DOMAIN}', phone_number=f'+2547{rng.randrange(10 ** 8):08d}')
+    created['patients'] = _bulk(Patient, (legacy_patient(i) for i in range(patients)), batch_size)
+    log(f"patients: {created['patients']}")
+
+    doctor_ids = list(Doctor.objects.filter(user_id__in=doctor_users).values_list('pk', flat=True))
+    if doctor_ids:
+        # spread appointments evenly around today, one per doctor slot so the active-slot constraint holds
+        days = max(1, appointments // (len(doctor_ids) * SLOTS_PER_DAY) + 1)
+        first_day = timezone.localdate() - datetime.timedelta(days=days // 2)
+
+        def appointment(i):
+            slot = i // len(doctor_ids)
+            appt = Appointment(
+                doctor_id=doctor_ids[i % len(doctor_ids)],
+                appointment_date=first_day + datetime.timedelta(days=slot // SLOTS_PER_DAY),
+                appointment_time=datetime.time(9 + (slot % SLOTS_PER_DAY) // 2, 30 * (slot % 2)),
+                status=rng.choice(STATUSES),
+                reason='Routine check-up',
+            )
+            if patient_rows and rng.random() < 0.5:
+                user_id, email = rng.choice(patient_rows)
+                appt.patient_user_id, appt.patient_key = user_id, email
+            else:
+                first, last = _name(rng)
+                appt.patient_name = f'{first} {last}'
+                appt.patient_email = f'guest{run}.{i}@{EMAIL_DOMAIN}'
+                appt.patient_phone = f'+2547{rng.randrange(10 ** 8):08d}'
+                appt.patient_key = appt.patient_email
+            return appt
+        created['appointments'] = _bulk(Appointment, (appointment(i) for i in range(appointments)), batch_size)
+        log(f"appointments: {created['appointments']}")
+
+    created['contacts'] = _bulk(Contact, (
+        Contact(full_name=' '.join(_name(rng)), email=f'contact{run}.{i}@{EMAIL_DOMAIN}', message='Benchmark message')
+        for i in range(contacts)
+    ), batch_size)
+    log(f"contacts: {created['contacts']}")
+
+    # counters are kept up to date by signals, which bulk_create skips
+    stats.invalidate_appointments()
+    stats.adjust(stats.KEY_PATIENTS, created['patients'])
+    stats.adjust(stats.KEY_CONTACTS, created['contacts'])
+    caching.invalidate(caching.DOCTORS)
+    if index:
+        search.rebuild()
+        patient_lookup.rebuild()
+    return created
+
+
+def scenarios():
+    return [
+        Scenario('admin_dashboard', 'admin', reverse('admin_dashboard')),
+        Scenario('admin_appointments', 'admin', reverse('admin_appointments')),
+        Scenario('admin_appointments_pending', 'admin', reverse('admin_appointments') + '?status=pending'),
+        Scenario('doctor_dashboard', 'doctor', reverse('doctor_dashboard')),
+        Scenario('patient_dashboard', 'patient', reverse('patient_dashboard')),
+        Scenario('appointments', 'patient', reverse('appointments')),
+        Scenario('export_patients_csv', 'admin', reverse('export_patients_csv')),
+        Scenario('admin_appointment_changelist', 'superuser', reverse('admin:medifiti_appointment_changelist')),
+        Scenario('admin_patient_changelist', 'superuser', reverse('admin:medifiti_patient_changelist')),
+        Scenario('admin_patientprofile_changelist', 'superuser', reverse('admin:medifiti_patientprofile_changelist')),
+        Scenario('admin_doctor_changelist', 'superuser', reverse('admin:medifiti_doctor_changelist')),
+        Scenario('admin_contact_changelist', 'superuser', reverse('admin:medifiti_contact_changelist')),
+    ]
+
+
+def _users():
+    """One logged-in user per role: the busiest benchmark doctor and patient, and a benchmark admin."""
+    password = make_password(PREFIX)
+    admin, _ = CustomUser.objects.get_or_create(
+        username=f'{PREFIX}_admin', defaults={'role': CustomUser.ROLE_ADMIN, 'password': password}
+    )
+    superuser, _ = CustomUser.objects.get_or_create(
+        username=f'{PREFIX}_superuser',
+        defaults={'role': CustomUser.ROLE_ADMIN, 'password': password, 'is_staff': True, 'is_superuser': True},
+    )
+    doctor = CustomUser.objects.filter(role=CustomUser.ROLE_DOCTOR, doctor_profile__isnull=False).order_by('pk').first()
+    patient = (
+        CustomUser.objects.filter(role=CustomUser.ROLE_PATIENT, appointments__isnull=False)
+        .order_by('pk').first()
+        or CustomUser.objects.filter(role=CustomUser.ROLE_PATIENT).order_by('pk').first()
+    )
+    return {'admin': admin, 'superuser': superuser, 'doctor': doctor, 'patient': patient}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _consume(response):
+    if response.streaming:
+        for _chunk in response.streaming_content:
+            pass
+    return response
+
+
+def run(repeat=20, warmup=1, only=None, log=None):
+    """Time every scenario; returns the results document (JSON-serializable)."""
+    log = log or (lambda message: None)
+    users = _users()
+    results = {}
+    for scenario in scenarios():
+        if only and scenario.name not in only:
+            continue
+        user = users[scenario.role]
+        if user is None:
+            log(f'{scenario.name}: skipped (no {scenario.role} user)')
+            continue
+        client = Client()
+        client.force_login(user)
+        for _ in range(warmup):
+            _consume(client.get(scenario.url))
+
+        timings, queries, status = [], 0, None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = _consume(client.get(scenario.url))
+                timings.append((time.perf_counter() - start) * 1000)
+            queries = max(queries, len(captured))
+            status = response.status_code
+        results[scenario.name] = {
+            'status': status,
+            'queries': queries,
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+        }
+        log(f"{scenario.name}: p50={results[scenario.name]['p50_ms']}ms queries={queries}")
+
+    return {
+        'created_at': timezone.now().isoformat(),
+        'repeat': repeat,
+        'database': connection.vendor,
+        'rows': {
+            model.__name__: model.objects.count()
+            for model in (Doctor, Patient, PatientProfile, Appointment, Contact)
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, tolerance=10.0):
+    """
+    Rows of (scenario, metric, before, after, change %, regressed) for p50, p95 and queries.
+
+    A latency counts as regressed when it grew by more than `tolerance`
+    percent; any increase in query count does.
+    """
+    rows = []
+    for name, after in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'queries'):
+            old, new = before[metric], after[metric]
+            change = ((new - old) / old * 100) if old else 0.0
+            regressed = new > old if metric == 'queries' else change > tolerance
+            rows.append((name, metric, old, new, round(change, 1), regressed))
+    return rows
@@ -0,0 +1,48 @@
+"""
+Transactional appointment booking.
+
+Every booking path goes through `book()`. It locks the doctor's row before
+reading the day's bookings, so concurrent bookings for the same doctor
+queue behind each other (locking only the existing appointments would let
+two overlapping but different times through) while bookings for other
+doctors proceed in parallel. The `unique_active_doctor_slot` constraint on
+`Appointment` is the final guard.
+"""
+from django.db import IntegrityError, transaction
+
+from . import availability
+from .models import Appointment, Doctor
+
+
+class SlotUnavailable(Exception):
+    """Raised when the requested doctor/date/time slot is already booked."""
+
+    def __init__(self, message='That time slot is already booked. Please choose another time.'):
+        super().__init__(message)
+        self.message = message
+
+
+def book(appointment):
+    """
+    Save the unsaved `appointment` if its slot is still free.
+
+    Raises `SlotUnavailable` when another active appointment for the same
+    doctor overlaps the requested slot.
+    """
+    with transaction.atomic():
+        Doctor.objects.select_for_update().only('pk').get(pk=appointment.doctor_id)
+        booked = sorted(
+            availability.to_minutes(time)
+            for time in Appointment.objects
+            .filter(doctor_id=appointment.doctor_id, appointment_date=appointment.appointment_date)
+            .exclude(status=Appointment.STATUS_CANCELLED)
+            .values_list('appointment_time', flat=True)
+        )
+        if not availability.is_free(booked, appointment.appointment_time):
+            raise SlotUnavailable()
+        try:
+            with transaction.atomic():
+                appointment.save()
+        except IntegrityError:
+            raise SlotUnavailable()
+    return appointment
@@ -0,0 +1,128 @@
+"""
+Cache layer for the public pages.
+
+Cached data is grouped ('services', 'doctors', 'facility', 'triage'). Every
+key built for a group embeds the group's current version number, and the signal
+receivers in `medifiti.signals` bump the version whenever a row of that
+group is saved or deleted, so an admin edit makes every page and fragment
+built from the old data unreachable at once; the stale entries simply age
+out. Whole pages are cached for anonymous GET requests only, since the
+navigation bar depends on the logged-in user.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .models import Doctor, Facility, Service
+
+SERVICES = 'services'
+DOCTORS = 'doctors'
+FACILITY = 'facility'
+TRIAGE = 'triage'
+
+VERSION_KEY = 'cache:version:{}'
+FRAGMENT_KEY = 'cache:fragment:{}:{}'
+PAGE_KEY = 'cache:page:{}:{}'
+
+INDEX_SERVICES = 6
+
+
+def cache_timeout():
+    return getattr(settings, 'PUBLIC_CACHE_TIMEOUT', 60 * 60)
+
+
+def _initial_version():
+    # clock-based so a flushed cache never hands out a version seen before,
+    # which matters to in-process tables keyed by version (see medifiti.triage)
+    return time.time_ns() // 1000
+
+
+def versions(groups):
+    """Current version of each group, starting new groups from the clock."""
+    keys = [VERSION_KEY.format(group) for group in groups]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            initial = _initial_version()
+            cache.add(key, initial, None)
+            found[key] = cache.get(key, initial)
+    return [found[key] for key in keys]
+
+
+def invalidate(*groups):
+    """Make everything cached for `groups` stale."""
+    for group in groups:
+        key = VERSION_KEY.format(group)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # first bump after a cold start
+            cache.set(key, _initial_version(), None)
+
+
+def _versioned(groups):
+    return '.'.join(f'{group}{version}' for group, version in zip(groups, versions(groups)))
+
+
+def fragment(name, groups, build):
+    """Return the cached value of `build()` for `name`, rebuilt after any change to `groups`."""
+    key = FRAGMENT_KEY.format(name, _versioned(groups))
+    # wrap the value so a legitimately empty result (e.g. no facility yet) is cached too
+    hit = cache.get(key)
+    if hit is not None:
+        return hit[0]
+    value = build()
+    cache.set(key, (value,), cache_timeout())
+    return value
+
+
+def active_services():
+    """Active services, most recently updated first."""
+    return fragment('services:active', [SERVICES], lambda: list(Service.objects.filter(active=True).order_by('-updated_at')))
+
+
+def newest_services():
+    """The newest few active services featured on the home page."""
+    return fragment('services:newest', [SERVICES], lambda: list(
+        Service.objects.filter(active=True).order_by('-created_at')[:INDEX_SERVICES]
+    ))
+
+
+def doctor_list():
+    return fragment('doctors:all', [DOCTORS], lambda: list(Doctor.objects.all()))
+
+
+def facilities():
+    return fragment('facility:all', [FACILITY], lambda: list(Facility.objects.order_by('pk')))
+
+
+def cached_page(*groups):
+    """
+    Cache a public view's rendered response for anonymous GET requests.
+
+    The key includes the full path and the versions of `groups`, so the page
+    is rebuilt after any change to the data it shows.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+                return view_func(request, *args, **kwargs)
+
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = PAGE_KEY.format(view_func.__name__, f'{_versioned(groups)}:{path}')
+            hit = cache.get(key)
+            if hit is not None:
+                content, content_type = hit
+                return HttpResponse(content, content_type=content_type)
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                cache.set(key, (response.content, response['Content-Type']), cache_timeout())
+            return response
+        return wrapper
+    return decorator
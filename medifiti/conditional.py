@@ -0,0 +1,98 @@
+"""
+Conditional GET support for the public pages.
+
+Each page is summarised by a stamp: `Max('updated_at')` and the row count of
+the rows it shows (the count catches deletions, which do not move the max).
+Stamps are cached in the same versioned groups as the page cache, so working
+out the validators usually costs no query at all. The ETag also covers the
+viewer, because the navigation bar differs per user; `Last-Modified` is only
+sent to anonymous visitors for the same reason. A matching request gets a
+304 before the view runs.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import caching
+from .models import Doctor, Facility, Service
+
+
+def stamp(name, group, queryset):
+    """(last updated_at, row count) for `queryset`, cached until `group` changes."""
+    def build():
+        result = queryset.aggregate(last=Max('updated_at'), count=Count('id'))
+        return result['last'], result['count']
+    return caching.fragment(f'stamp:{name}', [group], build)
+
+
+def services_stamp(request):
+    return stamp('services', caching.SERVICES, Service.objects.filter(active=True))
+
+
+def service_stamp(request, slug):
+    return stamp(f'service:{slug}', caching.SERVICES, Service.objects.filter(slug=slug, active=True))
+
+
+def doctors_stamp(request):
+    return stamp('doctors', caching.DOCTORS, Doctor.objects.all())
+
+
+def facilities_stamp(request):
+    return stamp('facilities', caching.FACILITY, Facility.objects.all())
+
+
+def facility_stamp(request, pk):
+    return stamp(f'facility:{pk}', caching.FACILITY, Facility.objects.filter(pk=pk))
+
+
+def conditional(stamp_func, detail=False, csrf=False, groups=()):
+    """
+    Send ETag/Last-Modified derived from `stamp_func` and answer matching requests with 304.
+
+    With `detail`, a missing object gets no validators so the view can 404
+    (or fall back) as usual. Pages that render a form pass `csrf`: their ETag
+    then covers the CSRF cookie and they never send Last-Modified, so a
+    revalidated copy always carries a usable token. `groups` names extra
+    cache groups the page renders (e.g. the triage form); their versions are
+    folded into the ETag and Last-Modified is not sent.
+    """
+    def get_stamp(request, *args, **kwargs):
+        # computed once per request and shared by both validator callbacks
+        if not hasattr(request, '_page_stamp'):
+            request._page_stamp = stamp_func(request, *args, **kwargs)
+        return request._page_stamp
+
+    def etag_func(request, *args, **kwargs):
+        last, count = get_stamp(request, *args, **kwargs)
+        if detail and not count:
+            return None
+        viewer = request.user.pk if request.user.is_authenticated else 'anon'
+        parts = [request.resolver_match.view_name, last.isoformat() if last else '', count, viewer]
+        if csrf:
+            parts.append(request.META.get('CSRF_COOKIE', ''))
+        parts.extend(caching.versions(groups))
+        return hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+    def last_modified_func(request, *args, **kwargs):
+        if csrf or groups or request.user.is_authenticated:
+            return None
+        return get_stamp(request, *args, **kwargs)[0]
+
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD') and response.has_header('ETag'):
+                # let browsers and the CDN keep a copy but revalidate it on every use
+                if request.user.is_authenticated:
+                    patch_cache_control(response, private=True, no_cache=True)
+                else:
+                    patch_cache_control(response, public=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
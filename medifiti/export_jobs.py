@@ -0,0 +1,99 @@
+"""
+Background export jobs.
+
+`run_export_jobs` walks the dataset in primary-key order, appends each chunk
+to a file under MEDIA_ROOT and checkpoints `last_pk` / `bytes_written` after
+every chunk. A job that was killed part-way is picked up again once it goes
+stale: the file is truncated back to the last checkpoint and the export
+continues from `last_pk`. Gzip output is written as one gzip member per
+chunk, which is still a valid .gz file and can be truncated at any
+checkpoint.
+"""
+import datetime
+import gzip
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import exports
+from .models import ExportJob
+
+CHUNK_SIZE = 5000
+
+# A running job whose checkpoint is older than this is assumed dead and resumed.
+STALE_AFTER = datetime.timedelta(minutes=10)
+
+
+def job_filename(job):
+    fmt = exports.FORMATS[job.format]
+    name = f'exports/{job.pk}-{job.dataset}.{fmt.extension}'
+    return name + '.gz' if job.compress else name
+
+
+def claim_next():
+    """Mark the oldest queued (or stale running) job as running and return it."""
+    stale = timezone.now() - STALE_AFTER
+    with transaction.atomic():
+        job = (
+            ExportJob.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[ExportJob.STATUS_QUEUED, ExportJob.STATUS_RUNNING])
+            .exclude(status=ExportJob.STATUS_RUNNING, updated_at__gte=stale)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ExportJob.STATUS_RUNNING
+        job.save(update_fields=['status', 'updated_at'])
+    return job
+
+
+def _encode(job, text):
+    data = text.encode()
+    return gzip.compress(data) if job.compress else data
+
+
+def run(job, chunk_size=CHUNK_SIZE):
+    """Write (or finish writing) `job`'s file, checkpointing after every chunk."""
+    dataset = exports.DATASETS[job.dataset]
+    fmt = exports.FORMATS[job.format]()
+    headers = dataset.headers
+
+    if not job.file:
+        job.file.name = job_filename(job)
+    path = os.path.join(settings.MEDIA_ROOT, job.file.name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    try:
+        with open(path, 'r+b' if os.path.exists(path) else 'w+b') as out:
+            # drop anything written after the last checkpoint by a worker that died mid-chunk
+            out.truncate(job.bytes_written)
+            out.seek(job.bytes_written)
+            if job.bytes_written == 0:
+                header = fmt.header(headers)
+                if header:
+                    out.write(_encode(job, header))
+
+            while True:
+                rows = dataset.rows_after(job.last_pk, chunk_size)
+                if not rows:
+                    break
+                out.write(_encode(job, ''.join(fmt.row(headers, values) for values in rows)))
+                out.flush()
+                os.fsync(out.fileno())
+                job.last_pk = rows[-1][0]
+                job.bytes_written = out.tell()
+                job.rows_written += len(rows)
+                job.save(update_fields=['file', 'last_pk', 'bytes_written', 'rows_written', 'updated_at'])
+    except Exception as exc:
+        job.status = ExportJob.STATUS_FAILED
+        job.error = str(exc)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        raise
+
+    job.status = ExportJob.STATUS_DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'finished_at', 'updated_at'])
+    return job
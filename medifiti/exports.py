@@ -0,0 +1,173 @@
+"""
+Streaming exports.
+
+Each dataset is a `values_list` projection (joins included) read with a
+server-side chunked `.iterator()`, and each format turns rows into text.
+`export_response` wraps them in a `StreamingHttpResponse`, optionally
+gzip-compressed on the fly, so memory use stays flat and the first bytes go
+out before the query has finished.
+"""
+import csv
+import json
+import zlib
+
+from django.http import StreamingHttpResponse
+
+from .models import Appointment, Contact, Patient, PatientProfile
+
+CHUNK_SIZE = 2000
+
+
+class Dataset:
+    def __init__(self, name, model, columns, ordering=('id',)):
+        self.name = name
+        self.model = model
+        # (header, values_list lookup) pairs
+        self.columns = columns
+        self.ordering = ordering
+
+    @property
+    def headers(self):
+        return [header for header, _lookup in self.columns]
+
+    def queryset(self):
+        lookups = [lookup for _header, lookup in self.columns]
+        return self.model.objects.order_by(*self.ordering).values_list(*lookups)
+
+    def rows(self, chunk_size=CHUNK_SIZE):
+        return self.queryset().iterator(chunk_size=chunk_size)
+
+    def rows_after(self, pk, limit):
+        """Next `limit` rows in primary-key order after `pk`; the first column is always the id."""
+        return list(self.queryset().filter(pk__gt=pk).order_by('pk')[:limit])
+
+
+DATASETS = {
+    'patients': Dataset('patients', Patient, [
+        ('id', 'id'),
+        ('first_name', 'first_name'),
+        ('last_name', 'last_name'),
+        ('age', 'age'),
+        ('email', 'email'),
+        ('phone_number', 'phone_number'),
+        ('location', 'location'),
+        ('created_at', 'created_at'),
+    ], ordering=('-created_at', '-id')),
+    'appointments': Dataset('appointments', Appointment, [
+        ('id', 'id'),
+        ('doctor', 'doctor__name'),
+        ('specialty', 'doctor__specialty'),
+        ('patient_name', 'patient_name'),
+        ('patient_email', 'patient_email'),
+        ('patient_phone', 'patient_phone'),
+        ('patient_first_name', 'patient_user__first_name'),
+        ('patient_last_name', 'patient_user__last_name'),
+        ('profile_first_name', 'patient_profile__user__first_name'),
+        ('profile_last_name', 'patient_profile__user__last_name'),
+        ('appointment_date', 'appointment_date'),
+        ('appointment_time', 'appointment_time'),
+        ('status', 'status'),
+        ('reason', 'reason'),
+        ('created_at', 'created_at'),
+    ]),
+    'patient_profiles': Dataset('patient_profiles', PatientProfile, [
+        ('id', 'id'),
+        ('username', 'user__username'),
+        ('email', 'user__email'),
+        ('first_name', 'user__first_name'),
+        ('last_name', 'user__last_name'),
+        ('date_of_birth', 'date_of_birth'),
+        ('gender', 'gender'),
+        ('phone', 'phone'),
+        ('city', 'city'),
+        ('country', 'country'),
+        ('blood_type', 'blood_type'),
+        ('insurance_provider', 'insurance_provider'),
+        ('date_registered', 'date_registered'),
+    ], ordering=('-date_registered', '-id')),
+    'contacts': Dataset('contacts', Contact, [
+        ('id', 'id'),
+        ('full_name', 'full_name'),
+        ('email', 'email'),
+        ('message', 'message'),
+        ('created_at', 'created_at'),
+    ], ordering=('-created_at', '-id')),
+}
+
+
+class _Echo:
+    """Pseudo-buffer for csv.writer: returns what is written instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+class CsvFormat:
+    extension = 'csv'
+    content_type = 'text/csv'
+
+    def __init__(self):
+        self.writer = csv.writer(_Echo())
+
+    def header(self, headers):
+        return self.writer.writerow(headers)
+
+    def row(self, headers, values):
+        return self.writer.writerow(['' if value is None else value for value in values])
+
+
+class NdjsonFormat:
+    extension = 'ndjson'
+    content_type = 'application/x-ndjson'
+
+    def header(self, headers):
+        return ''
+
+    def row(self, headers, values):
+        return json.dumps(dict(zip(headers, values)), default=str) + '\n'
+
+
+FORMATS = {
+    'csv': CsvFormat,
+    'ndjson': NdjsonFormat,
+}
+
+
+def stream(dataset, fmt, rows=None, chunk_size=CHUNK_SIZE, header=True):
+    """Yield encoded text in blocks of up to `chunk_size` rows."""
+    headers = dataset.headers
+    rows = dataset.rows(chunk_size) if rows is None else rows
+    block = [fmt.header(headers)] if header else []
+    for values in rows:
+        block.append(fmt.row(headers, values))
+        if len(block) >= chunk_size:
+            yield ''.join(block).encode()
+            block = []
+    if block:
+        yield ''.join(block).encode()
+
+
+def gzip_stream(chunks, level=6):
+    """Compress a byte stream incrementally into a single gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(dataset_name, format_name='csv', compress=False):
+    """Streaming download of a dataset; raises KeyError for unknown datasets or formats."""
+    dataset = DATASETS[dataset_name]
+    fmt = FORMATS[format_name]()
+    content = stream(dataset, fmt)
+    filename = f'{dataset.name}.{fmt.extension}'
+    content_type = fmt.content_type
+    if compress:
+        content = gzip_stream(content)
+        filename += '.gz'
+        content_type = 'application/gzip'
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,185 @@
+"""
+Per-doctor demand and no-show forecasts.
+
+`build` reads the last `HISTORY_WEEKS` of appointments as integer columns
+(doctor, weekday, hour, day, outcome) computed in the database and streamed in
+chunks of `CHUNK_SIZE` rows. Each chunk becomes one NumPy array and is folded
+into flat (doctor x weekday x hour) counters with `bincount`, so the Python
+work per run is per chunk, not per appointment. The result replaces
+`DoctorForecast`, one row per cell that had any bookings.
+
+Outcomes: a past appointment that was completed was attended, one that is
+still pending or confirmed was missed (nobody closed it), and cancelled ones
+freed their slot and count only towards demand. Appointments were not marked
+completed before the status timeline existed, so open appointments only
+count as missed from the doctor's first completed appointment in the window
+on; before that (or for a doctor with none) they count only towards demand,
+and such a doctor has no no-show samples to overbook on. The first completed
+date of every doctor comes from one grouped query and is compared per chunk
+in NumPy. No-show rates are smoothed
+towards the doctor's overall rate, and that towards the clinic-wide rate,
+with `PRIOR_WEIGHT` pseudo-bookings, so a quiet hour does not report 0% or
+100% from a handful of visits.
+
+`should_overbook` is the hint the slot engine attaches to free slots.
+"""
+import datetime
+from itertools import islice
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, IntegerField, Min, Value, When
+from django.db.models.functions import ExtractDay, ExtractHour, ExtractIsoWeekDay, ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from .models import Appointment, Doctor, DoctorForecast
+
+HISTORY_WEEKS = 12
+CHUNK_SIZE = 50000
+BATCH_SIZE = 2000
+PRIOR_WEIGHT = 10
+HOURS = 24
+CELLS = 7 * HOURS
+
+# hint thresholds for `should_overbook`
+OVERBOOK_NO_SHOW_RATE = 0.25
+OVERBOOK_MIN_SAMPLES = 8
+
+# OPEN (still pending or confirmed) is only read from the database; `compute` splits it into MISSED and
+# UNTRACKED, open from before anyone closed this doctor's appointments
+CANCELLED, ATTENDED, MISSED, UNTRACKED, OPEN = 0, 1, 2, 3, 4
+# day key of doctors without a completed appointment: later than any date
+NEVER = np.iinfo(np.int64).max
+
+
+def _day_key(date):
+    """Dates as yyyymmdd integers, which sort like the dates."""
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+def _in_window(start, end):
+    return Appointment.objects.filter(appointment_date__gte=start, appointment_date__lt=end).order_by()
+
+
+def _first_completed(start, end):
+    """Map doctor id -> day key of their first completed appointment dated in [start, end)."""
+    return {
+        row['doctor']: _day_key(row['first'])
+        for row in _in_window(start, end).filter(status=Appointment.STATUS_COMPLETED)
+        .values('doctor').annotate(first=Min('appointment_date'))
+    }
+
+
+def _columns(start, end):
+    """(doctor_id, weekday 0=Monday, hour, day key, outcome) of the appointments dated in [start, end)."""
+    return (
+        _in_window(start, end)
+        .annotate(
+            weekday=ExtractIsoWeekDay('appointment_date') - 1,
+            hour=ExtractHour('appointment_time'),
+            day=(
+                ExtractYear('appointment_date') * 10000 + ExtractMonth('appointment_date') * 100
+                + ExtractDay('appointment_date')
+            ),
+            outcome=Case(
+                When(status=Appointment.STATUS_COMPLETED, then=Value(ATTENDED)),
+                When(status=Appointment.STATUS_CANCELLED, then=Value(CANCELLED)),
+                default=Value(OPEN),
+                output_field=IntegerField(),
+            ),
+        )
+        .values_list('doctor_id', 'weekday', 'hour', 'day', 'outcome')
+    )
+
+
+def _chunks(rows, size):
+    iterator = rows.iterator(chunk_size=size)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield np.array(batch, dtype=np.int64)
+
+
+def _weekday_occurrences(start, end):
+    """How many times each weekday (0=Monday) falls in [start, end)."""
+    days = (end - start).days
+    return np.bincount((start.weekday() + np.arange(days)) % 7, minlength=7)
+
+
+def _smooth(missed, kept, prior):
+    return (missed + prior * PRIOR_WEIGHT) / (kept + PRIOR_WEIGHT)
+
+
+def compute(start, end, chunk_size=CHUNK_SIZE):
+    """
+    Count appointments dated in [start, end) per doctor, weekday and hour.
+    Returns (doctor ids, bookings, kept, missed) with the counters shaped
+    (doctors, 7, 24); kept are the attended plus missed bookings.
+    """
+    doctor_ids = np.array(list(Doctor.objects.order_by('pk').values_list('pk', flat=True)), dtype=np.int64)
+    first_completed = _first_completed(start, end)
+    tracked_from = np.array([first_completed.get(int(pk), NEVER) for pk in doctor_ids], dtype=np.int64)
+    size = len(doctor_ids) * CELLS
+    bookings = np.zeros(size, dtype=np.int64)
+    kept = np.zeros(size, dtype=np.int64)
+    missed = np.zeros(size, dtype=np.int64)
+    for chunk in _chunks(_columns(start, end), chunk_size):
+        doctor, weekday, hour, day, outcome = chunk.T
+        position = np.searchsorted(doctor_ids, doctor)
+        # doctors added after the id list was read cannot be placed; the next run picks them up
+        known = (position < len(doctor_ids)) & (doctor_ids[np.minimum(position, len(doctor_ids) - 1)] == doctor)
+        cell = (position * CELLS + weekday * HOURS + hour)[known]
+        position, day, outcome = position[known], day[known], outcome[known]
+        tracked = day >= tracked_from[position]
+        outcome[(outcome == OPEN) & tracked] = MISSED
+        outcome[outcome == OPEN] = UNTRACKED
+        bookings += np.bincount(cell, minlength=size)
+        kept += np.bincount(cell[(outcome == ATTENDED) | (outcome == MISSED)], minlength=size)
+        missed += np.bincount(cell[outcome == MISSED], minlength=size)
+    shape = (len(doctor_ids), 7, HOURS)
+    return doctor_ids, bookings.reshape(shape), kept.reshape(shape), missed.reshape(shape)
+
+
+def build(weeks=HISTORY_WEEKS, today=None, chunk_size=CHUNK_SIZE):
+    """Rebuild `DoctorForecast` from the last `weeks` weeks before `today`; returns the number of rows written."""
+    end = today or timezone.localdate()
+    start = end - datetime.timedelta(weeks=weeks)
+    doctor_ids, bookings, kept, missed = compute(start, end, chunk_size)
+
+    expected = bookings / np.maximum(_weekday_occurrences(start, end), 1)[None, :, None]
+    clinic_rate = missed.sum() / kept.sum() if kept.sum() else 0.0
+    doctor_rate = _smooth(missed.sum(axis=(1, 2)), kept.sum(axis=(1, 2)), clinic_rate)
+    no_show_rate = _smooth(missed, kept, doctor_rate[:, None, None])
+
+    built_at = timezone.now()
+    rows = (
+        DoctorForecast(
+            doctor_id=int(doctor_ids[d]), weekday=int(w), hour=int(h), expected_bookings=float(expected[d, w, h]),
+            no_show_rate=float(no_show_rate[d, w, h]), samples=int(kept[d, w, h]), built_at=built_at,
+        )
+        for d, w, h in zip(*np.nonzero(bookings))
+    )
+    written = 0
+    with transaction.atomic():
+        DoctorForecast.objects.all().delete()
+        while batch := list(islice(rows, BATCH_SIZE)):
+            DoctorForecast.objects.bulk_create(batch)
+            written += len(batch)
+    return written
+
+
+def forecast_index(doctor_ids):
+    """Map (doctor id, weekday, hour) -> `DoctorForecast`, from one query."""
+    return {
+        (forecast.doctor_id, forecast.weekday, forecast.hour): forecast
+        for forecast in DoctorForecast.objects.filter(doctor_id__in=doctor_ids).order_by()
+    }
+
+
+def should_overbook(forecast):
+    """True when enough history says a booking in this hour is often missed."""
+    return (
+        forecast is not None and forecast.samples >= OVERBOOK_MIN_SAMPLES
+        and forecast.no_show_rate >= OVERBOOK_NO_SHOW_RATE
+    )
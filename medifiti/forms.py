@@ -1,6 +1,7 @@
 # python
 # File: `medifiti/forms.py`
 from django import forms
+from . import booking
 from .models import Doctor, Service, Patient, Appointment, PatientProfile, Facility
 from django.contrib.auth import get_user_model
 from .models import Facility
@@ -19,6 +20,14 @@ class PatientForm(forms.ModelForm):
             'location': forms.TextInput(attrs={'class': 'form-control'}),
         }
 
+class PatientImportForm(forms.Form):
+    file = forms.FileField(widget=forms.ClearableFileInput(attrs={'class': 'form-control'}))
+    format = forms.ChoiceField(
+        choices=[('csv', 'CSV'), ('ndjson', 'NDJSON')],
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    dry_run = forms.BooleanField(required=False, help_text='Validate only, do not save.')
+
 class AppointmentForm(forms.ModelForm):
     doctor = forms.ModelChoiceField(queryset=Doctor.objects.all(), required=True, widget=forms.Select(attrs={'class': 'form-select'}))
 
@@ -34,7 +43,6 @@ class AppointmentForm(forms.ModelForm):
             'appointment_date',
             'appointment_time',
             'reason',
-            'status',
         )
         widgets = {
             'patient_user': forms.Select(attrs={'class': 'form-select'}),
@@ -45,7 +53,6 @@ class AppointmentForm(forms.ModelForm):
             'appointment_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'appointment_time': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}),
             'reason': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
-            'status': forms.Select(attrs={'class': 'form-select'}),
         }
 
     def clean(self):
@@ -56,6 +63,14 @@ class AppointmentForm(forms.ModelForm):
                 raise forms.ValidationError('Provide either a patient account/profile or guest name and email.')
         return cleaned
 
+    def save(self, commit=True):
+        # Saving goes through the booking service so the slot is locked and re-checked;
+        # callers should handle `booking.SlotUnavailable`.
+        instance = super().save(commit=False)
+        if commit:
+            booking.book(instance)
+        return instance
+
 class PatientProfileForm(forms.ModelForm):
     class Meta:
         model = PatientProfile
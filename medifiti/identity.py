@@ -0,0 +1,99 @@
+"""
+Patient identity maintenance for `Appointment.patient_key`.
+
+`Appointment.save` keeps the key current for single rows; the helpers here
+cover the cases that touch many rows at once: a user verifying an email
+that guest bookings were made under, a user changing their email, and
+backfilling existing rows.
+
+Registration does not prove the user owns the address, so a user's key is
+`user:<pk>` until the emailed verification link is opened (see
+`CustomUser.identity_key`); only then are guest bookings under that email
+linked. An address another account has already verified cannot be
+verified again.
+"""
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from . import notifications
+from .models import Appointment, CustomUser, normalize_email
+
+BACKFILL_BATCH_SIZE = 2000
+
+
+class EmailVerificationTokenGenerator(PasswordResetTokenGenerator):
+    """Tokens that stop working once the email changes or has been verified."""
+    key_salt = 'medifiti.identity.EmailVerificationTokenGenerator'
+
+    def _make_hash_value(self, user, timestamp):
+        return f'{user.pk}{normalize_email(user.email)}{user.email_verified}{timestamp}'
+
+
+email_tokens = EmailVerificationTokenGenerator()
+
+
+def verification_path(user):
+    return reverse('verify_email', args=[urlsafe_base64_encode(force_bytes(user.pk)), email_tokens.make_token(user)])
+
+
+def send_verification(user, request):
+    """Queue the verification link for `user`'s current email; returns the `OutboundEmail` or None."""
+    if user.email_verified or not normalize_email(user.email):
+        return None
+    context = {'user': user, 'url': request.build_absolute_uri(verification_path(user))}
+    return notifications.queue_email('Confirm your HospitalCare email', 'emails/verify_email', context, [user.email])
+
+
+def email_claimed(user):
+    """True when another account has already verified `user`'s email."""
+    return CustomUser.objects.filter(email__iexact=normalize_email(user.email), email_verified=True) \
+        .exclude(pk=user.pk).exists()
+
+
+def verify_email(user, token):
+    """Mark `user`'s email verified if `token` is valid and no other account holds it; returns True on success."""
+    if user.email_verified or not email_tokens.check_token(user, token) or email_claimed(user):
+        return False
+    user.email_verified = True
+    # the post_save receiver re-keys the user's appointments and links guest bookings
+    user.save(update_fields=['email_verified'])
+    return True
+
+
+def link_guest_appointments(user):
+    """Attach guest bookings made with `user`'s verified email to the user account."""
+    email_key = normalize_email(user.email)
+    if not email_key or not user.email_verified:
+        return 0
+    return Appointment.objects.filter(patient_key=email_key, patient_user__isnull=True).update(patient_user=user)
+
+
+def rekey_user_appointments(user):
+    """Move `user`'s appointments to the user's current identity key."""
+    return Appointment.objects.filter(patient_user=user).exclude(patient_key=user.identity_key).update(
+        patient_key=user.identity_key
+    )
+
+
+def backfill_range(start_pk, end_pk):
+    """Recompute identity for appointments with start_pk <= id < end_pk; returns rows changed."""
+    appointments = list(
+        Appointment.objects.filter(pk__gte=start_pk, pk__lt=end_pk)
+        .select_related('patient_user', 'patient_profile')
+        # everything `CustomUser.identity_key` reads, so no row loads a deferred field on its own
+        .only(
+            'id', 'patient_key', 'patient_email', 'patient_user', 'patient_user__email',
+            'patient_user__email_verified', 'patient_profile', 'patient_profile__user_id',
+        )
+    )
+    changed = []
+    for appointment in appointments:
+        before = (appointment.patient_key, appointment.patient_user_id)
+        appointment.refresh_patient_identity()
+        if (appointment.patient_key, appointment.patient_user_id) != before:
+            changed.append(appointment)
+    if changed:
+        Appointment.objects.bulk_update(changed, ['patient_key', 'patient_user'])
+    return len(changed)
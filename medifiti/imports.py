@@ -0,0 +1,194 @@
+"""
+Bulk patient import from CSV or NDJSON.
+
+Rows are streamed from the file and handled in batches: each batch is
+validated in memory with precompiled validators, de-duplicated on email
+and phone against the rest of the file and against the database (one
+query per batch), and written with `bulk_create` inside its own
+transaction. Invalid rows are collected in a per-row error report rather
+than aborting the import. A file that cannot be read at all (not UTF-8,
+broken CSV quoting) stops the import with `InvalidFile`; batches before the
+bad spot have already been written.
+"""
+import csv
+import io
+import json
+import re
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from . import patient_lookup, stats
+from .models import Patient, phone_regex
+
+FIELDS = ('first_name', 'last_name', 'age', 'email', 'phone_number', 'location')
+FORMATS = ('csv', 'ndjson')
+BATCH_SIZE = 1000
+MAX_AGE = 150
+
+PHONE_RE = re.compile(phone_regex.regex.pattern)
+_NAME_MAX = Patient._meta.get_field('first_name').max_length
+_LOCATION_MAX = Patient._meta.get_field('location').max_length
+
+
+class InvalidFile(ValueError):
+    """The file is not readable as the chosen format; `result` covers the rows imported before it failed."""
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.message = message
+        self.result = result
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.duplicates = 0
+        # (line number, message)
+        self.errors = []
+
+    @property
+    def invalid(self):
+        return len(self.errors) - self.duplicates
+
+    def write_report(self, out):
+        writer = csv.writer(out)
+        writer.writerow(['line', 'error'])
+        writer.writerows(self.errors)
+
+
+def read_rows(binary, format_name):
+    """Yield (line number, dict) pairs from a binary file object; raises `InvalidFile` on unreadable input."""
+    text = io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+    try:
+        yield from _parse(text, format_name)
+    except UnicodeDecodeError:
+        raise InvalidFile('The file is not UTF-8 text; save it as "CSV UTF-8" (or UTF-8 NDJSON) and upload it again.')
+    except csv.Error as exc:
+        raise InvalidFile(f'The file is not valid CSV: {exc}.')
+
+
+def _parse(text, format_name):
+    if format_name == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    elif format_name == 'ndjson':
+        for line_no, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_no, row if isinstance(row, dict) else {'__invalid__': 'not a JSON object'}
+    else:
+        raise ValueError(f'Unsupported import format: {format_name}')
+
+
+def _clean(row):
+    """Normalize one raw row into Patient field values, or raise ValidationError."""
+    if '__invalid__' in row:
+        raise ValidationError(row['__invalid__'])
+    values = {field: str(row.get(field) or '').strip() for field in FIELDS}
+    problems = []
+
+    if not values['first_name'] or not values['last_name']:
+        problems.append('first_name and last_name are required')
+    elif len(values['first_name']) > _NAME_MAX or len(values['last_name']) > _NAME_MAX:
+        problems.append(f'names are limited to {_NAME_MAX} characters')
+    if len(values['location']) > _LOCATION_MAX:
+        problems.append(f'location is limited to {_LOCATION_MAX} characters')
+
+    values['email'] = values['email'].lower()
+    if values['email']:
+        try:
+            validate_email(values['email'])
+        except ValidationError:
+            problems.append(f"invalid email {values['email']!r}")
+
+    values['phone_number'] = re.sub(r'[\s().-]', '', values['phone_number'])
+    if values['phone_number'] and not PHONE_RE.match(values['phone_number']):
+        problems.append(f"invalid phone {values['phone_number']!r}")
+
+    age = values['age']
+    if age:
+        if not age.isdigit() or int(age) > MAX_AGE:
+            problems.append(f'invalid age {age!r}')
+        else:
+            values['age'] = int(age)
+    else:
+        values['age'] = None
+
+    if problems:
+        raise ValidationError('; '.join(problems))
+    return values
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_patients(binary, format_name='csv', batch_size=BATCH_SIZE, dry_run=False):
+    """Import patients from `binary`; returns an `ImportResult`."""
+    result = ImportResult()
+    try:
+        _import(binary, format_name, batch_size, dry_run, result)
+    except InvalidFile as exc:
+        exc.result = result
+        raise
+    finally:
+        if result.created and not dry_run:
+            # bulk_create skips post_save, so move the dashboard counter here
+            stats.adjust(stats.KEY_PATIENTS, result.created)
+    result.errors.sort()
+    return result
+
+
+def _import(binary, format_name, batch_size, dry_run, result):
+    seen_emails, seen_phones = set(), set()
+
+    for batch in _batches(read_rows(binary, format_name), batch_size):
+        cleaned = []
+        for line_no, row in batch:
+            try:
+                cleaned.append((line_no, _clean(row)))
+            except ValidationError as exc:
+                result.errors.append((line_no, ' '.join(exc.messages)))
+
+        emails = {values['email'] for _line, values in cleaned if values['email']}
+        phones = {values['phone_number'] for _line, values in cleaned if values['phone_number']}
+        existing_emails = set(
+            Patient.objects.annotate(email_lower=Lower('email')).filter(email_lower__in=emails)
+            .values_list('email_lower', flat=True)
+        ) if emails else set()
+        existing_phones = set(Patient.objects.filter(phone_number__in=phones).values_list('phone_number', flat=True)) if phones else set()
+
+        patients = []
+        for line_no, values in cleaned:
+            email, phone = values['email'], values['phone_number']
+            if (email and (email in seen_emails or email in existing_emails)) or \
+                    (phone and (phone in seen_phones or phone in existing_phones)):
+                result.duplicates += 1
+                result.errors.append((line_no, 'duplicate email or phone number; skipped'))
+                continue
+            if email:
+                seen_emails.add(email)
+            if phone:
+                seen_phones.add(phone)
+            patients.append(Patient(**values))
+
+        if patients and not dry_run:
+            with transaction.atomic():
+                Patient.objects.bulk_create(patients, batch_size=batch_size)
+                # bulk_create skips post_save, so index the new rows for reception lookups here
+                patient_lookup.index_patients(patients)
+        result.created += len(patients)
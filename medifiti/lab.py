@@ -0,0 +1,168 @@
+"""
+Lab sample tracking.
+
+Samples are looked up by `sample_key` (see `normalize_sample_id`), an exact
+match on a unique index. Every status change appends a `LabSampleEvent`:
+single edits through the post_save receiver in `medifiti.signals`, and
+instrument batches through `apply_status_updates`, which writes a whole
+batch with a handful of bulk queries. Public lookups are cached per sample
+and dropped whenever the sample changes.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import LabSample, LabSampleEvent, normalize_sample_id
+
+LOOKUP_KEY = 'lab:sample:{}'
+TIMELINE_LENGTH = 20
+# keeps `IN (...)` lists under the SQLite parameter limit
+QUERY_CHUNK = 900
+
+_STATUS_MAX = LabSample._meta.get_field('status').max_length
+_SAMPLE_ID_MAX = LabSample._meta.get_field('sample_id').max_length
+
+
+def cache_timeout():
+    return getattr(settings, 'PUBLIC_CACHE_TIMEOUT', 60 * 60)
+
+
+def max_batch():
+    return getattr(settings, 'LAB_API_MAX_BATCH', 10000)
+
+
+def lookup(sample_id):
+    """Public view of a sample (status, notes and recent timeline), or None; cached."""
+    key = normalize_sample_id(sample_id)
+    if not key:
+        return None
+    cache_key = LOOKUP_KEY.format(key)
+    hit = cache.get(cache_key)
+    if hit is not None:
+        return hit[0]
+    sample = LabSample.objects.filter(sample_key=key).first()
+    result = None
+    if sample is not None:
+        events = sample.events.order_by('-recorded_at', '-id').values_list('status', 'recorded_at')[:TIMELINE_LENGTH]
+        result = {
+            'sample_id': sample.sample_id,
+            'status': sample.status,
+            'notes': sample.notes,
+            'updated': sample.status_changed_at,
+            'timeline': list(reversed(events)),
+        }
+    cache.set(cache_key, (result,), cache_timeout())
+    return result
+
+
+def forget(*sample_keys):
+    cache.delete_many([LOOKUP_KEY.format(key) for key in sample_keys])
+
+
+class StatusUpdateResult:
+    def __init__(self):
+        self.updated = 0
+        self.created = 0
+        self.events = 0
+        # (position in the batch, message)
+        self.errors = []
+
+    def as_dict(self):
+        return {
+            'updated': self.updated,
+            'created': self.created,
+            'events': self.events,
+            'errors': [{'index': index, 'error': message} for index, message in self.errors],
+        }
+
+
+def _clean(update, now):
+    if not isinstance(update, dict):
+        raise ValueError('expected an object')
+    sample_id = str(update.get('sample_id') or '').strip()
+    status = str(update.get('status') or '').strip()
+    if not sample_id or not status:
+        raise ValueError('sample_id and status are required')
+    if len(sample_id) > _SAMPLE_ID_MAX or len(status) > _STATUS_MAX:
+        raise ValueError(f'sample_id and status are limited to {_SAMPLE_ID_MAX} characters')
+    recorded_at = now
+    if update.get('recorded_at'):
+        recorded_at = parse_datetime(str(update['recorded_at']))
+        if recorded_at is None:
+            raise ValueError(f"invalid recorded_at {update['recorded_at']!r}")
+        if timezone.is_naive(recorded_at):
+            recorded_at = timezone.make_aware(recorded_at, datetime.timezone.utc)
+    notes = update.get('notes')
+    return normalize_sample_id(sample_id), sample_id, status, None if notes is None else str(notes), recorded_at
+
+
+def apply_status_updates(updates, create_missing=False, source=LabSampleEvent.SOURCE_API):
+    """
+    Apply a batch of instrument updates ({sample_id, status, notes?, recorded_at?}).
+
+    Updates for the same sample are applied in batch order, each adding a
+    timeline event. Unknown samples are reported as errors unless
+    `create_missing`. Returns a `StatusUpdateResult`.
+    """
+    result = StatusUpdateResult()
+    now = timezone.now()
+    cleaned = []
+    for index, update in enumerate(updates):
+        try:
+            cleaned.append((index, *_clean(update, now)))
+        except ValueError as exc:
+            result.errors.append((index, str(exc)))
+    if not cleaned:
+        return result
+
+    keys = list(dict.fromkeys(key for _index, key, *_rest in cleaned))
+    with transaction.atomic():
+        samples = {}
+        for start in range(0, len(keys), QUERY_CHUNK):
+            chunk = keys[start:start + QUERY_CHUNK]
+            samples.update(
+                (sample.sample_key, sample)
+                for sample in LabSample.objects.select_for_update().filter(sample_key__in=chunk)
+            )
+
+        new_samples = []
+        if create_missing:
+            for _index, key, sample_id, status, notes, recorded_at in cleaned:
+                if key not in samples:
+                    # created from its first update; the loop below applies the rest of the batch
+                    sample = LabSample(sample_id=sample_id, sample_key=key, status=status, notes=notes or '',
+                                       status_changed_at=recorded_at)
+                    samples[key] = sample
+                    new_samples.append(sample)
+            LabSample.objects.bulk_create(new_samples, batch_size=QUERY_CHUNK)
+            result.created = len(new_samples)
+
+        changed, events = {}, []
+        for index, key, sample_id, status, notes, recorded_at in cleaned:
+            sample = samples.get(key)
+            if sample is None:
+                result.errors.append((index, f'unknown sample {sample_id!r}'))
+                continue
+            # an update recorded before the current status only goes into the timeline
+            if recorded_at >= sample.status_changed_at:
+                sample.status = status
+                if notes is not None:
+                    sample.notes = notes
+                sample.status_changed_at = recorded_at
+            events.append(LabSampleEvent(sample=sample, status=status, notes=notes or '', source=source, recorded_at=recorded_at))
+            changed[key] = sample
+
+        LabSample.objects.bulk_update(
+            list(changed.values()), ['status', 'notes', 'status_changed_at'], batch_size=QUERY_CHUNK,
+        )
+        LabSampleEvent.objects.bulk_create(events, batch_size=QUERY_CHUNK)
+        transaction.on_commit(lambda: forget(*changed))
+
+    result.updated = len(changed) - len(new_samples)
+    result.events = len(events)
+    result.errors.sort()
+    return result
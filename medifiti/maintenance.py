@@ -0,0 +1,178 @@
+"""
+Parallel, restartable maintenance jobs.
+
+A job is a function `handler(start_pk, end_pk)` that processes the rows of
+one model with `start_pk <= id < end_pk` and returns how many it handled;
+`@register` adds it to `JOBS`. `run` plans a `MaintenanceRun`: the model's
+current primary-key range cut into `MaintenanceChunk`s of `chunk_size` ids.
+The chunks are handed to a `ProcessPoolExecutor`, one per task. Each worker
+process opens its own database connection (the parent closes its
+connections before the pool forks so none is shared) and runs its chunk and
+the chunk's `finished_at` in one transaction, so a chunk is either done and
+recorded or not done at all.
+
+A run that failed or was killed is resumed by the next `run` of the same job:
+only chunks without `finished_at` are scheduled again. Handlers must be safe
+to re-run over a range. Rows created after a run was planned are left to the
+next run; do not start two runs of the same job at once.
+
+With `workers=1` chunks run in this process, without a pool.
+"""
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.db import connections, transaction
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
+
+from . import identity, patient_lookup, search
+from .models import Appointment, Doctor, MaintenanceChunk, MaintenanceRun, Patient, PatientProfile
+
+CHUNK_SIZE = 5000
+
+Job = namedtuple('Job', 'name model handler chunk_size description')
+# reported after every finished chunk: chunks, rows and seconds are for this invocation, not the whole run
+Progress = namedtuple('Progress', 'run chunks rows seconds')
+
+JOBS = {}
+
+
+def register(name, model, chunk_size=CHUNK_SIZE, description=''):
+    def decorator(handler):
+        JOBS[name] = Job(name, model, handler, chunk_size, description or (handler.__doc__ or '').strip())
+        return handler
+    return decorator
+
+
+@register('appointment_identity', Appointment)
+def appointment_identity(start_pk, end_pk):
+    """Recompute Appointment.patient_key and link profile bookings to users."""
+    return identity.backfill_range(start_pk, end_pk)
+
+
+@register('patient_lookup_keys', Patient)
+def patient_lookup_keys(start_pk, end_pk):
+    """Rebuild the reception lookup keys of patients."""
+    patients = list(Patient.objects.filter(pk__gte=start_pk, pk__lt=end_pk))
+    patient_lookup.index_patients(patients)
+    return len(patients)
+
+
+@register('profile_lookup_keys', PatientProfile)
+def profile_lookup_keys(start_pk, end_pk):
+    """Rebuild the reception lookup keys of patient profiles."""
+    profiles = list(PatientProfile.objects.filter(pk__gte=start_pk, pk__lt=end_pk).select_related('user'))
+    patient_lookup.index_profiles(profiles)
+    return len(profiles)
+
+
+@register('doctor_search_terms', Doctor, chunk_size=500)
+def doctor_search_terms(start_pk, end_pk):
+    """Rebuild the site-search terms of doctors."""
+    doctor_ids = list(Doctor.objects.filter(pk__gte=start_pk, pk__lt=end_pk).values_list('pk', flat=True))
+    search.index_doctors(doctor_ids)
+    return len(doctor_ids)
+
+
+def plan(job, chunk_size=None, restart=False):
+    """The unfinished run of `job` to resume, or a new run over the model's current pk range."""
+    current = MaintenanceRun.objects.filter(
+        job=job.name, status__in=[MaintenanceRun.STATUS_RUNNING, MaintenanceRun.STATUS_FAILED],
+    ).first()
+    if current is not None and not restart:
+        return current
+    if current is not None:
+        MaintenanceRun.objects.filter(pk=current.pk).update(status=MaintenanceRun.STATUS_CANCELLED)
+
+    chunk_size = chunk_size or job.chunk_size
+    bounds = job.model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    low, high = bounds['low'] or 0, bounds['high'] or 0
+    with transaction.atomic():
+        run = MaintenanceRun.objects.create(job=job.name, low_pk=low, high_pk=high, chunk_size=chunk_size)
+        if bounds['low'] is not None:
+            MaintenanceChunk.objects.bulk_create(
+                [MaintenanceChunk(run=run, start_pk=start, end_pk=start + chunk_size)
+                 for start in range(low, high + 1, chunk_size)],
+                batch_size=2000,
+            )
+        run.chunks_total = run.chunks.count()
+        run.save(update_fields=['chunks_total'])
+    return run
+
+
+def _init_worker():
+    # a no-op when the pool forked from a configured process; needed under spawn/forkserver
+    django.setup()
+
+
+def run_chunk(chunk_id):
+    """Process one chunk and mark it finished; returns (chunk id, rows, seconds). Runs in a worker process."""
+    chunk = MaintenanceChunk.objects.select_related('run').get(pk=chunk_id)
+    job = JOBS[chunk.run.job]
+    started = time.monotonic()
+    with transaction.atomic():
+        rows = job.handler(chunk.start_pk, chunk.end_pk)
+        chunk.rows = rows
+        chunk.seconds = time.monotonic() - started
+        chunk.finished_at = timezone.now()
+        chunk.save(update_fields=['rows', 'seconds', 'finished_at'])
+    return chunk.pk, rows, chunk.seconds
+
+
+def _results(pending, workers):
+    if workers <= 1:
+        yield from map(run_chunk, pending)
+        return
+    # forked workers must not inherit (and later close) the parent's open connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(run_chunk, chunk_id) for chunk_id in pending]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        except BaseException:
+            pool.shutdown(cancel_futures=True)
+            raise
+
+
+def run(name, workers=None, chunk_size=None, restart=False, progress=None):
+    """Run (or resume) job `name` across `workers` processes (default: every core); returns the run."""
+    job = JOBS[name]
+    maintenance_run = plan(job, chunk_size, restart)
+    pending = list(
+        maintenance_run.chunks.filter(finished_at__isnull=True).order_by('start_pk').values_list('pk', flat=True)
+    )
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pending) or 1))
+    # counters are recounted from the chunks in case the previous invocation died between a chunk and its count
+    finished = maintenance_run.chunks.filter(finished_at__isnull=False).aggregate(n=Count('id'), rows=Sum('rows'))
+    maintenance_run.chunks_done = finished['n']
+    maintenance_run.rows_processed = finished['rows'] or 0
+    maintenance_run.status = MaintenanceRun.STATUS_RUNNING
+    maintenance_run.workers = workers
+    maintenance_run.error = ''
+    maintenance_run.save(update_fields=['chunks_done', 'rows_processed', 'status', 'workers', 'error', 'updated_at'])
+
+    started = time.monotonic()
+    chunks = rows = 0
+    try:
+        for _chunk_id, chunk_rows, _seconds in _results(pending, workers):
+            chunks += 1
+            rows += chunk_rows
+            maintenance_run.chunks_done += 1
+            maintenance_run.rows_processed += chunk_rows
+            maintenance_run.save(update_fields=['chunks_done', 'rows_processed', 'updated_at'])
+            if progress:
+                progress(Progress(maintenance_run, chunks, rows, time.monotonic() - started))
+    except Exception as exc:
+        maintenance_run.status = MaintenanceRun.STATUS_FAILED
+        maintenance_run.error = str(exc)
+        maintenance_run.save(update_fields=['status', 'error', 'updated_at'])
+        raise
+
+    maintenance_run.status = MaintenanceRun.STATUS_DONE
+    maintenance_run.finished_at = timezone.now()
+    maintenance_run.save(update_fields=['status', 'finished_at', 'updated_at'])
+    return maintenance_run
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from medifiti import identity
+from medifiti.models import Appointment
+
+
+class Command(BaseCommand):
+    help = 'Compute Appointment.patient_key (and link profile bookings to users) for existing rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=identity.BACKFILL_BATCH_SIZE, help='Primary keys per batch')
+
+    def handle(self, *args, **options):
+        bounds = Appointment.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write('No appointments to backfill.')
+            return
+        changed = 0
+        batch_size = options['batch_size']
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            changed += identity.backfill_range(start, start + batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Updated {changed} appointment(s).'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from medifiti import forecasting
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-doctor demand and no-show forecasts from appointment history (schedule it nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weeks', type=int, default=forecasting.HISTORY_WEEKS, help='Weeks of history to read')
+        parser.add_argument('--chunk-size', type=int, default=forecasting.CHUNK_SIZE, help='Appointments per NumPy chunk')
+
+    def handle(self, *args, **options):
+        written = forecasting.build(weeks=options['weeks'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'{written} forecast row(s) written from {options["weeks"]} week(s) of history.'))
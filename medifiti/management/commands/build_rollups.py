@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from medifiti import rollups
+
+
+class Command(BaseCommand):
+    help = 'Update the daily report rollups for days changed since the last run (schedule it, e.g. hourly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every day instead of only changed days')
+
+    def handle(self, *args, **options):
+        result = rollups.build(full=options['full'])
+        summary = ', '.join(f'{metric}: {days}' for metric, days in result.items())
+        self.stdout.write(self.style.SUCCESS(f'Rollups updated (days recomputed per metric: {summary}).'))
@@ -0,0 +1,48 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from medifiti import imports
+
+
+class Command(BaseCommand):
+    help = 'Bulk import legacy patient records from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or NDJSON file')
+        parser.add_argument('--format', choices=imports.FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=imports.BATCH_SIZE, help='Rows validated and inserted per transaction')
+        parser.add_argument('--errors', help='Write the per-row error report to this CSV file')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and de-duplicate without writing')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format_name = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if format_name == 'jsonl':
+            format_name = 'ndjson'
+        if format_name not in imports.FORMATS:
+            raise CommandError(f'Cannot infer the format of {path}; pass --format.')
+
+        try:
+            with open(path, 'rb') as source:
+                result = imports.import_patients(
+                    source, format_name, batch_size=options['batch_size'], dry_run=options['dry_run'],
+                )
+        except OSError as exc:
+            raise CommandError(str(exc))
+        except imports.InvalidFile as exc:
+            imported = f' {exc.result.created} patient(s) before it were imported.' if exc.result.created else ''
+            raise CommandError(f'{path}: {exc.message}{imported}')
+
+        if options['errors']:
+            with open(options['errors'], 'w', newline='') as report:
+                result.write_report(report)
+
+        verb = 'Would import' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result.created} patient(s); {result.duplicates} duplicate(s), {result.invalid} invalid row(s).'
+        ))
+        for line_no, message in result.errors[:20]:
+            self.stdout.write(self.style.WARNING(f'  line {line_no}: {message}'))
+        if len(result.errors) > 20:
+            self.stdout.write(f'  ... {len(result.errors) - 20} more (use --errors for the full report)')
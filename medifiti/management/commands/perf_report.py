@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from medifiti.models import ViewProfile
+
+ORDERINGS = {
+    'queries': 'avg_queries_value',
+    'db': 'avg_db_ms_value',
+    'template': 'avg_template_ms_value',
+    'time': 'avg_ms_value',
+    'max-time': 'max_ms',
+    'memory': 'max_peak_kb',
+    'requests': 'requests',
+}
+
+
+class Command(BaseCommand):
+    help = 'Print the views with the highest request cost recorded by the profiling middleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Number of views to show')
+        parser.add_argument('--order', choices=sorted(ORDERINGS), default='queries', help='Sort column')
+        parser.add_argument('--reset', action='store_true', help='Delete the collected data after printing')
+
+    def handle(self, *args, **options):
+        def average(field):
+            return Cast(field, FloatField()) / F('requests')
+
+        profiles = ViewProfile.objects.filter(requests__gt=0).annotate(
+            avg_queries_value=average('total_queries'),
+            avg_db_ms_value=average('total_db_ms'),
+            avg_template_ms_value=average('total_template_ms'),
+            avg_ms_value=average('total_ms'),
+        ).order_by(f"-{ORDERINGS[options['order']]}", 'view_name')[:options['top']]
+
+        rows = [
+            (p.view_name, p.requests, f'{p.avg_queries:.1f}', p.max_queries, f'{p.avg_db_ms:.1f}',
+             f'{p.avg_template_ms:.1f}', f'{p.avg_ms:.1f}', f'{p.max_ms:.1f}', p.max_peak_kb)
+            for p in profiles
+        ]
+        if not rows:
+            self.stdout.write('No profiling data recorded yet (is PROFILING_ENABLED set?).')
+        else:
+            headers = ('view', 'requests', 'avg q', 'max q', 'avg db ms', 'avg tpl ms', 'avg ms', 'max ms', 'peak KB')
+            widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+            for row in [headers] + rows:
+                self.stdout.write('  '.join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip())
+
+        if options['reset']:
+            deleted, _ = ViewProfile.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f'Reset {deleted} view profile(s).'))
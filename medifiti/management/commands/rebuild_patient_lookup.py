@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from medifiti import patient_lookup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the reception lookup keys for patient records and patient profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=patient_lookup.REBUILD_BATCH_SIZE, help='Rows indexed per batch')
+
+    def handle(self, *args, **options):
+        count = patient_lookup.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} patient(s).'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from medifiti import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the doctor and service search index from scratch'
+
+    def handle(self, *args, **options):
+        count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} doctor(s) and service(s).'))
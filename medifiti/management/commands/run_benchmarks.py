@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from medifiti import benchmarking
+
+
+class Command(BaseCommand):
+    help = 'Time the hot views through the test client and compare against a saved baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed requests per scenario')
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO', help='Run only these scenarios')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='Compare against a JSON file written by --output')
+        parser.add_argument('--tolerance', type=float, default=10.0, help='Allowed latency growth in percent')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error if anything regressed')
+
+    def handle(self, *args, **options):
+        known = {scenario.name for scenario in benchmarking.scenarios()}
+        unknown = set(options['only'] or ()) - known
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}; choose from {', '.join(sorted(known))}")
+
+        report = benchmarking.run(
+            repeat=options['repeat'], warmup=options['warmup'], only=options['only'], log=self.stdout.write,
+        )
+        if options['output']:
+            with open(options['output'], 'w') as out:
+                json.dump(report, out, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
+
+        if options['baseline']:
+            with open(options['baseline']) as src:
+                baseline = json.load(src)
+            rows = benchmarking.compare(baseline, report, tolerance=options['tolerance'])
+            regressions = [row for row in rows if row[-1]]
+            for name, metric, before, after, change, regressed in rows:
+                line = f'{name:<36} {metric:<8} {before:>10} -> {after:<10} {change:+.1f}%'
+                self.stdout.write(self.style.ERROR(line) if regressed else line)
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} metric(s) regressed against {options["baseline"]}.')
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from medifiti import export_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background export jobs, resuming any job whose worker died part-way'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=export_jobs.CHUNK_SIZE, help='Rows written per checkpoint')
+        parser.add_argument('--once', action='store_true', help='Run every job that is currently due, then exit')
+        parser.add_argument('--interval', type=float, default=10.0, help='Seconds to sleep when no job is queued')
+
+    def handle(self, *args, **options):
+        while True:
+            job = export_jobs.claim_next()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+            self.stdout.write(f'Running {job} from id > {job.last_pk}...')
+            try:
+                export_jobs.run(job, chunk_size=options['chunk_size'])
+            except Exception as exc:
+                self.stderr.write(self.style.ERROR(f'Export #{job.pk} failed: {exc}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Export #{job.pk} done: {job.rows_written} rows -> {job.file.name}'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from medifiti import maintenance
+
+
+class Command(BaseCommand):
+    help = 'Run a registered maintenance job over primary-key chunks in parallel, resuming its last unfinished run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('job', nargs='?', help='Job name; omit to list the registered jobs')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU core)')
+        parser.add_argument('--chunk-size', type=int, help="Primary keys per chunk (default: the job's own)")
+        parser.add_argument('--restart', action='store_true', help='Abandon an unfinished run and start over')
+
+    def handle(self, *args, **options):
+        if not options['job']:
+            for job in maintenance.JOBS.values():
+                self.stdout.write(f'{job.name:<24} {job.model.__name__:<16} {job.description}')
+            return
+        if options['job'] not in maintenance.JOBS:
+            raise CommandError(f"Unknown job {options['job']!r}; choose from {', '.join(maintenance.JOBS)}.")
+
+        run = maintenance.run(
+            options['job'], workers=options['workers'], chunk_size=options['chunk_size'],
+            restart=options['restart'], progress=self.report,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{run.job} done: {run.rows_processed} rows in {run.chunks_total} chunks with {run.workers} worker(s).'
+        ))
+
+    def report(self, progress):
+        run = progress.run
+        rate = progress.rows / progress.seconds if progress.seconds else 0
+        # this invocation's pace, applied to the chunks still to do
+        eta = progress.seconds / progress.chunks * (run.chunks_total - run.chunks_done)
+        self.stdout.write(
+            f'{run.chunks_done}/{run.chunks_total} chunks, {run.rows_processed} rows, {rate:.0f} rows/s, ~{eta:.0f}s left'
+        )
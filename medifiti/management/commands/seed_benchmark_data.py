@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from medifiti import benchmarking
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create a large synthetic dataset for run_benchmarks (rows are tagged so --clear can remove them)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=1000, help='Doctors (each with a login)')
+        parser.add_argument('--patient-users', type=int, default=10000, help='Patient logins with profiles')
+        parser.add_argument('--patients', type=int, default=500000, help='Legacy patient records')
+        parser.add_argument('--appointments', type=int, default=1000000, help='Appointments spread around today')
+        parser.add_argument('--contacts', type=int, default=100000, help='Contact messages')
+        parser.add_argument('--batch-size', type=int, default=benchmarking.BATCH_SIZE, help='Rows per bulk insert')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated rows first')
+        parser.add_argument('--index', action='store_true', help='Rebuild the search and patient lookup indexes afterwards')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted = benchmarking.clear()
+            self.stdout.write(f'Deleted {deleted} generated row(s).')
+        created = benchmarking.seed(
+            doctors=options['doctors'],
+            patient_users=options['patient_users'],
+            patients=options['patients'],
+            appointments=options['appointments'],
+            contacts=options['contacts'],
+            batch_size=options['batch_size'],
+            random_seed=options['seed'],
+            index=options['index'],
+            log=self.stdout.write,
+        )
+        summary = ', '.join(f'{count} {name}' for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f'Created {summary}.'))
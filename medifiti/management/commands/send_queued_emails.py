@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from medifiti import notifications
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbound emails in batches over one SMTP connection, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Messages sent per SMTP connection')
+        parser.add_argument('--once', action='store_true', help='Send everything currently due, then exit')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            batch = notifications.claim_due(batch_size)
+            if batch:
+                sent, failed = notifications.send_batch(batch)
+                self.stdout.write(f'Sent {sent} email(s), {failed} failed.')
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0005_facility'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorWorkingHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+            ],
+            options={
+                'verbose_name': 'Working hours',
+                'verbose_name_plural': 'Working hours',
+                'ordering': ['doctor', 'weekday', 'start_time'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'appointment_date', 'appointment_time'], name='appt_doctor_slot_idx'),
+        ),
+        migrations.AddField(
+            model_name='doctorworkinghours',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to='medifiti.doctor'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:43
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def cancel_double_bookings(apps, schema_editor):
+    """Keep the earliest active booking per slot so the unique constraint can be added."""
+    Appointment = apps.get_model('medifiti', 'Appointment')
+    active = Appointment.objects.exclude(status='cancelled')
+    clashes = (
+        active.values('doctor_id', 'appointment_date', 'appointment_time')
+        .annotate(n=Count('id'), keep=Min('id'))
+        .filter(n__gt=1)
+    )
+    for clash in clashes:
+        active.filter(
+            doctor_id=clash['doctor_id'],
+            appointment_date=clash['appointment_date'],
+            appointment_time=clash['appointment_time'],
+        ).exclude(id=clash['keep']).update(status='cancelled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0006_doctor_working_hours'),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('doctor', 'appointment_date', 'appointment_time'), name='unique_active_doctor_slot', violation_error_message='This time slot is already booked. Please choose another time.'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0012_patient_dedupe_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='patient_key',
+            field=models.CharField(blank=True, editable=False, max_length=254),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient_key', 'appointment_date', 'appointment_time'], name='appt_patient_key_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0013_appointment_patient_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=64)),
+                ('kind', models.CharField(choices=[('doctor', 'Doctor'), ('service', 'Service')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id'], name='searchterm_object_idx')],
+                'constraints': [models.UniqueConstraint(fields=('term', 'kind', 'object_id'), name='unique_search_term')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0014_searchterm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientLookupKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('name', 'Name'), ('email', 'Email'), ('phone', 'Phone'), ('ref', 'Insurance number')], max_length=5)),
+                ('key', models.CharField(max_length=254)),
+                ('source', models.CharField(choices=[('patient', 'Patient record'), ('profile', 'Patient profile')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['field', 'key'], name='lookup_prefix_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']), models.Index(fields=['source', 'object_id'], name='lookup_object_idx')],
+            },
+        ),
+    ]
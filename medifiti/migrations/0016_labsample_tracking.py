@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_sample_keys(apps, schema_editor):
+    LabSample = apps.get_model('medifiti', 'LabSample')
+    LabSampleEvent = apps.get_model('medifiti', 'LabSampleEvent')
+    samples = list(LabSample.objects.all())
+    by_key = {}
+    for sample in samples:
+        sample.sample_key = ''.join(sample.sample_id.split()).upper()
+        by_key.setdefault(sample.sample_key, []).append(sample.sample_id)
+    clashes = {key: ids for key, ids in by_key.items() if len(ids) > 1}
+    if clashes:
+        # which sample is the real one is for the lab to decide, not this migration
+        listed = '; '.join(', '.join(repr(sample_id) for sample_id in ids) for ids in clashes.values())
+        raise RuntimeError(
+            'Lab sample ids must be unique ignoring case and whitespace before sample_key can be added. '
+            f'Rename or merge these samples and migrate again: {listed}'
+        )
+    LabSample.objects.bulk_update(samples, ['sample_key'], batch_size=1000)
+    # start each timeline with the status the sample has today
+    LabSampleEvent.objects.bulk_create([
+        LabSampleEvent(sample=sample, status=sample.status, notes=sample.notes, recorded_at=sample.created_at)
+        for sample in samples
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0015_patientlookupkey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labsample',
+            name='sample_key',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='labsample',
+            name='status_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='LabSampleEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=100)),
+                ('notes', models.TextField(blank=True)),
+                ('source', models.CharField(choices=[('admin', 'Admin'), ('api', 'Instrument API')], default='admin', max_length=10)),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sample', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='medifiti.labsample')),
+            ],
+            options={
+                'ordering': ['recorded_at', 'id'],
+                'indexes': [models.Index(fields=['sample', 'recorded_at', 'id'], name='labevent_timeline_idx')],
+            },
+        ),
+        migrations.RunPython(fill_sample_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='labsample',
+            name='sample_key',
+            field=models.CharField(editable=False, max_length=100, unique=True),
+        ),
+    ]
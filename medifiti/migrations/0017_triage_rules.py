@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0016_labsample_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Symptom',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.SlugField(unique=True)),
+                ('label', models.CharField(max_length=200)),
+                ('position', models.PositiveSmallIntegerField(default=0, help_text='Order in the triage form')),
+                ('active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Department',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='departments', to='medifiti.service')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TriageRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rules', to='medifiti.department')),
+                ('symptom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rules', to='medifiti.symptom')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('symptom', 'department'), name='unique_triage_rule')],
+            },
+        ),
+    ]
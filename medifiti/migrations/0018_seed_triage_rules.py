@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# The symptoms and departments the triage form offered before rules moved into the database.
+SYMPTOMS = [
+    ('respiratory', 'Fever, cough, sore throat', [('Respiratory', 2), ('General Physician', 1)]),
+    ('dental', 'Tooth pain or bleeding gums', [('Dentistry', 2)]),
+    ('cardiac', 'Chest pain or shortness of breath', [('Cardiology', 2), ('Emergency', 2)]),
+    ('abdominal', 'Abdominal pain, nausea', [('General Surgery', 1), ('Gastroenterology', 2)]),
+]
+
+
+def seed(apps, schema_editor):
+    Symptom = apps.get_model('medifiti', 'Symptom')
+    Department = apps.get_model('medifiti', 'Department')
+    TriageRule = apps.get_model('medifiti', 'TriageRule')
+    for position, (key, label, rules) in enumerate(SYMPTOMS):
+        symptom, _ = Symptom.objects.get_or_create(key=key, defaults={'label': label, 'position': position})
+        for name, weight in rules:
+            department, _ = Department.objects.get_or_create(name=name)
+            TriageRule.objects.get_or_create(symptom=symptom, department=department, defaults={'weight': weight})
+
+
+def unseed(apps, schema_editor):
+    Symptom = apps.get_model('medifiti', 'Symptom')
+    Symptom.objects.filter(key__in=[key for key, _label, _rules in SYMPTOMS]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0017_triage_rules'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed, unseed),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0018_seed_triage_rules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view_name', models.CharField(max_length=200, unique=True)),
+                ('requests', models.PositiveBigIntegerField(default=0)),
+                ('total_queries', models.PositiveBigIntegerField(default=0)),
+                ('max_queries', models.PositiveIntegerField(default=0)),
+                ('total_db_ms', models.FloatField(default=0)),
+                ('total_template_ms', models.FloatField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('max_peak_kb', models.PositiveIntegerField(default=0)),
+                ('last_seen', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
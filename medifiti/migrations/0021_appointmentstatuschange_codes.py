@@ -0,0 +1,117 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+STATUS_CODES = {'pending': 1, 'confirmed': 2, 'completed': 3, 'cancelled': 4}
+SOURCE_CODES = {'admin': 1, 'system': 2}
+CODE_CHOICES = [(0, 'New'), (1, 'Pending'), (2, 'Confirmed'), (3, 'Completed'), (4, 'Cancelled')]
+BATCH_SIZE = 2000
+
+
+def encode_history(apps, schema_editor):
+    """Convert the text columns to codes and open a timeline for every appointment that has none."""
+    Appointment = apps.get_model('medifiti', 'Appointment')
+    AppointmentStatusChange = apps.get_model('medifiti', 'AppointmentStatusChange')
+
+    changes = list(AppointmentStatusChange.objects.all())
+    for change in changes:
+        change.from_code = STATUS_CODES.get(change.old_from_status, 0)
+        change.to_code = STATUS_CODES.get(change.old_to_status, 0)
+        change.source = SOURCE_CODES.get(change.old_source, 2)
+    AppointmentStatusChange.objects.bulk_update(changes, ['from_code', 'to_code', 'source'], batch_size=BATCH_SIZE)
+
+    batch = []
+    appointments = (
+        Appointment.objects.filter(status_changes__isnull=True)
+        .values_list('pk', 'status', 'created_at').order_by('pk')
+    )
+    for pk, status, created_at in appointments.iterator(chunk_size=BATCH_SIZE):
+        batch.append(AppointmentStatusChange(
+            appointment_id=pk, from_code=0, to_code=STATUS_CODES.get(status, 0), source=2, at=created_at,
+        ))
+        if len(batch) >= BATCH_SIZE:
+            AppointmentStatusChange.objects.bulk_create(batch)
+            batch = []
+    AppointmentStatusChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0020_appointmentstatuschange'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='appointmentstatuschange',
+            name='apptstatus_timeline_idx',
+        ),
+        migrations.RenameField(
+            model_name='appointmentstatuschange',
+            old_name='from_status',
+            new_name='old_from_status',
+        ),
+        migrations.RenameField(
+            model_name='appointmentstatuschange',
+            old_name='to_status',
+            new_name='old_to_status',
+        ),
+        migrations.RenameField(
+            model_name='appointmentstatuschange',
+            old_name='source',
+            new_name='old_source',
+        ),
+        migrations.RenameField(
+            model_name='appointmentstatuschange',
+            old_name='changed_at',
+            new_name='at',
+        ),
+        migrations.AlterModelOptions(
+            name='appointmentstatuschange',
+            options={'ordering': ['at', 'id']},
+        ),
+        migrations.AddField(
+            model_name='appointmentstatuschange',
+            name='from_code',
+            field=models.PositiveSmallIntegerField(choices=CODE_CHOICES, default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='appointmentstatuschange',
+            name='to_code',
+            field=models.PositiveSmallIntegerField(choices=CODE_CHOICES, default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='appointmentstatuschange',
+            name='source',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Admin'), (2, 'System'), (3, 'Booking')], default=1),
+        ),
+        migrations.RunPython(encode_history, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='appointmentstatuschange',
+            name='old_from_status',
+        ),
+        migrations.RemoveField(
+            model_name='appointmentstatuschange',
+            name='old_to_status',
+        ),
+        migrations.RemoveField(
+            model_name='appointmentstatuschange',
+            name='old_source',
+        ),
+        migrations.AlterField(
+            model_name='appointmentstatuschange',
+            name='at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentstatuschange',
+            index=models.Index(fields=['appointment', 'at'], name='apptstatus_timeline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentstatuschange',
+            index=models.Index(fields=['at', 'to_code'], name='apptstatus_day_idx'),
+        ),
+    ]
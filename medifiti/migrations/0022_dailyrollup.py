@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0021_appointmentstatuschange_codes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50, unique=True)),
+                ('value', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('metric', models.CharField(choices=[('appointments', 'Appointments'), ('contacts', 'Contact messages'), ('registrations', 'Patient registrations')], max_length=20)),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('doctor', 'Doctor'), ('service', 'Service'), ('status', 'Status')], default='total', max_length=10)),
+                ('key', models.CharField(blank=True, max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['day', 'metric', 'dimension', 'key'],
+                'indexes': [models.Index(fields=['metric', 'dimension', 'day'], name='rollup_series_idx')],
+                'constraints': [models.UniqueConstraint(fields=('metric', 'dimension', 'key', 'day'), name='unique_daily_rollup')],
+            },
+        ),
+    ]
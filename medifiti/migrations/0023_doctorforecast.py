@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0022_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('expected_bookings', models.FloatField()),
+                ('no_show_rate', models.FloatField()),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('built_at', models.DateTimeField()),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecasts', to='medifiti.doctor')),
+            ],
+            options={
+                'ordering': ['doctor', 'weekday', 'hour'],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'weekday', 'hour'), name='unique_doctor_forecast')],
+            },
+        ),
+    ]
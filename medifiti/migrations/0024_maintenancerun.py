@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0023_doctorforecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaintenanceRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='running', max_length=10)),
+                ('low_pk', models.BigIntegerField(default=0)),
+                ('high_pk', models.BigIntegerField(default=0)),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('workers', models.PositiveSmallIntegerField(default=1)),
+                ('chunks_total', models.PositiveIntegerField(default=0)),
+                ('chunks_done', models.PositiveIntegerField(default=0)),
+                ('rows_processed', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['job', 'status'], name='maintenance_job_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MaintenanceChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_pk', models.BigIntegerField()),
+                ('end_pk', models.BigIntegerField()),
+                ('rows', models.PositiveIntegerField(blank=True, null=True)),
+                ('seconds', models.FloatField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='medifiti.maintenancerun')),
+            ],
+            options={
+                'ordering': ['run', 'start_pk'],
+                'indexes': [models.Index(fields=['run', 'finished_at'], name='maintenance_chunk_idx')],
+            },
+        ),
+    ]
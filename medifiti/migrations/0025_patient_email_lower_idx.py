@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:35
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0024_maintenancerun'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='patient',
+            name='patient_email_idx',
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='patient_email_lower_idx'),
+        ),
+    ]
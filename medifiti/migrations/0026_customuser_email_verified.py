@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:38
+
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+
+def key_by_user(apps, schema_editor):
+    # existing addresses were never verified, so account bookings move to the per-user key until they are
+    Appointment = apps.get_model('medifiti', 'Appointment')
+    Appointment.objects.filter(patient_user__isnull=False).update(
+        patient_key=Concat(Value('user:'), Cast('patient_user_id', CharField())),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medifiti', '0025_patient_email_lower_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='email_verified',
+            field=models.BooleanField(default=False, help_text='Set by the emailed verification link; guest bookings made under this email are linked only then.'),
+        ),
+        migrations.RunPython(key_by_user, migrations.RunPython.noop),
+    ]
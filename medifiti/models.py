@@ -3,6 +3,7 @@ from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.db import models
 from django.db.models.signals import post_save
+from django.db.models.functions import Lower
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.text import slugify
@@ -15,6 +16,16 @@ phone_regex = RegexValidator(
 )
 
 
+def normalize_email(value):
+    """Canonical form used for patient identity keys: trimmed and lowercased."""
+    return (value or '').strip().lower()
+
+
+def normalize_sample_id(value):
+    """Canonical lab sample key: upper-cased with whitespace removed, so lookups are exact matches."""
+    return ''.join((value or '').split()).upper()
+
+
 class CustomUser(AbstractUser):
     """Custom user model with role-based access control."""
     ROLE_ADMIN = 'admin'
@@ -40,6 +51,38 @@ class CustomUser(AbstractUser):
         default='email',
         help_text='How to receive notifications'
     )
+    email_verified = models.BooleanField(
+        default=False,
+        help_text='Set by the emailed verification link; guest bookings made under this email are linked only then.',
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted email so a change can re-key the user's appointments.
+        loaded = dict(zip(field_names, values))
+        instance._loaded_email = loaded.get('email')
+        instance._loaded_email_verified = loaded.get('email_verified')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if normalize_email(getattr(self, '_loaded_email', self.email)) != normalize_email(self.email):
+            # a new address has to be verified again before it claims any bookings
+            self.email_verified = False
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'email_verified'}
+        super().save(*args, **kwargs)
+
+    @property
+    def identity_key(self):
+        """
+        Key shared by all of this user's appointments (see `Appointment.patient_key`):
+        the email once it is verified, since anyone can register with any address.
+        """
+        if self.email_verified and normalize_email(self.email):
+            return normalize_email(self.email)
+        return f'user:{self.pk}'
 
     def __str__(self):
         role_label = dict(self.ROLE_CHOICES).get(self.role, self.role)
@@ -61,6 +104,9 @@ class Contact(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='contact_recent_idx'),
+        ]
 
 
 # python
@@ -85,6 +131,32 @@ class Doctor(models.Model):
         return f"Dr. {self.name}"
 
 
+class DoctorWorkingHours(models.Model):
+    """Weekly working-hour template from which a doctor's bookable slots are generated."""
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='working_hours')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    class Meta:
+        ordering = ['doctor', 'weekday', 'start_time']
+        verbose_name = 'Working hours'
+        verbose_name_plural = 'Working hours'
+
+    def __str__(self):
+        return f"Dr. {self.doctor.name} - {self.get_weekday_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+
 class Service(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True, blank=True)
@@ -123,16 +195,63 @@ class Service(models.Model):
 
 
 class LabSample(models.Model):
-    """Simple model for tracking lab samples (placeholder implementation)."""
+    """Lab sample with its current status; every status change is kept in `LabSampleEvent`."""
     sample_id = models.CharField(max_length=100, unique=True)
+    # normalize_sample_id(sample_id); public lookups are exact matches on this
+    sample_key = models.CharField(max_length=100, unique=True, editable=False)
     status = models.CharField(max_length=100, default='Received')
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    status_changed_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remembered so a status change can be recorded in the timeline on save
+        instance._loaded_status = instance.__dict__.get('status')
+        # and so a renamed sample's old id can be dropped from the lookup cache
+        instance._loaded_sample_key = instance.__dict__.get('sample_key')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.sample_key = normalize_sample_id(self.sample_id)
+        if getattr(self, '_loaded_status', self.status) != self.status:
+            self.status_changed_at = timezone.now()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'sample_id' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'sample_key'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.sample_id} - {self.status}"
 
 
+class LabSampleEvent(models.Model):
+    """Append-only status history of a lab sample."""
+    SOURCE_ADMIN = 'admin'
+    SOURCE_API = 'api'
+
+    SOURCE_CHOICES = [
+        (SOURCE_ADMIN, 'Admin'),
+        (SOURCE_API, 'Instrument API'),
+    ]
+
+    sample = models.ForeignKey(LabSample, on_delete=models.CASCADE, related_name='events')
+    status = models.CharField(max_length=100)
+    notes = models.TextField(blank=True)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default=SOURCE_ADMIN)
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['recorded_at', 'id']
+        indexes = [
+            models.Index(fields=['sample', 'recorded_at', 'id'], name='labevent_timeline_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sample_id}: {self.status} at {self.recorded_at}"
+
+
 class Patient(models.Model):
     """Lightweight patient record for non-authenticated or legacy data."""
     first_name = models.CharField(max_length=200)
@@ -143,6 +262,14 @@ class Patient(models.Model):
     location = models.CharField(max_length=200, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='patient_recent_idx'),
+            # de-duplication lookups during bulk import; emails are compared lower-cased
+            models.Index(Lower('email'), name='patient_email_lower_idx'),
+            models.Index(fields=['phone_number'], name='patient_phone_idx'),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
@@ -175,6 +302,9 @@ class Appointment(models.Model):
     patient_name = models.CharField(max_length=100, blank=True)
     patient_email = models.EmailField(blank=True)
     patient_phone = models.CharField(max_length=15, validators=[phone_regex], blank=True)
+    # Normalized identity of the patient, maintained on save: the linked user's `identity_key`,
+    # else the normalized guest email. A patient's appointments are one indexed lookup on it.
+    patient_key = models.CharField(max_length=254, blank=True, editable=False)
 
     appointment_date = models.DateField()
     appointment_time = models.TimeField()
@@ -184,6 +314,54 @@ class Appointment(models.Model):
 
     class Meta:
         ordering = ['appointment_date', 'appointment_time']
+        indexes = [
+            # Backs the per-doctor, per-day slot index used by `availability`.
+            models.Index(fields=['doctor', 'appointment_date', 'appointment_time'], name='appt_doctor_slot_idx'),
+            # Keyset pagination and filters on the admin appointments listing.
+            models.Index(fields=['appointment_date', 'appointment_time', 'id'], name='appt_schedule_idx'),
+            models.Index(fields=['status', 'appointment_date', 'appointment_time'], name='appt_status_slot_idx'),
+            models.Index(fields=['patient_key', 'appointment_date', 'appointment_time'], name='appt_patient_key_idx'),
+        ]
+        constraints = [
+            # A slot can only be held by one active appointment; cancelled rows free it again.
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=~models.Q(status='cancelled'),
+                name='unique_active_doctor_slot',
+                violation_error_message='This time slot is already booked. Please choose another time.',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted status and date so signal receivers can tell what changed on save.
+        loaded = dict(zip(field_names, values))
+        instance._loaded_status = loaded.get('status')
+        instance._loaded_date = loaded.get('appointment_date')
+        return instance
+
+    IDENTITY_FIELDS = {'patient_user', 'patient_profile', 'patient_email'}
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if not self._state.adding and (update_fields is None or 'status' in update_fields) \
+                and getattr(self, '_loaded_status', self.status) != self.status:
+            raise ValueError('Appointment status changes go through medifiti.transitions.')
+        if update_fields is None or self.IDENTITY_FIELDS.intersection(update_fields):
+            self.refresh_patient_identity()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'patient_user', 'patient_key'}
+        super().save(*args, **kwargs)
+
+    def refresh_patient_identity(self):
+        """Link profile bookings to their user and recompute `patient_key`."""
+        if self.patient_profile_id and not self.patient_user_id:
+            self.patient_user_id = self.patient_profile.user_id
+        if self.patient_user_id:
+            self.patient_key = self.patient_user.identity_key
+        else:
+            self.patient_key = normalize_email(self.patient_email)
 
     def __str__(self):
         name = self.patient_name
@@ -195,6 +373,78 @@ class Appointment(models.Model):
                 name = ''
         return f"{name or 'Unknown Patient'} - Dr. {self.doctor.name} - {self.appointment_date} {self.appointment_time}"
 
+    def get_patient_display(self):
+        """Best available patient name; select_related `patient_user` and `patient_profile__user` to avoid extra queries."""
+        if self.patient_name:
+            return self.patient_name
+        if self.patient_profile and getattr(self.patient_profile, 'user', None):
+            return self.patient_profile.user.get_full_name() or self.patient_profile.user.username
+        if self.patient_user:
+            return self.patient_user.get_full_name() or self.patient_user.username
+        return '(guest)'
+
+
+class AppointmentStatusChange(models.Model):
+    """
+    Append-only appointment status history, written only by `medifiti.transitions`.
+
+    Statuses and sources are small integer codes so the table stays narrow;
+    `from_status` / `to_status` map them back to `Appointment` statuses.
+    """
+    CODE_NEW = 0
+    STATUS_CODES = {
+        Appointment.STATUS_PENDING: 1,
+        Appointment.STATUS_CONFIRMED: 2,
+        Appointment.STATUS_COMPLETED: 3,
+        Appointment.STATUS_CANCELLED: 4,
+    }
+    CODE_STATUSES = dict(zip(STATUS_CODES.values(), STATUS_CODES))
+    CODE_CHOICES = [
+        (CODE_NEW, 'New'),
+        (1, 'Pending'),
+        (2, 'Confirmed'),
+        (3, 'Completed'),
+        (4, 'Cancelled'),
+    ]
+
+    SOURCE_ADMIN = 1
+    SOURCE_SYSTEM = 2
+    SOURCE_BOOKING = 3
+
+    SOURCE_CHOICES = [
+        (SOURCE_ADMIN, 'Admin'),
+        (SOURCE_SYSTEM, 'System'),
+        (SOURCE_BOOKING, 'Booking'),
+    ]
+
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='status_changes')
+    from_code = models.PositiveSmallIntegerField(choices=CODE_CHOICES)
+    to_code = models.PositiveSmallIntegerField(choices=CODE_CHOICES)
+    source = models.PositiveSmallIntegerField(choices=SOURCE_CHOICES, default=SOURCE_ADMIN)
+    changed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['at', 'id']
+        indexes = [
+            models.Index(fields=['appointment', 'at'], name='apptstatus_timeline_idx'),
+            # daily throughput reports
+            models.Index(fields=['at', 'to_code'], name='apptstatus_day_idx'),
+        ]
+
+    @property
+    def from_status(self):
+        return self.CODE_STATUSES.get(self.from_code)
+
+    @property
+    def to_status(self):
+        return self.CODE_STATUSES.get(self.to_code)
+
+    def __str__(self):
+        return f"{self.appointment_id}: {self.get_from_code_display()} -> {self.get_to_code_display()} at {self.at}"
+
 
 class PatientProfile(models.Model):
     """Patient profile linked one-to-one with the user model."""
@@ -290,4 +540,367 @@ class Facility(models.Model):
         verbose_name_plural = "Facility"
 
     def __str__(self):
-        return self.name or "Facility"
\ No newline at end of file
+        return self.name or "Facility"
+
+
+class OutboundEmail(models.Model):
+    """Queued outbound email, delivered in batches by the `send_queued_emails` command."""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body_text = models.TextField()
+    body_html = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+        verbose_name = 'Outbound email'
+        verbose_name_plural = 'Outbound emails'
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+
+
+class ExportJob(models.Model):
+    """Background export of a dataset to a file under MEDIA_ROOT, written by `run_export_jobs`."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    dataset = models.CharField(max_length=50)
+    format = models.CharField(max_length=10, default='csv')
+    compress = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    file = models.FileField(upload_to='exports/', blank=True)
+    # Resume point: everything up to `last_pk` is in the first `bytes_written` bytes of `file`.
+    last_pk = models.BigIntegerField(default=0)
+    bytes_written = models.BigIntegerField(default=0)
+    rows_written = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='export_jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='exportjob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Export #{self.pk} {self.dataset}.{self.format} ({self.status})"
+
+
+class SearchTerm(models.Model):
+    """Inverted index row: `term` occurs in the text of one doctor or service, maintained by `medifiti.search`."""
+    KIND_DOCTOR = 'doctor'
+    KIND_SERVICE = 'service'
+
+    KIND_CHOICES = [
+        (KIND_DOCTOR, 'Doctor'),
+        (KIND_SERVICE, 'Service'),
+    ]
+
+    # db_index also gives Postgres a pattern-ops index, so prefix lookups stay indexed
+    term = models.CharField(max_length=64, db_index=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'object_id'], name='searchterm_object_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'kind', 'object_id'], name='unique_search_term'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.kind} #{self.object_id}"
+
+
+class PatientLookupKey(models.Model):
+    """Normalized search key for reception lookups, maintained by `medifiti.patient_lookup`."""
+    SOURCE_PATIENT = 'patient'
+    SOURCE_PROFILE = 'profile'
+
+    SOURCE_CHOICES = [
+        (SOURCE_PATIENT, 'Patient record'),
+        (SOURCE_PROFILE, 'Patient profile'),
+    ]
+
+    FIELD_NAME = 'name'
+    FIELD_EMAIL = 'email'
+    FIELD_PHONE = 'phone'
+    FIELD_REFERENCE = 'ref'
+
+    FIELD_CHOICES = [
+        (FIELD_NAME, 'Name'),
+        (FIELD_EMAIL, 'Email'),
+        (FIELD_PHONE, 'Phone'),
+        (FIELD_REFERENCE, 'Insurance number'),
+    ]
+
+    field = models.CharField(max_length=5, choices=FIELD_CHOICES)
+    # lower-cased name word / email, digits-only phone, or alphanumeric reference
+    key = models.CharField(max_length=254)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    object_id = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            # pattern ops let Postgres serve `key LIKE 'prefix%'` from the index; other backends ignore them
+            models.Index(
+                fields=['field', 'key'], name='lookup_prefix_idx',
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops'],
+            ),
+            models.Index(fields=['source', 'object_id'], name='lookup_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.field}:{self.key} -> {self.source} #{self.object_id}"
+
+
+class Symptom(models.Model):
+    """Symptom patients can pick in the triage form."""
+    key = models.SlugField(max_length=50, unique=True)
+    label = models.CharField(max_length=200)
+    position = models.PositiveSmallIntegerField(default=0, help_text='Order in the triage form')
+    active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['position', 'id']
+
+    def __str__(self):
+        return self.label
+
+
+class Department(models.Model):
+    """Department triage can recommend; doctors offering `service` are suggested with it."""
+    name = models.CharField(max_length=100, unique=True)
+    service = models.ForeignKey(
+        Service, on_delete=models.SET_NULL, null=True, blank=True, related_name='departments'
+    )
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class TriageRule(models.Model):
+    """A symptom points to a department with some weight; weights of all selected symptoms add up."""
+    symptom = models.ForeignKey(Symptom, on_delete=models.CASCADE, related_name='rules')
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='rules')
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['symptom', 'department'], name='unique_triage_rule'),
+        ]
+
+    def __str__(self):
+        return f"{self.symptom} -> {self.department} ({self.weight})"
+
+
+class ViewProfile(models.Model):
+    """Running totals of request cost per URL name, flushed by `medifiti.profiling.ProfilingMiddleware`."""
+    view_name = models.CharField(max_length=200, unique=True)
+    requests = models.PositiveBigIntegerField(default=0)
+    total_queries = models.PositiveBigIntegerField(default=0)
+    max_queries = models.PositiveIntegerField(default=0)
+    total_db_ms = models.FloatField(default=0)
+    total_template_ms = models.FloatField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    # only measured while PROFILING_TRACE_MEMORY is on
+    max_peak_kb = models.PositiveIntegerField(default=0)
+    last_seen = models.DateTimeField(null=True, blank=True)
+
+    def _average(self, total):
+        return total / self.requests if self.requests else 0
+
+    @property
+    def avg_queries(self):
+        return self._average(self.total_queries)
+
+    @property
+    def avg_db_ms(self):
+        return self._average(self.total_db_ms)
+
+    @property
+    def avg_template_ms(self):
+        return self._average(self.total_template_ms)
+
+    @property
+    def avg_ms(self):
+        return self._average(self.total_ms)
+
+    def __str__(self):
+        return self.view_name
+
+
+class DailyRollup(models.Model):
+    """Precomputed count of one metric on one day, optionally split by a dimension; see `medifiti.rollups`."""
+    METRIC_APPOINTMENTS = 'appointments'
+    METRIC_CONTACTS = 'contacts'
+    METRIC_REGISTRATIONS = 'registrations'
+
+    METRIC_CHOICES = [
+        (METRIC_APPOINTMENTS, 'Appointments'),
+        (METRIC_CONTACTS, 'Contact messages'),
+        (METRIC_REGISTRATIONS, 'Patient registrations'),
+    ]
+
+    DIMENSION_TOTAL = 'total'
+    DIMENSION_DOCTOR = 'doctor'
+    DIMENSION_SERVICE = 'service'
+    DIMENSION_STATUS = 'status'
+
+    DIMENSION_CHOICES = [
+        (DIMENSION_TOTAL, 'Total'),
+        (DIMENSION_DOCTOR, 'Doctor'),
+        (DIMENSION_SERVICE, 'Service'),
+        (DIMENSION_STATUS, 'Status'),
+    ]
+
+    day = models.DateField()
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES, default=DIMENSION_TOTAL)
+    # doctor / service pk or status; empty for totals
+    key = models.CharField(max_length=50, blank=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['day', 'metric', 'dimension', 'key']
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'dimension', 'key', 'day'], name='unique_daily_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['metric', 'dimension', 'day'], name='rollup_series_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.metric}/{self.dimension}/{self.key}: {self.count}"
+
+
+class RollupWatermark(models.Model):
+    """How far `build_rollups` has processed each source; rows changed after `value` are picked up next run."""
+    source = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.source} @ {self.value}"
+
+
+class DoctorForecast(models.Model):
+    """Expected bookings and no-show rate for one doctor, weekday and hour; rebuilt by `build_forecasts`."""
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='forecasts')
+    weekday = models.PositiveSmallIntegerField(choices=DoctorWorkingHours.WEEKDAY_CHOICES)
+    hour = models.PositiveSmallIntegerField()
+    # average bookings made for this hour on one such weekday
+    expected_bookings = models.FloatField()
+    # share of attended-or-missed past bookings that were missed, smoothed towards the doctor's overall rate
+    no_show_rate = models.FloatField()
+    # attended or missed past bookings behind `no_show_rate` (see `medifiti.forecasting`)
+    samples = models.PositiveIntegerField(default=0)
+    built_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['doctor', 'weekday', 'hour']
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'weekday', 'hour'], name='unique_doctor_forecast'),
+        ]
+
+    def __str__(self):
+        return f"Dr. {self.doctor.name} - {self.get_weekday_display()} {self.hour:02d}:00"
+
+
+class MaintenanceRun(models.Model):
+    """One run of a registered maintenance job over a primary-key range; see `medifiti.maintenance`."""
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+
+    job = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    # primary keys low_pk <= id <= high_pk as they were when the run was planned
+    low_pk = models.BigIntegerField(default=0)
+    high_pk = models.BigIntegerField(default=0)
+    chunk_size = models.PositiveIntegerField()
+    workers = models.PositiveSmallIntegerField(default=1)
+    chunks_total = models.PositiveIntegerField(default=0)
+    chunks_done = models.PositiveIntegerField(default=0)
+    rows_processed = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['job', 'status'], name='maintenance_job_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job} #{self.pk} ({self.status}, {self.chunks_done}/{self.chunks_total} chunks)"
+
+
+class MaintenanceChunk(models.Model):
+    """A `start_pk <= id < end_pk` slice of a run; `finished_at` is set in the same transaction as the work."""
+    run = models.ForeignKey(MaintenanceRun, on_delete=models.CASCADE, related_name='chunks')
+    start_pk = models.BigIntegerField()
+    end_pk = models.BigIntegerField()
+    rows = models.PositiveIntegerField(null=True, blank=True)
+    seconds = models.FloatField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run', 'start_pk']
+        indexes = [
+            models.Index(fields=['run', 'finished_at'], name='maintenance_chunk_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.run.job} [{self.start_pk}, {self.end_pk})"
@@ -0,0 +1,158 @@
+"""
+Outbound email queue.
+
+Views and signal handlers call the `queue_*` helpers, which render the
+templates and store an `OutboundEmail` row in the caller's transaction.
+The `send_queued_emails` management command delivers due rows in batches
+over a single SMTP connection, retrying failures with exponential backoff.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+# A claimed message is not handed to another worker until this lease expires.
+CLAIM_LEASE = datetime.timedelta(minutes=5)
+
+
+def max_attempts():
+    return getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 1, 2, 4, 8 ... minutes, capped at one hour."""
+    base = getattr(settings, 'EMAIL_QUEUE_RETRY_SECONDS', 60)
+    return datetime.timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def admin_recipients():
+    return [email for (_name, email) in getattr(settings, 'ADMINS', [])]
+
+
+def build_email(subject, template, context, recipients):
+    """Render `<template>.txt` / `<template>.html` into an unsaved `OutboundEmail`."""
+    return OutboundEmail(
+        subject=subject,
+        body_text=render_to_string(f'{template}.txt', context),
+        body_html=render_to_string(f'{template}.html', context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipients),
+    )
+
+
+def queue_email(subject, template, context, recipients):
+    recipients = [r for r in recipients if r]
+    if not recipients:
+        return None
+    email = build_email(subject, template, context, recipients)
+    email.save()
+    return email
+
+
+def queue_contact_notifications(contact):
+    context = {'contact': contact}
+    queue_email(f"New contact message from {contact.full_name}", 'emails/contact_admin', context, admin_recipients())
+    queue_email('Thanks for contacting HospitalCare', 'emails/contact_user', context, [contact.email])
+
+
+def appointment_patient_email(appointment):
+    if appointment.patient_email:
+        return appointment.patient_email
+    if appointment.patient_user_id:
+        return appointment.patient_user.email
+    if appointment.patient_profile_id:
+        return appointment.patient_profile.user.email
+    return ''
+
+
+def queue_appointment_notifications(appointment):
+    context = {'appointment': appointment, 'doctor': appointment.doctor}
+    queue_email(
+        f"New appointment request for Dr. {appointment.doctor.name}",
+        'emails/appointment_admin', context, admin_recipients(),
+    )
+    queue_email(
+        'Your HospitalCare appointment',
+        'emails/appointment_patient', context, [appointment_patient_email(appointment)],
+    )
+
+
+def queue_status_notifications(appointments):
+    """
+    Queue a status update email for each appointment with a reachable patient, in one insert.
+    Load the appointments with `doctor`, `patient_user` and `patient_profile__user`.
+    """
+    emails = []
+    for appointment in appointments:
+        recipient = appointment_patient_email(appointment)
+        if recipient:
+            context = {'appointment': appointment, 'doctor': appointment.doctor}
+            subject = f'Your HospitalCare appointment is {appointment.get_status_display().lower()}'
+            emails.append(build_email(subject, 'emails/appointment_status', context, [recipient]))
+    OutboundEmail.objects.bulk_create(emails)
+    return len(emails)
+
+
+def claim_due(batch_size):
+    """Lease up to `batch_size` due messages so concurrent workers do not send them twice."""
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if batch:
+            OutboundEmail.objects.filter(pk__in=[e.pk for e in batch]).update(next_attempt_at=now + CLAIM_LEASE)
+    return batch
+
+
+def _record_failure(email, exc):
+    email.last_error = str(exc)
+    if email.attempts >= max_attempts():
+        email.status = OutboundEmail.STATUS_FAILED
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+
+
+def send_batch(batch):
+    """Send `batch` over one connection; returns (sent, failed) counts."""
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        # The server is unreachable: count it as a failed attempt for the whole batch.
+        for email in batch:
+            email.attempts += 1
+            _record_failure(email, exc)
+        OutboundEmail.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at', 'last_error'])
+        return 0, len(batch)
+
+    try:
+        for email in batch:
+            msg = EmailMultiAlternatives(
+                email.subject, email.body_text, email.from_email, email.recipients, connection=connection,
+            )
+            if email.body_html:
+                msg.attach_alternative(email.body_html, 'text/html')
+            email.attempts += 1
+            try:
+                msg.send()
+            except Exception as exc:
+                failed += 1
+                _record_failure(email, exc)
+            else:
+                sent += 1
+                email.status = OutboundEmail.STATUS_SENT
+                email.sent_at = timezone.now()
+                email.last_error = ''
+            email.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    finally:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,77 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET, each page continues strictly after the sort key of the
+last row on the previous page, so page N costs the same as page 1 when the
+ordering is backed by an index. Cursors are opaque URL-safe tokens.
+"""
+import base64
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+@dataclass
+class KeysetPage:
+    items: list = field(default_factory=list)
+    next_cursor: str = ''
+
+    @property
+    def has_next(self):
+        return bool(self.next_cursor)
+
+
+def encode_cursor(values):
+    raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(model, keys, token):
+    """Decode `token` back into typed key values, or None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if len(values) != len(keys):
+            return None
+        return [model._meta.get_field(key).to_python(value) for key, value in zip(keys, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _after(keys, values, descending):
+    """Row-value comparison `(k1, k2, ...) > (v1, v2, ...)` expanded into ORed Q objects."""
+    op = 'lt' if descending else 'gt'
+    condition = Q()
+    for i, key in enumerate(keys):
+        clause = Q(**{f'{key}__{op}': values[i]})
+        for prev_key, prev_value in zip(keys[:i], values[:i]):
+            clause &= Q(**{prev_key: prev_value})
+        condition |= clause
+    return condition
+
+
+def keyset_page(queryset, keys, cursor=None, per_page=50, descending=True):
+    """
+    Return one `KeysetPage` of `queryset` ordered by `keys`.
+
+    The last key must be unique (normally `id`) so the ordering is total.
+    """
+    keys = list(keys)
+    ordering = [f'-{key}' if descending else key for key in keys]
+    queryset = queryset.order_by(*ordering)
+
+    values = decode_cursor(queryset.model, keys, cursor)
+    if values is not None:
+        queryset = queryset.filter(_after(keys, values, descending))
+
+    items = list(queryset[:per_page + 1])
+    next_cursor = ''
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, key) for key in keys])
+    return KeysetPage(items=items, next_cursor=next_cursor)
@@ -0,0 +1,235 @@
+"""
+Reception patient lookup.
+
+Both patient tables (legacy `Patient` records and registered users'
+`PatientProfile`) are mirrored into `PatientLookupKey` rows holding
+normalized keys: lower-cased name words and emails, digits-only phone
+numbers and alphanumeric insurance numbers. Lookups are anchored prefix
+matches on those keys, which the (field, key) index serves directly, so a
+query never scans the patient tables. Keys are refreshed by the signal
+receivers in `medifiti.signals` and by the bulk importer.
+"""
+import re
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.urls import reverse
+
+from .models import Patient, PatientLookupKey, PatientProfile
+
+PATIENT = PatientLookupKey.SOURCE_PATIENT
+PROFILE = PatientLookupKey.SOURCE_PROFILE
+NAME = PatientLookupKey.FIELD_NAME
+EMAIL = PatientLookupKey.FIELD_EMAIL
+PHONE = PatientLookupKey.FIELD_PHONE
+REFERENCE = PatientLookupKey.FIELD_REFERENCE
+
+TOP_K = 10
+MAX_K = 25
+MIN_PREFIX = 2
+MAX_QUERY_WORDS = 4
+# typeahead candidates scored per query, taken after every word has matched
+CANDIDATE_LIMIT = 2000
+# trailing digits kept as an extra phone key, so local and international forms both match
+PHONE_TAIL = 9
+REBUILD_BATCH_SIZE = 2000
+
+KEY_MAX = PatientLookupKey._meta.get_field('key').max_length
+WORD_RE = re.compile(r'[^\W_]+')
+
+Match = namedtuple('Match', 'source obj score')
+
+
+def name_keys(*texts):
+    return {word for text in texts for word in WORD_RE.findall((text or '').lower())}
+
+
+def phone_keys(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    keys = {digits, digits.lstrip('0')}
+    if len(digits) > PHONE_TAIL:
+        keys.add(digits[-PHONE_TAIL:])
+    return {key for key in keys if key}
+
+
+def reference_key(value):
+    return re.sub(r'[\W_]', '', (value or '').lower())
+
+
+def patient_keys(patient):
+    keys = {(NAME, key) for key in name_keys(patient.first_name, patient.last_name)}
+    keys |= {(PHONE, key) for key in phone_keys(patient.phone_number)}
+    if patient.email:
+        keys.add((EMAIL, patient.email.strip().lower()))
+    return keys
+
+
+def profile_keys(profile):
+    user = profile.user
+    keys = {(NAME, key) for key in name_keys(user.first_name, user.last_name, user.username)}
+    keys |= {(PHONE, key) for key in phone_keys(profile.phone)}
+    if user.email:
+        keys.add((EMAIL, user.email.strip().lower()))
+    if reference_key(profile.insurance_number):
+        keys.add((REFERENCE, reference_key(profile.insurance_number)))
+    return keys
+
+
+def _rows(source, object_id, keys):
+    return [
+        PatientLookupKey(field=field, key=key[:KEY_MAX], source=source, object_id=object_id)
+        for field, key in keys
+    ]
+
+
+def _replace(source, objects, keys_func):
+    with transaction.atomic():
+        PatientLookupKey.objects.filter(source=source, object_id__in=[obj.pk for obj in objects]).delete()
+        PatientLookupKey.objects.bulk_create(
+            [row for obj in objects for row in _rows(source, obj.pk, keys_func(obj))],
+            batch_size=REBUILD_BATCH_SIZE,
+        )
+
+
+def index_patients(patients):
+    _replace(PATIENT, list(patients), patient_keys)
+
+
+def index_profiles(profiles):
+    _replace(PROFILE, list(profiles), profile_keys)
+
+
+def remove(source, object_id):
+    PatientLookupKey.objects.filter(source=source, object_id=object_id).delete()
+
+
+def rebuild(batch_size=REBUILD_BATCH_SIZE):
+    """Re-create every key in batches; returns the number of patients and profiles indexed."""
+    PatientLookupKey.objects.all().delete()
+    count = 0
+    for queryset, index in (
+        (Patient.objects.order_by('pk'), index_patients),
+        (PatientProfile.objects.select_related('user').order_by('pk'), index_profiles),
+    ):
+        batch = []
+        for obj in queryset.iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                index(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            index(batch)
+            count += len(batch)
+    return count
+
+
+def _word_condition(word):
+    """Keys a query word can match: emails for '@' words, phones for digits, names otherwise."""
+    if '@' in word:
+        return Q(field=EMAIL, key__startswith=word)
+    digits = re.sub(r'[\s().+-]', '', word)
+    if digits.isdigit():
+        prefixes = {digits, digits.lstrip('0')} - {''}
+        if not prefixes:
+            return Q(pk__in=[])
+        return Q(field=PHONE, key__startswith=min(prefixes, key=len)) | Q(field=REFERENCE, key__startswith=digits)
+    condition = Q(field=NAME, key__startswith=word) | Q(field=EMAIL, key__startswith=word)
+    if reference_key(word) and any(ch.isdigit() for ch in word):
+        condition |= Q(field=REFERENCE, key__startswith=reference_key(word))
+    return condition
+
+
+def query_words(query):
+    # a phone number typed with spaces ("0722 000 111") is one word
+    compact = re.sub(r'[\s().+-]', '', query or '')
+    if compact.isdigit():
+        return [compact] if len(compact) >= MIN_PREFIX else []
+    words = []
+    for word in (query or '').lower().split():
+        if len(word) >= MIN_PREFIX and word not in words:
+            words.append(word)
+    return words[:MAX_QUERY_WORDS]
+
+
+def _matching_keys(words, source=None):
+    """Key rows of the first word whose patient also has a key matching every other word (one SQL query)."""
+    base = PatientLookupKey.objects.all()
+    if source:
+        base = base.filter(source=source)
+    rows = base.filter(_word_condition(words[0]))
+    for word in words[1:]:
+        rows = rows.filter(Exists(
+            PatientLookupKey.objects.filter(source=OuterRef('source'), object_id=OuterRef('object_id'))
+            .filter(_word_condition(word))
+        ))
+    return rows
+
+
+def score(query, source=None):
+    """{(source, object_id): score} for up to `CANDIDATE_LIMIT` patients matching every word of `query`."""
+    words = sorted(query_words(query), key=len, reverse=True)
+    if not words:
+        return {}
+
+    # start from the longest (most selective) word; the limit applies after every word has matched
+    scores = {}
+    # ordered by key so exact and shortest matches survive the candidate limit
+    rows = _matching_keys(words, source).order_by('key').values_list('source', 'object_id', 'key')[:CANDIDATE_LIMIT]
+    for row_source, object_id, key in rows:
+        value = 2 if key == words[0] else 1
+        scores[(row_source, object_id)] = max(scores.get((row_source, object_id), 0), value)
+
+    base = PatientLookupKey.objects.all()
+    for word in words[1:]:
+        if not scores:
+            break
+        candidates = Q()
+        for row_source in {s for s, _id in scores}:
+            candidates |= Q(source=row_source, object_id__in=[i for s, i in scores if s == row_source])
+        best = {}
+        for row_source, object_id, key in base.filter(candidates).filter(_word_condition(word)).values_list('source', 'object_id', 'key'):
+            value = 2 if key == word else 1
+            best[(row_source, object_id)] = max(best.get((row_source, object_id), 0), value)
+        scores = {item: scores[item] + value for item, value in best.items()}
+    return scores
+
+
+def matching(source, query):
+    """Subquery of the ids of every `source` record matching all words of `query`, uncapped (admin search)."""
+    words = query_words(query)
+    if not words:
+        return PatientLookupKey.objects.none().values('object_id')
+    return _matching_keys(sorted(words, key=len, reverse=True), source).values('object_id')
+
+
+def matching_ids(source, query):
+    return sorted(set(matching(source, query).values_list('object_id', flat=True)))
+
+
+def lookup(query, limit=TOP_K):
+    """Top `limit` `Match`es across both patient tables, best first."""
+    limit = max(1, min(limit, MAX_K))
+    ranked = sorted(score(query).items(), key=lambda item: (-item[1], item[0]))[:limit]
+    patients = Patient.objects.in_bulk([i for (s, i), _score in ranked if s == PATIENT])
+    profiles = PatientProfile.objects.select_related('user').in_bulk([i for (s, i), _score in ranked if s == PROFILE])
+    objects = {PATIENT: patients, PROFILE: profiles}
+    return [
+        Match(source, objects[source][object_id], value)
+        for (source, object_id), value in ranked if object_id in objects[source]
+    ]
+
+
+def as_json(match):
+    """Typeahead payload for one `Match`."""
+    obj = match.obj
+    if match.source == PATIENT:
+        name = f'{obj.first_name} {obj.last_name}'
+        email, phone = obj.email, obj.phone_number
+        url = reverse('admin:medifiti_patient_change', args=[obj.pk])
+    else:
+        name = obj.user.get_full_name() or obj.user.username
+        email, phone = obj.user.email, obj.phone
+        url = reverse('admin:medifiti_patientprofile_change', args=[obj.pk])
+    return {'source': match.source, 'id': obj.pk, 'name': name, 'email': email, 'phone': phone, 'url': url}
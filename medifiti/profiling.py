@@ -0,0 +1,205 @@
+"""
+Request profiling.
+
+`ProfilingMiddleware` measures every request it sees: SQL query count and
+time (through a connection execute wrapper), template render time, total
+time and, with PROFILING_TRACE_MEMORY, the tracemalloc peak. Measurements
+are added up per URL name in process memory and flushed into `ViewProfile`
+rows every PROFILING_FLUSH_EVERY requests, one `F()` update per view. The
+flush runs from the `request_finished` signal, which the server sends once
+the response has been delivered, so no client waits for it; the worker that
+served every PROFILING_FLUSH_EVERY-th request still spends that time before
+taking the next one. Each response also carries a `Server-Timing` header
+with the request's numbers.
+
+With PROFILING_CPROFILE_DIR set, a staff user can add `?_profile=1` to any
+URL to get that request's cProfile stats written to the directory.
+
+The middleware is a no-op (removed at startup) unless PROFILING_ENABLED.
+"""
+import contextvars
+import cProfile
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_finished
+from django.db import connections
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.template import base as template_base
+from django.utils import timezone
+
+from .models import ViewProfile
+
+PROFILE_PARAM = '_profile'
+UNRESOLVED = '(unresolved)'
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - start
+
+
+_current = contextvars.ContextVar('medifiti_profiling_stats', default=None)
+
+
+def _timed_render(render):
+    def wrapper(self, context):
+        stats = _current.get()
+        if stats is None:
+            return render(self, context)
+        # {% include %} renders nested templates; only the outermost render is timed
+        stats.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_seconds += time.perf_counter() - start
+    wrapper._medifiti_timed = True
+    return wrapper
+
+
+def _instrument_templates():
+    if not getattr(template_base.Template.render, '_medifiti_timed', False):
+        template_base.Template.render = _timed_render(template_base.Template.render)
+
+
+class Recorder:
+    """Per-process totals waiting to be flushed to `ViewProfile`."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.count = 0
+
+    def add(self, view_name, queries, db_ms, template_ms, total_ms, peak_kb):
+        with self.lock:
+            row = self.pending.setdefault(view_name, [0, 0, 0, 0.0, 0.0, 0.0, 0.0, 0])
+            row[0] += 1
+            row[1] += queries
+            row[2] = max(row[2], queries)
+            row[3] += db_ms
+            row[4] += template_ms
+            row[5] += total_ms
+            row[6] = max(row[6], total_ms)
+            row[7] = max(row[7], peak_kb)
+            self.count += 1
+
+    def flush_if_due(self):
+        with self.lock:
+            if self.count < flush_every():
+                return
+            pending, self.pending, self.count = self.pending, {}, 0
+        flush(pending)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending, self.count = self.pending, {}, 0
+        flush(pending)
+
+
+def flush(pending):
+    now = timezone.now()
+    for view_name, (requests, queries, max_queries, db_ms, template_ms, total_ms, max_ms, peak_kb) in pending.items():
+        updated = ViewProfile.objects.filter(view_name=view_name).update(
+            requests=F('requests') + requests,
+            total_queries=F('total_queries') + queries,
+            max_queries=Greatest('max_queries', max_queries),
+            total_db_ms=F('total_db_ms') + db_ms,
+            total_template_ms=F('total_template_ms') + template_ms,
+            total_ms=F('total_ms') + total_ms,
+            max_ms=Greatest('max_ms', max_ms),
+            max_peak_kb=Greatest('max_peak_kb', peak_kb),
+            last_seen=now,
+        )
+        if not updated:
+            ViewProfile.objects.get_or_create(view_name=view_name, defaults={
+                'requests': requests, 'total_queries': queries, 'max_queries': max_queries,
+                'total_db_ms': db_ms, 'total_template_ms': template_ms, 'total_ms': total_ms,
+                'max_ms': max_ms, 'max_peak_kb': peak_kb, 'last_seen': now,
+            })
+
+
+recorder = Recorder()
+
+
+def flush_every():
+    return getattr(settings, 'PROFILING_FLUSH_EVERY', 50)
+
+
+def flush_finished(sender, **kwargs):
+    recorder.flush_if_due()
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.trace_memory = getattr(settings, 'PROFILING_TRACE_MEMORY', False)
+        self.cprofile_dir = getattr(settings, 'PROFILING_CPROFILE_DIR', '')
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _instrument_templates()
+        request_finished.connect(flush_finished, dispatch_uid='medifiti_profiling_flush')
+
+    def _wants_cprofile(self, request):
+        if not self.cprofile_dir or request.GET.get(PROFILE_PARAM) != '1':
+            return False
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_staff)
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        profiler = cProfile.Profile() if self._wants_cprofile(request) else None
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(stats))
+                if profiler:
+                    response = profiler.runcall(self.get_response, request)
+                else:
+                    response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_ms = (time.perf_counter() - start) * 1000
+        peak_kb = 0
+        if self.trace_memory:
+            peak_kb = max(0, tracemalloc.get_traced_memory()[1] - base_memory) // 1024
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else UNRESOLVED
+        db_ms = stats.db_seconds * 1000
+        template_ms = stats.template_seconds * 1000
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{stats.queries} queries", tpl;dur={template_ms:.1f}, total;dur={total_ms:.1f}'
+        )
+        if profiler:
+            os.makedirs(self.cprofile_dir, exist_ok=True)
+            filename = f"{view_name.replace(':', '_')}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof"
+            profiler.dump_stats(os.path.join(self.cprofile_dir, filename))
+        recorder.add(view_name, stats.queries, db_ms, template_ms, total_ms, peak_kb)
+        return response
@@ -0,0 +1,180 @@
+"""
+Daily report rollups.
+
+`build` keeps `DailyRollup` up to date incrementally. For each source it
+reads the watermark, finds the days that have rows created after it (for
+appointments, also rows whose status moved, from the status history),
+re-aggregates just those days and advances the watermark. Whole days are
+recomputed, so a run is idempotent and the watermark is set `OVERLAP` before
+the run started to pick up rows committed while it was running. Changed
+appointment dates and deletions leave no trace to follow; `build(full=True)`
+recomputes everything.
+
+Appointments are counted on their appointment date, in total and per doctor,
+status and service. An appointment has no service of its own, so it counts
+once for every service its doctor offers.
+
+Reports (`series`, `totals`) read only from the rollup table.
+"""
+import datetime
+from collections import namedtuple
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import (
+    Appointment, AppointmentStatusChange, Contact, DailyRollup, Doctor, PatientProfile, RollupWatermark, Service,
+)
+
+OVERLAP = datetime.timedelta(minutes=5)
+# days re-aggregated per query; keeps `IN (...)` lists short
+DAY_BATCH = 200
+BATCH_SIZE = 2000
+# range shown when a report does not ask for one
+DEFAULT_DAYS = 30
+
+TOTAL = DailyRollup.DIMENSION_TOTAL
+PERIODS = {'day': None, 'week': TruncWeek, 'month': TruncMonth}
+
+Source = namedtuple('Source', 'metric changed_days counts')
+
+
+def _appointment_days(since):
+    created = Appointment.objects.filter(created_at__gt=since)
+    moved = Appointment.objects.filter(
+        pk__in=AppointmentStatusChange.objects.filter(at__gt=since).values('appointment_id')
+    )
+    return {
+        day for queryset in (created, moved)
+        for day in queryset.order_by().values_list('appointment_date', flat=True).distinct()
+    }
+
+
+def _appointment_counts(days):
+    appointments = Appointment.objects.order_by()
+    if days is not None:
+        appointments = appointments.filter(appointment_date__in=days)
+    for day, n in appointments.values_list('appointment_date').annotate(n=Count('id')):
+        yield day, TOTAL, '', n
+    for dimension, field in (
+        (DailyRollup.DIMENSION_DOCTOR, 'doctor_id'),
+        (DailyRollup.DIMENSION_STATUS, 'status'),
+        (DailyRollup.DIMENSION_SERVICE, 'doctor__services'),
+    ):
+        grouped = appointments.filter(**{f'{field}__isnull': False})
+        for day, key, n in grouped.values_list('appointment_date', field).annotate(n=Count('id')):
+            yield day, dimension, str(key), n
+
+
+def _created_days(model, field):
+    def changed_days(since):
+        return set(
+            model.objects.filter(**{f'{field}__gt': since}).order_by()
+            .annotate(day=TruncDate(field)).values_list('day', flat=True).distinct()
+        )
+    return changed_days
+
+
+def _created_counts(model, field):
+    def counts(days):
+        rows = model.objects.order_by()
+        if days is not None:
+            rows = rows.filter(**{f'{field}__date__in': days})
+        for day, n in rows.annotate(day=TruncDate(field)).values_list('day').annotate(n=Count('id')):
+            yield day, TOTAL, '', n
+    return counts
+
+
+SOURCES = [
+    Source(DailyRollup.METRIC_APPOINTMENTS, _appointment_days, _appointment_counts),
+    Source(DailyRollup.METRIC_CONTACTS, _created_days(Contact, 'created_at'), _created_counts(Contact, 'created_at')),
+    Source(
+        DailyRollup.METRIC_REGISTRATIONS,
+        _created_days(PatientProfile, 'date_registered'), _created_counts(PatientProfile, 'date_registered'),
+    ),
+]
+
+
+def _recompute(source, days):
+    """Replace the rollup rows of `days` (None: every day) with fresh counts; returns rows written."""
+    stale = DailyRollup.objects.filter(metric=source.metric)
+    if days is not None:
+        stale = stale.filter(day__in=days)
+    stale.delete()
+    rows = (
+        DailyRollup(day=day, metric=source.metric, dimension=dimension, key=key, count=n)
+        for day, dimension, key, n in source.counts(days)
+    )
+    written = 0
+    while batch := list(islice(rows, BATCH_SIZE)):
+        DailyRollup.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def build(full=False):
+    """Bring every rollup up to date; returns {metric: number of days recomputed, or 'all'}."""
+    started = timezone.now()
+    result = {}
+    for source in SOURCES:
+        watermark = RollupWatermark.objects.filter(source=source.metric).first()
+        days = None if full or watermark is None else sorted(source.changed_days(watermark.value))
+        with transaction.atomic():
+            if days is None:
+                _recompute(source, None)
+            else:
+                for start in range(0, len(days), DAY_BATCH):
+                    _recompute(source, days[start:start + DAY_BATCH])
+            RollupWatermark.objects.update_or_create(source=source.metric, defaults={'value': started - OVERLAP})
+        result[source.metric] = 'all' if days is None else len(days)
+    return result
+
+
+def _rollups(metric, dimension, start=None, end=None, keys=None):
+    rows = DailyRollup.objects.filter(metric=metric, dimension=dimension)
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+    if keys:
+        rows = rows.filter(key__in=keys)
+    return rows
+
+
+def series(metric, dimension=TOTAL, start=None, end=None, period='day', keys=None):
+    """{key: [(period start, count), ...]} for `metric` split by `dimension`, summed per `period`."""
+    bucket = F('day') if PERIODS[period] is None else PERIODS[period]('day')
+    rows = (
+        _rollups(metric, dimension, start, end, keys)
+        .annotate(period=bucket).values_list('key', 'period').annotate(n=Sum('count')).order_by('key', 'period')
+    )
+    result = {}
+    for key, when, n in rows:
+        result.setdefault(key, []).append((when, n))
+    return result
+
+
+def totals(metric, dimension=TOTAL, start=None, end=None, limit=None):
+    """[(key, count), ...] over the range, largest first."""
+    rows = (
+        _rollups(metric, dimension, start, end)
+        .values_list('key').annotate(n=Sum('count')).order_by('-n', 'key')
+    )
+    return list(rows[:limit] if limit else rows)
+
+
+def labels(dimension, keys):
+    """Display names for rollup keys (doctor and service names are looked up by pk)."""
+    keys = list(keys)
+    if dimension == DailyRollup.DIMENSION_DOCTOR:
+        names = {str(pk): f'Dr. {name}' for pk, name in Doctor.objects.filter(pk__in=keys).values_list('pk', 'name')}
+    elif dimension == DailyRollup.DIMENSION_SERVICE:
+        names = {str(pk): title for pk, title in Service.objects.filter(pk__in=keys).values_list('pk', 'title')}
+    elif dimension == DailyRollup.DIMENSION_STATUS:
+        names = dict(Appointment.STATUS_CHOICES)
+    else:
+        names = {'': 'Total'}
+    return {key: names.get(key, key) for key in keys}
@@ -0,0 +1,59 @@
+"""
+Doctor dashboard data: the cached user -> doctor mapping and the doctor's
+day schedule (today and upcoming), with history paged separately.
+"""
+import datetime
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Appointment, Doctor
+from .pagination import keyset_page
+
+DOCTOR_KEY = 'doctor_for_user:{}'
+DOCTOR_CACHE_TIMEOUT = 60 * 60
+
+UPCOMING_DAYS = 30
+UPCOMING_LIMIT = 200
+HISTORY_PER_PAGE = 25
+
+# Everything the dashboard templates render about the patient, loaded in the same query.
+PATIENT_RELATED = ('patient_user', 'patient_profile__user')
+
+
+def doctor_for_user(user):
+    """Return the Doctor for `user`, creating it on first use; cached until the doctor changes."""
+    key = DOCTOR_KEY.format(user.pk)
+    doctor = cache.get(key)
+    if doctor is None:
+        doctor, _created = Doctor.objects.get_or_create(
+            user=user, defaults={'name': user.get_full_name() or user.username}
+        )
+        cache.set(key, doctor, DOCTOR_CACHE_TIMEOUT)
+    return doctor
+
+
+def forget_doctor(user_id):
+    if user_id:
+        cache.delete(DOCTOR_KEY.format(user_id))
+
+
+def upcoming(doctor, today=None):
+    """Today's and the next `UPCOMING_DAYS` days' appointments, soonest first."""
+    today = today or timezone.localdate()
+    return list(
+        Appointment.objects.filter(
+            doctor=doctor,
+            appointment_date__gte=today,
+            appointment_date__lt=today + datetime.timedelta(days=UPCOMING_DAYS),
+        )
+        .select_related(*PATIENT_RELATED)
+        .order_by('appointment_date', 'appointment_time')[:UPCOMING_LIMIT]
+    )
+
+
+def history_page(doctor, cursor=None, today=None):
+    """Past appointments, most recent first, one keyset page at a time."""
+    today = today or timezone.localdate()
+    queryset = Appointment.objects.filter(doctor=doctor, appointment_date__lt=today).select_related(*PATIENT_RELATED)
+    return keyset_page(queryset, ('appointment_date', 'appointment_time', 'id'), cursor=cursor, per_page=HISTORY_PER_PAGE)
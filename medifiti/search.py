@@ -0,0 +1,159 @@
+"""
+Site search over doctors and services.
+
+Searchable text is tokenized into a small inverted index (`SearchTerm`):
+one row per distinct term per object, weighted by the field it came from.
+The signal receivers in `medifiti.signals` re-index an object whenever it
+(or, for doctors, one of their services) changes, so queries never scan
+the source tables. A query matches objects that contain every query word as
+a term prefix; objects are ranked by the summed weight of their best
+matching term per word, with whole-word matches counting double.
+"""
+import hashlib
+import re
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import caching
+from .models import Doctor, SearchTerm, Service
+
+DOCTOR = SearchTerm.KIND_DOCTOR
+SERVICE = SearchTerm.KIND_SERVICE
+
+MAX_QUERY_WORDS = 6
+RESULT_LIMIT = 20
+
+TERM_MAX = SearchTerm._meta.get_field('term').max_length
+WORD_RE = re.compile(r'\w+')
+STOPWORDS = frozenset('a an and are for in is of on or the to with our we you your'.split())
+
+Hit = namedtuple('Hit', 'kind obj score')
+
+
+def tokenize(text):
+    """Lower-case words of `text` worth indexing."""
+    return [
+        word[:TERM_MAX] for word in WORD_RE.findall((text or '').lower())
+        if len(word) > 1 and word not in STOPWORDS
+    ]
+
+
+def _weights(fields):
+    """{term: weight} from (text, weight) pairs, keeping each term's heaviest field."""
+    weights = {}
+    for text, weight in fields:
+        for term in tokenize(text):
+            if weights.get(term, 0) < weight:
+                weights[term] = weight
+    return weights
+
+
+def doctor_fields(doctor, service_titles):
+    fields = [(doctor.name, 5), (doctor.specialty, 4), (doctor.description, 1)]
+    return fields + [(title, 3) for title in service_titles]
+
+
+def service_fields(service):
+    return [(service.title, 5), (service.short_description, 2), (service.description, 1)]
+
+
+def _replace(kind, object_id, weights):
+    with transaction.atomic():
+        SearchTerm.objects.filter(kind=kind, object_id=object_id).delete()
+        SearchTerm.objects.bulk_create([
+            SearchTerm(term=term, kind=kind, object_id=object_id, weight=weight)
+            for term, weight in weights.items()
+        ])
+
+
+def index_doctor(doctor):
+    titles = doctor.services.values_list('title', flat=True)
+    _replace(DOCTOR, doctor.pk, _weights(doctor_fields(doctor, titles)))
+
+
+def index_service(service):
+    _replace(SERVICE, service.pk, _weights(service_fields(service)))
+
+
+def index_doctors(doctor_ids):
+    for doctor in Doctor.objects.filter(pk__in=doctor_ids):
+        index_doctor(doctor)
+
+
+def remove(kind, object_id):
+    SearchTerm.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def rebuild():
+    """Rebuild the whole index; returns the number of objects indexed."""
+    rows = []
+    doctors = Doctor.objects.prefetch_related('services')
+    for doctor in doctors:
+        weights = _weights(doctor_fields(doctor, [service.title for service in doctor.services.all()]))
+        rows += [SearchTerm(term=t, kind=DOCTOR, object_id=doctor.pk, weight=w) for t, w in weights.items()]
+    services = list(Service.objects.all())
+    for service in services:
+        rows += [SearchTerm(term=t, kind=SERVICE, object_id=service.pk, weight=w) for t, w in _weights(service_fields(service)).items()]
+    with transaction.atomic():
+        SearchTerm.objects.all().delete()
+        SearchTerm.objects.bulk_create(rows, batch_size=2000)
+    return len(doctors) + len(services)
+
+
+def score(query, kind=None):
+    """{(kind, object_id): score} for objects matching every word of `query`."""
+    words = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_WORDS]
+    if not words:
+        return {}
+    condition = Q()
+    for word in words:
+        condition |= Q(term__startswith=word)
+    rows = SearchTerm.objects.filter(condition)
+    if kind:
+        rows = rows.filter(kind=kind)
+
+    # best weight per (object, query word)
+    best = defaultdict(dict)
+    for term, row_kind, object_id, weight in rows.values_list('term', 'kind', 'object_id', 'weight'):
+        matches = best[(row_kind, object_id)]
+        for word in words:
+            if term.startswith(word):
+                value = weight * 2 if term == word else weight
+                if matches.get(word, 0) < value:
+                    matches[word] = value
+    return {key: sum(matches.values()) for key, matches in best.items() if len(matches) == len(words)}
+
+
+def matching_ids(kind, query):
+    return [object_id for _kind, object_id in score(query, kind)]
+
+
+def search(query, limit=RESULT_LIMIT):
+    """Ranked `Hit`s for active services and doctors; cached until either changes."""
+    normalized = ' '.join(list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_WORDS])
+    if not normalized:
+        return []
+    name = 'search:{}:{}'.format(hashlib.md5(normalized.encode()).hexdigest(), limit)
+    return caching.fragment(name, [caching.SERVICES, caching.DOCTORS], lambda: _search(normalized, limit))
+
+
+def _search(query, limit):
+    scores = score(query)
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    ids = defaultdict(list)
+    for (kind, object_id), _score in ranked:
+        ids[kind].append(object_id)
+    objects = {
+        DOCTOR: Doctor.objects.in_bulk(ids[DOCTOR]),
+        SERVICE: Service.objects.filter(active=True).in_bulk(ids[SERVICE]),
+    }
+    hits = []
+    for (kind, object_id), value in ranked:
+        obj = objects[kind].get(object_id)
+        if obj is not None:
+            hits.append(Hit(kind, obj, value))
+            if len(hits) >= limit:
+                break
+    return hits
@@ -0,0 +1,215 @@
+"""Signal receivers for the medifiti app, connected in `MedifitiConfig.ready`."""
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import caching, identity, lab, notifications, patient_lookup, schedules, search, stats, transitions
+from .models import (
+    Appointment, Contact, Department, Doctor, Facility, LabSample, LabSampleEvent, Patient, PatientProfile, Service,
+    Symptom, TriageRule,
+)
+
+
+@receiver(post_save, sender=Contact)
+def queue_contact_emails(sender, instance, created, **kwargs):
+    if created:
+        notifications.queue_contact_notifications(instance)
+
+
+@receiver(post_save, sender=Appointment)
+def queue_appointment_emails(sender, instance, created, **kwargs):
+    if created:
+        notifications.queue_appointment_notifications(instance)
+
+
+@receiver(post_save, sender=Appointment)
+def open_status_timeline(sender, instance, created, **kwargs):
+    if created:
+        transitions.record_created(instance)
+
+
+@receiver(post_save, sender=Patient)
+def count_patient_created(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust(stats.KEY_PATIENTS, 1)
+
+
+@receiver(post_delete, sender=Patient)
+def count_patient_deleted(sender, instance, **kwargs):
+    stats.adjust(stats.KEY_PATIENTS, -1)
+
+
+@receiver(post_save, sender=Contact)
+def count_contact_created(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust(stats.KEY_CONTACTS, 1)
+
+
+@receiver(post_delete, sender=Contact)
+def count_contact_deleted(sender, instance, **kwargs):
+    stats.adjust(stats.KEY_CONTACTS, -1)
+
+
+@receiver(post_save, sender=Appointment)
+def count_appointment_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.appointment_changed(None, None, instance.status, instance.appointment_date)
+    elif not hasattr(instance, '_loaded_status'):
+        # saved without having been loaded: the previous state is unknown
+        stats.invalidate_appointments()
+    else:
+        stats.appointment_changed(
+            getattr(instance, '_loaded_status', None), getattr(instance, '_loaded_date', None),
+            instance.status, instance.appointment_date,
+        )
+    instance._loaded_status = instance.status
+    instance._loaded_date = instance.appointment_date
+
+
+@receiver(post_delete, sender=Appointment)
+def count_appointment_deleted(sender, instance, **kwargs):
+    stats.appointment_changed(
+        getattr(instance, '_loaded_status', instance.status), getattr(instance, '_loaded_date', instance.appointment_date),
+        None, None,
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def maintain_patient_identity(sender, instance, created, **kwargs):
+    if created:
+        identity.link_guest_appointments(instance)
+    elif getattr(instance, '_loaded_email', instance.email) != instance.email \
+            or getattr(instance, '_loaded_email_verified', instance.email_verified) != instance.email_verified:
+        identity.rekey_user_appointments(instance)
+        identity.link_guest_appointments(instance)
+    instance._loaded_email = instance.email
+    instance._loaded_email_verified = instance.email_verified
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def forget_cached_doctor(sender, instance, **kwargs):
+    schedules.forget_doctor(instance.user_id)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_services(sender, **kwargs):
+    caching.invalidate(caching.SERVICES)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(m2m_changed, sender=Doctor.services.through)
+def invalidate_doctors(sender, **kwargs):
+    caching.invalidate(caching.DOCTORS)
+
+
+@receiver(post_save, sender=Facility)
+@receiver(post_delete, sender=Facility)
+def invalidate_facility(sender, **kwargs):
+    caching.invalidate(caching.FACILITY)
+
+
+@receiver(post_save, sender=Symptom)
+@receiver(post_delete, sender=Symptom)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=TriageRule)
+@receiver(post_delete, sender=TriageRule)
+def invalidate_triage(sender, **kwargs):
+    caching.invalidate(caching.TRIAGE)
+
+
+@receiver(post_save, sender=Doctor)
+def index_doctor(sender, instance, **kwargs):
+    search.index_doctor(instance)
+
+
+@receiver(post_delete, sender=Doctor)
+def unindex_doctor(sender, instance, **kwargs):
+    search.remove(search.DOCTOR, instance.pk)
+
+
+@receiver(m2m_changed, sender=Doctor.services.through)
+def reindex_doctor_services(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        instance._search_doctor_ids = list(instance.doctors.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        search.index_doctor(instance)
+    else:
+        # instance is a Service; the doctors whose service titles changed are in pk_set
+        search.index_doctors(pk_set if pk_set is not None else getattr(instance, '_search_doctor_ids', []))
+
+
+@receiver(post_save, sender=Service)
+def index_service(sender, instance, **kwargs):
+    search.index_service(instance)
+    # doctors are indexed under the titles of the services they offer
+    search.index_doctors(instance.doctors.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Service)
+def remember_service_doctors(sender, instance, **kwargs):
+    instance._search_doctor_ids = list(instance.doctors.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Service)
+def unindex_service(sender, instance, **kwargs):
+    search.remove(search.SERVICE, instance.pk)
+    search.index_doctors(getattr(instance, '_search_doctor_ids', []))
+
+
+@receiver(post_save, sender=Patient)
+def index_patient(sender, instance, **kwargs):
+    patient_lookup.index_patients([instance])
+
+
+@receiver(post_delete, sender=Patient)
+def unindex_patient(sender, instance, **kwargs):
+    patient_lookup.remove(patient_lookup.PATIENT, instance.pk)
+
+
+@receiver(post_save, sender=PatientProfile)
+def index_patient_profile(sender, instance, **kwargs):
+    patient_lookup.index_profiles([instance])
+
+
+@receiver(post_delete, sender=PatientProfile)
+def unindex_patient_profile(sender, instance, **kwargs):
+    patient_lookup.remove(patient_lookup.PROFILE, instance.pk)
+
+
+LOOKUP_USER_FIELDS = {'first_name', 'last_name', 'username', 'email'}
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reindex_user_profile(sender, instance, created, update_fields=None, **kwargs):
+    # a new user's profile is indexed by its own post_save; logins only touch last_login
+    if created or (update_fields is not None and not LOOKUP_USER_FIELDS & set(update_fields)):
+        return
+    try:
+        profile = instance.patient_profile
+    except PatientProfile.DoesNotExist:
+        return
+    patient_lookup.index_profiles([profile])
+
+
+@receiver(post_save, sender=LabSample)
+def record_lab_status(sender, instance, created, **kwargs):
+    # bulk instrument updates write their own events, see lab.apply_status_updates
+    if created or getattr(instance, '_loaded_status', instance.status) != instance.status:
+        LabSampleEvent.objects.create(
+            sample=instance, status=instance.status, notes=instance.notes, recorded_at=instance.status_changed_at
+        )
+    instance._loaded_status = instance.status
+    # after a rename the old id must stop finding the sample, and the new one may be cached as missing
+    lab.forget(*{getattr(instance, '_loaded_sample_key', None) or instance.sample_key, instance.sample_key})
+    instance._loaded_sample_key = instance.sample_key
+
+
+@receiver(post_delete, sender=LabSample)
+def forget_lab_sample(sender, instance, **kwargs):
+    lab.forget(instance.sample_key)
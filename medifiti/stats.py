@@ -0,0 +1,116 @@
+"""
+Dashboard counters.
+
+Counts are cached and adjusted in place by the signal receivers in
+`medifiti.signals` as rows are created, changed or deleted, so the admin
+dashboard never counts whole tables on a request. A missing key is
+recomputed with one aggregate query; the timeout bounds any drift from
+writes that bypass signals (e.g. `QuerySet.update`).
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Appointment, Contact, Patient
+
+KEY_PATIENTS = 'stats:patients'
+KEY_CONTACTS = 'stats:contacts'
+STATUS_KEY = 'stats:appointments:status:{}'
+DAY_KEY = 'stats:appointments:day:{}'
+
+
+def cache_timeout():
+    return getattr(settings, 'STATS_CACHE_TIMEOUT', 300)
+
+
+def _status_keys():
+    return [STATUS_KEY.format(status) for status, _label in Appointment.STATUS_CHOICES]
+
+
+def _counts_for_day(day):
+    return Appointment.objects.filter(appointment_date=day).exclude(status=Appointment.STATUS_CANCELLED).count()
+
+
+def dashboard_counts():
+    """Patients, contacts, appointments by status and today's active appointments."""
+    today = timezone.localdate()
+    day_key = DAY_KEY.format(today.isoformat())
+    keys = [KEY_PATIENTS, KEY_CONTACTS, day_key] + _status_keys()
+    values = cache.get_many(keys)
+
+    missing = {}
+    if KEY_PATIENTS not in values:
+        missing[KEY_PATIENTS] = Patient.objects.count()
+    if KEY_CONTACTS not in values:
+        missing[KEY_CONTACTS] = Contact.objects.count()
+    if day_key not in values:
+        missing[day_key] = _counts_for_day(today)
+    if any(key not in values for key in _status_keys()):
+        by_status = dict(Appointment.objects.values_list('status').annotate(n=Count('id')).order_by())
+        for status, _label in Appointment.STATUS_CHOICES:
+            missing[STATUS_KEY.format(status)] = by_status.get(status, 0)
+    if missing:
+        cache.set_many(missing, cache_timeout())
+        values.update(missing)
+
+    by_status = [
+        (status, label, values[STATUS_KEY.format(status)]) for status, label in Appointment.STATUS_CHOICES
+    ]
+    return {
+        'patients': values[KEY_PATIENTS],
+        'contacts': values[KEY_CONTACTS],
+        'appointments_total': sum(count for _status, _label, count in by_status),
+        'appointments_by_status': by_status,
+        'appointments_today': values[day_key],
+    }
+
+
+def adjust(key, delta):
+    """Apply `delta` to a cached counter; a missing key is left for lazy recomputation."""
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        pass
+
+
+def invalidate_appointments():
+    """Drop appointment counters so the next dashboard view recounts them."""
+    cache.delete_many(_status_keys() + [DAY_KEY.format(timezone.localdate().isoformat())])
+
+
+def _counted(status, day):
+    return status is not None and status != Appointment.STATUS_CANCELLED and day is not None
+
+
+def appointment_changed(old_status, old_date, new_status, new_date):
+    """Move an appointment between counters; pass None for the side that does not exist."""
+    if old_status != new_status:
+        if old_status:
+            adjust(STATUS_KEY.format(old_status), -1)
+        if new_status:
+            adjust(STATUS_KEY.format(new_status), 1)
+
+    if old_date == new_date:
+        adjust(DAY_KEY.format(new_date), int(_counted(new_status, new_date)) - int(_counted(old_status, old_date)))
+    else:
+        if _counted(old_status, old_date):
+            adjust(DAY_KEY.format(old_date), -1)
+        if _counted(new_status, new_date):
+            adjust(DAY_KEY.format(new_date), 1)
+
+
+def appointments_moved(changes, new_status):
+    """Bulk `appointment_changed` for (old status, date) pairs all moved to `new_status`; one cache call per key."""
+    deltas = Counter()
+    for old_status, day in changes:
+        if old_status != new_status:
+            deltas[STATUS_KEY.format(old_status)] -= 1
+            deltas[STATUS_KEY.format(new_status)] += 1
+        deltas[DAY_KEY.format(day)] += int(_counted(new_status, day)) - int(_counted(old_status, day))
+    for key, delta in deltas.items():
+        adjust(key, delta)
@@ -0,0 +1,79 @@
+"""
+Query budgets for views and admin pages.
+
+A budget states the most queries a page may run and that the number does
+not depend on how many rows it shows. `QueryBudgetMixin.assertQueryBudget`
+fetches a page at two fixture sizes and fails if either request went over
+the budget or the larger one ran more queries than the smaller, which is
+what an N+1 introduced by a template or `list_display` field looks like.
+`query_budget` turns a fixture method into such a test:
+
+    @query_budget(8)
+    def test_appointments(self, rows):
+        make_appointments(rows)
+        return reverse('appointments')
+"""
+import functools
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Rows in the fixture at the small and the large measurement.
+SIZES = (2, 12)
+
+
+class QueryBudgetMixin:
+    """TestCase mixin; requests go through `self.client` unless another client is passed."""
+
+    def count_queries(self, url, client=None):
+        """Fetch `url` with cold caches; returns the captured queries."""
+        client = client or self.client
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f'GET {url} returned {response.status_code}')
+        return captured
+
+    def assertQueryBudget(self, grow, max_queries, sizes=SIZES, client=None):
+        """
+        `grow(rows)` adds `rows` more fixture rows and returns the URL to fetch.
+        The page is measured once per entry in `sizes` (cumulative row counts).
+        """
+        measured = []
+        created = 0
+        for size in sizes:
+            url = grow(size - created)
+            created = size
+            if not measured:
+                # first request fills process-wide caches (content types, permissions) so they are not counted
+                (client or self.client).get(url)
+            measured.append((size, url, self.count_queries(url, client)))
+
+        (small, _url, first), (large, url, last) = measured[0], measured[-1]
+        if len(last) > len(first):
+            self.fail(self._report(
+                f'GET {url} ran {len(first)} queries with {small} rows but {len(last)} with {large} rows', last,
+            ))
+        for size, url, captured in measured:
+            if len(captured) > max_queries:
+                self.fail(self._report(
+                    f'GET {url} ran {len(captured)} queries with {size} rows; budget is {max_queries}', captured,
+                ))
+
+    @staticmethod
+    def _report(message, captured):
+        queries = '\n'.join(f"{i}. {query['sql']}" for i, query in enumerate(captured.captured_queries, 1))
+        return f'{message}:\n{queries}'
+
+
+def query_budget(max_queries, sizes=SIZES):
+    """Decorate a `(self, rows)` fixture method of a `QueryBudgetMixin` test case; see the module docstring."""
+    def decorator(fixture):
+        @functools.wraps(fixture)
+        def test(self):
+            self.assertQueryBudget(lambda rows: fixture(self, rows), max_queries, sizes)
+        return test
+    return decorator
@@ -1,7 +1,37 @@
-from django.test import TestCase, override_settings
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.utils import timezone
 from django.core import mail
-from .models import Contact, Doctor, Appointment
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from . import (
+	availability, benchmarking, booking, caching, export_jobs, exports, forecasting, identity, imports, lab,
+	notifications, maintenance, patient_lookup, profiling, rollups, schedules, search, stats, transitions, triage, views,
+)
+from .models import (
+	CustomUser, Contact, Doctor, DoctorWorkingHours, Appointment, OutboundEmail, Patient, ExportJob, Service, Facility,
+	SearchTerm, PatientLookupKey, LabSample, Symptom, Department, TriageRule, ViewProfile, AppointmentStatusChange,
+	DailyRollup, RollupWatermark, DoctorForecast, MaintenanceRun,
+)
+from .forms import AppointmentForm
+from .testing import QueryBudgetMixin, query_budget
 
 
 @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
@@ -15,6 +45,9 @@ class ContactBookingTests(TestCase):
 		resp = self.client.post(reverse('contact'), data)
 		# Contact saved
 		self.assertEqual(Contact.objects.filter(email='test@example.com').count(), 1)
+		# Emails are queued, not sent inside the request
+		self.assertEqual(len(mail.outbox), 0)
+		call_command('send_queued_emails', '--once', stdout=StringIO())
 		# At least one email sent (confirmation to user)
 		self.assertGreaterEqual(len(mail.outbox), 1)
 
@@ -31,5 +64,1392 @@ class ContactBookingTests(TestCase):
 		}
 		resp = self.client.post(url, data, follow=True)
 		self.assertEqual(Appointment.objects.filter(patient_email='alice@example.com').count(), 1)
+		call_command('send_queued_emails', '--once', stdout=StringIO())
 		# At least one email (confirmation to patient and/or admin)
 		self.assertGreaterEqual(len(mail.outbox), 1)
+
+
+class AvailabilityTests(TestCase):
+	def setUp(self):
+		self.doctor = Doctor.objects.create(name='Slot Doc', specialty='Cardiology')
+		# 2030-01-07 is a Monday
+		self.monday = datetime.date(2030, 1, 7)
+		DoctorWorkingHours.objects.create(
+			doctor=self.doctor, weekday=0,
+			start_time=datetime.time(9, 0), end_time=datetime.time(10, 30),
+		)
+
+	def test_booked_slots_are_skipped(self):
+		Appointment.objects.create(
+			doctor=self.doctor, patient_name='Bob', patient_email='bob@example.com',
+			appointment_date=self.monday, appointment_time=datetime.time(9, 0),
+		)
+		start = datetime.datetime.combine(self.monday, datetime.time(8, 0))
+		with self.assertNumQueries(2):
+			slots = availability.doctor_free_slots(self.doctor, count=3, start=start)
+		self.assertEqual(
+			[(s.date, s.time) for s in slots],
+			[
+				(self.monday, datetime.time(9, 30)),
+				(self.monday, datetime.time(10, 0)),
+				(self.monday + datetime.timedelta(days=7), datetime.time(9, 0)),
+			],
+		)
+
+	def test_free_slots_endpoint_by_specialty(self):
+		resp = self.client.get(reverse('free_slots'), {'specialty': 'cardiology', 'count': 2})
+		self.assertEqual(resp.status_code, 200)
+		payload = resp.json()
+		self.assertEqual(len(payload['slots']), 2)
+		self.assertEqual(payload['slots'][0]['doctor_id'], self.doctor.id)
+
+	def test_free_slots_endpoint_rejects_bad_doctor(self):
+		resp = self.client.get(reverse('free_slots'), {'doctor': 'abc'})
+		self.assertEqual(resp.status_code, 400)
+		self.assertIn('error', resp.json())
+
+
+class BookingTests(TestCase):
+	def setUp(self):
+		self.doctor = Doctor.objects.create(name='Busy Doc', specialty='General')
+		self.data = {
+			'patient_name': 'Alice',
+			'patient_email': 'alice@example.com',
+			'patient_phone': '1234567890',
+			'appointment_date': '2030-01-07',
+			'appointment_time': '09:00',
+			'reason': 'Checkup',
+		}
+
+	def test_second_booking_for_same_slot_is_rejected(self):
+		url = reverse('book_appointment', args=[self.doctor.id])
+		self.client.post(url, self.data)
+		resp = self.client.post(url, dict(self.data, patient_email='eve@example.com'))
+		self.assertEqual(resp.status_code, 200)
+		self.assertContains(resp, 'already booked')
+		self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 1)
+
+	def test_cancelled_slot_can_be_rebooked(self):
+		booking.book(Appointment(
+			doctor=self.doctor, patient_name='Bob', patient_email='bob@example.com',
+			appointment_date=datetime.date(2030, 1, 7), appointment_time=datetime.time(9, 0),
+			status=Appointment.STATUS_CANCELLED,
+		))
+		booking.book(Appointment(
+			doctor=self.doctor, patient_name='Carol', patient_email='carol@example.com',
+			appointment_date=datetime.date(2030, 1, 7), appointment_time=datetime.time(9, 0),
+		))
+		with self.assertRaises(booking.SlotUnavailable):
+			booking.book(Appointment(
+				doctor=self.doctor, patient_name='Dan', patient_email='dan@example.com',
+				appointment_date=datetime.date(2030, 1, 7), appointment_time=datetime.time(9, 15),
+			))
+
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailQueueTests(TestCase):
+	def test_failed_send_is_retried_with_backoff(self):
+		Contact.objects.create(full_name='Test User', email='test@example.com', message='Hi')
+		queued = OutboundEmail.objects.count()
+		self.assertGreaterEqual(queued, 1)
+
+		with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+			sent, failed = notifications.send_batch(notifications.claim_due(10))
+		self.assertEqual((sent, failed), (0, queued))
+		email = OutboundEmail.objects.first()
+		self.assertEqual(email.status, OutboundEmail.STATUS_PENDING)
+		self.assertEqual(email.attempts, 1)
+		self.assertEqual(email.last_error, 'down')
+		# not due again until the backoff has elapsed
+		self.assertEqual(notifications.claim_due(10), [])
+
+
+class AdminAppointmentsTests(TestCase):
+	def setUp(self):
+		self.admin = CustomUser.objects.create_user('boss', password='pw', role=CustomUser.ROLE_ADMIN)
+		self.client.force_login(self.admin)
+		self.doctor = Doctor.objects.create(name='Page Doc')
+		for day in (1, 2, 3):
+			Appointment.objects.create(
+				doctor=self.doctor, patient_name=f'P{day}', patient_email=f'p{day}@example.com',
+				appointment_date=datetime.date(2030, 1, day), appointment_time=datetime.time(9, 0),
+			)
+
+	def test_keyset_pages_newest_first(self):
+		with mock.patch.object(views, 'APPOINTMENTS_PER_PAGE', 2):
+			resp = self.client.get(reverse('admin_appointments'))
+			self.assertEqual([a.patient_name for a in resp.context['appointments']], ['P3', 'P2'])
+			resp = self.client.get(reverse('admin_appointments') + '?' + resp.context['next_query'])
+		self.assertEqual([a.patient_name for a in resp.context['appointments']], ['P1'])
+		self.assertEqual(resp.context['next_query'], '')
+
+	def test_filters_by_date_range(self):
+		resp = self.client.get(reverse('admin_appointments'), {'date_from': '2030-01-02', 'date_to': '2030-01-02'})
+		self.assertEqual([a.patient_name for a in resp.context['appointments']], ['P2'])
+
+
+class DashboardStatsTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.doctor = Doctor.objects.create(name='Stats Doc')
+
+	def test_counters_follow_creates_updates_and_deletes(self):
+		Patient.objects.create(first_name='A', last_name='B')
+		self.assertEqual(stats.dashboard_counts()['patients'], 1)
+
+		today = timezone.localdate()
+		appt = Appointment.objects.create(
+			doctor=self.doctor, patient_name='Ann', appointment_date=today, appointment_time=datetime.time(9, 0),
+		)
+		Patient.objects.create(first_name='C', last_name='D')
+		transitions.transition(appt, Appointment.STATUS_CANCELLED)
+		Contact.objects.create(full_name='X', email='x@example.com', message='m')
+
+		with self.assertNumQueries(0):
+			counts = stats.dashboard_counts()
+		self.assertEqual(counts['patients'], 2)
+		self.assertEqual(counts['contacts'], 1)
+		self.assertEqual(counts['appointments_today'], 0)
+		self.assertIn(('cancelled', 'Cancelled', 1), counts['appointments_by_status'])
+
+		appt.delete()
+		self.assertEqual(stats.dashboard_counts()['appointments_total'], 0)
+
+	def test_dashboard_renders_counts(self):
+		admin = CustomUser.objects.create_user('boss', password='pw', role=CustomUser.ROLE_ADMIN)
+		self.client.force_login(admin)
+		Patient.objects.create(first_name='A', last_name='B')
+		resp = self.client.get(reverse('admin_dashboard'))
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.context['counts']['patients'], 1)
+
+
+class ExportTests(TestCase):
+	def setUp(self):
+		admin = CustomUser.objects.create_user('boss', password='pw', role=CustomUser.ROLE_ADMIN)
+		self.client.force_login(admin)
+		Patient.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com')
+
+	def test_patients_csv_streams(self):
+		resp = self.client.get(reverse('export_patients_csv'))
+		self.assertTrue(resp.streaming)
+		lines = b''.join(resp.streaming_content).decode().splitlines()
+		self.assertEqual(lines[0].split(',')[:3], ['id', 'first_name', 'last_name'])
+		self.assertIn('ann@example.com', lines[1])
+
+	def test_appointments_ndjson_gzip_includes_doctor(self):
+		doctor = Doctor.objects.create(name='Export Doc')
+		Appointment.objects.create(
+			doctor=doctor, patient_name='Ann', appointment_date=datetime.date(2030, 1, 7),
+			appointment_time=datetime.time(9, 0),
+		)
+		resp = self.client.get(reverse('export_dataset', args=['appointments']), {'format': 'ndjson', 'gzip': '1'})
+		rows = [json.loads(line) for line in gzip.decompress(b''.join(resp.streaming_content)).splitlines()]
+		self.assertEqual(rows[0]['doctor'], 'Export Doc')
+		self.assertEqual(rows[0]['appointment_date'], '2030-01-07')
+
+
+class ExportJobTests(TestCase):
+	def setUp(self):
+		self.media = tempfile.TemporaryDirectory()
+		self.addCleanup(self.media.cleanup)
+		override = override_settings(MEDIA_ROOT=self.media.name)
+		override.enable()
+		self.addCleanup(override.disable)
+		for i in range(5):
+			Patient.objects.create(first_name=f'P{i}', last_name='Test')
+
+	def test_killed_job_resumes_from_checkpoint(self):
+		job = ExportJob.objects.create(dataset='patients', format='csv')
+		real_rows_after = exports.Dataset.rows_after
+		calls = []
+
+		def crash_on_second_chunk(dataset, pk, limit):
+			calls.append(pk)
+			if len(calls) == 2:
+				raise RuntimeError('worker killed')
+			return real_rows_after(dataset, pk, limit)
+
+		with mock.patch.object(exports.Dataset, 'rows_after', crash_on_second_chunk):
+			with self.assertRaises(RuntimeError):
+				export_jobs.run(job, chunk_size=2)
+		job.refresh_from_db()
+		self.assertEqual(job.rows_written, 2)
+		# simulate a partially written chunk after the checkpoint
+		with open(job.file.path, 'ab') as out:
+			out.write(b'garbage')
+
+		export_jobs.run(job, chunk_size=2)
+		with open(job.file.path) as exported:
+			lines = exported.read().splitlines()
+		self.assertEqual(job.status, ExportJob.STATUS_DONE)
+		self.assertEqual(len(lines), 6)
+		self.assertEqual([line.split(',')[1] for line in lines[1:]], ['P0', 'P1', 'P2', 'P3', 'P4'])
+
+	def test_worker_command_and_download(self):
+		admin = CustomUser.objects.create_user('boss', password='pw', role=CustomUser.ROLE_ADMIN)
+		self.client.force_login(admin)
+		self.client.post(reverse('export_jobs'), {'dataset': 'patients', 'format': 'ndjson', 'compress': '1'})
+		call_command('run_export_jobs', '--once', stdout=StringIO())
+		job = ExportJob.objects.get()
+		resp = self.client.get(reverse('export_job_download', args=[job.pk]))
+		rows = gzip.decompress(b''.join(resp.streaming_content)).splitlines()
+		resp.close()
+		self.assertEqual(len(rows), 5)
+
+
+class PatientImportTests(TestCase):
+	def test_import_validates_and_deduplicates(self):
+		Patient.objects.create(first_name='Old', last_name='Record', email='old@example.com')
+		source = io.BytesIO(
+			b'first_name,last_name,age,email,phone_number,location\n'
+			b'Ann,Lee,34,Ann@Example.com,+254700000001,Nairobi\n'
+			b'Bob,Ray,abc,bob@example.com,,\n'
+			b'Cat,Kim,,old@example.com,,\n'
+			b'Dan,Ng,40,ann@example.com,,\n'
+			b'Eve,Oh,,,123,\n'
+		)
+		result = imports.import_patients(source, 'csv', batch_size=2)
+		self.assertEqual(result.created, 1)
+		self.assertEqual(result.duplicates, 2)
+		self.assertEqual([line for line, _message in result.errors], [3, 4, 5, 6])
+		self.assertTrue(Patient.objects.filter(email='ann@example.com', age=34).exists())
+
+	def test_unreadable_files_are_reported(self):
+		Patient.objects.create(first_name='Old', last_name='Record', email='John@Example.com')
+		result = imports.import_patients(io.BytesIO(b'first_name,last_name,email\nJohn,Doe,john@example.com\n'), 'csv')
+		self.assertEqual((result.created, result.duplicates), (0, 1))
+
+		admin = CustomUser.objects.create_user('boss', password='pw', role=CustomUser.ROLE_ADMIN)
+		self.client.force_login(admin)
+		upload = SimpleUploadedFile('patients.csv', 'first_name,last_name\nJosé,Müller\n'.encode('latin-1'))
+		resp = self.client.post(reverse('import_patients'), {'file': upload, 'format': 'csv'})
+		self.assertEqual(resp.status_code, 200)
+		self.assertIn('not UTF-8', resp.context['form'].errors['file'][0])
+
+		with tempfile.NamedTemporaryFile(suffix='.csv') as source:
+			source.write(b'first_name,last_name\nAnn,"' + b'x' * (csv.field_size_limit() + 1) + b'"\n')
+			source.flush()
+			with self.assertRaisesMessage(CommandError, 'not valid CSV'):
+				call_command('import_patients', source.name, stdout=StringIO())
+
+	def test_admin_upload_ndjson(self):
+		admin = CustomUser.objects.create_user('boss', password='pw', role=CustomUser.ROLE_ADMIN)
+		self.client.force_login(admin)
+		upload = SimpleUploadedFile('patients.ndjson', b'{"first_name": "Ann", "last_name": "Lee"}\nnot json\n')
+		resp = self.client.post(reverse('import_patients'), {'file': upload, 'format': 'ndjson'})
+		self.assertEqual(resp.context['result'].created, 1)
+		self.assertEqual(resp.context['errors'], [(2, 'not a JSON object')])
+
+
+class PatientIdentityTests(TestCase):
+	def setUp(self):
+		self.doctor = Doctor.objects.create(name='Key Doc')
+
+	def book(self, day, **fields):
+		return Appointment.objects.create(
+			doctor=self.doctor, appointment_date=datetime.date(2030, 1, day),
+			appointment_time=datetime.time(9, 0), **fields
+		)
+
+	def test_guest_booking_links_when_email_registers(self):
+		guest = self.book(1, patient_name='Ann', patient_email=' Ann@Example.com')
+		self.assertEqual(guest.patient_key, 'ann@example.com')
+		user = CustomUser.objects.create_user('ann', email='ANN@example.com', password='pw')
+		self.book(2, patient_profile=user.patient_profile)
+		guest.refresh_from_db()
+		self.assertIsNone(guest.patient_user)
+
+		self.client.force_login(user)
+		resp = self.client.get(reverse('verify_email', args=[
+			urlsafe_base64_encode(force_bytes(user.pk)), identity.email_tokens.make_token(user),
+		]))
+		self.assertRedirects(resp, reverse('dashboard'), fetch_redirect_response=False)
+		guest.refresh_from_db()
+		self.assertEqual(guest.patient_user, user)
+
+		with self.assertNumQueries(3):
+			resp = self.client.get(reverse('appointments'))
+		self.assertEqual([a.appointment_date.day for a in resp.context['appointments']], [2, 1])
+
+	def test_registering_with_someone_elses_email_does_not_link(self):
+		guest = self.book(1, patient_name='Ann', patient_email='ann@example.com')
+		owner = CustomUser.objects.create_user('owner', email='ann@example.com', password='pw')
+		self.assertTrue(identity.verify_email(owner, identity.email_tokens.make_token(owner)))
+		intruder = CustomUser.objects.create_user('intruder', email='Ann@Example.com', password='pw')
+
+		self.assertFalse(identity.verify_email(intruder, identity.email_tokens.make_token(intruder)))
+		self.assertFalse(identity.verify_email(owner, identity.email_tokens.make_token(owner)))
+		guest.refresh_from_db()
+		self.assertEqual(guest.patient_user, owner)
+		self.assertEqual(intruder.identity_key, f'user:{intruder.pk}')
+
+	def test_register_sends_verification_email(self):
+		resp = self.client.post(reverse('register'), {
+			'username': 'cara', 'email': 'cara@example.com', 'role': CustomUser.ROLE_PATIENT,
+			'password1': 'S3cure-pass!', 'password2': 'S3cure-pass!',
+		})
+		self.assertEqual(resp.status_code, 302)
+		user = CustomUser.objects.get(username='cara')
+		self.assertFalse(user.email_verified)
+		email = OutboundEmail.objects.get()
+		self.assertEqual(email.recipients, ['cara@example.com'])
+		self.assertIn(identity.verification_path(user), email.body_text)
+
+	def test_email_change_rekeys_appointments(self):
+		user = CustomUser.objects.create_user('bob', email='bob@example.com', password='pw')
+		identity.verify_email(user, identity.email_tokens.make_token(user))
+		appt = self.book(1, patient_user=user)
+		self.assertEqual(appt.patient_key, 'bob@example.com')
+		user = CustomUser.objects.get(pk=user.pk)
+		user.email = 'robert@example.com'
+		user.save()
+		appt.refresh_from_db()
+		self.assertFalse(user.email_verified)
+		self.assertEqual(appt.patient_key, f'user:{user.pk}')
+
+		identity.verify_email(user, identity.email_tokens.make_token(user))
+		appt.refresh_from_db()
+		self.assertEqual(appt.patient_key, 'robert@example.com')
+
+	def test_backfill_command(self):
+		appt = self.book(1, patient_name='Cy', patient_email='Cy@example.com')
+		Appointment.objects.filter(pk=appt.pk).update(patient_key='')
+		call_command('backfill_patient_keys', stdout=StringIO())
+		appt.refresh_from_db()
+		self.assertEqual(appt.patient_key, 'cy@example.com')
+
+	def test_backfill_range_query_count(self):
+		users = [CustomUser.objects.create_user(f'fill{n}', email=f'fill{n}@example.com', password='pw') for n in range(3)]
+		identity.verify_email(users[0], identity.email_tokens.make_token(users[0]))
+		appointments = [self.book(n + 1, patient_user=users[n % 3]) for n in range(10)]
+		Appointment.objects.filter(pk__in=[a.pk for a in appointments]).update(patient_key='')
+		# the rows with their users, then one bulk update
+		with self.assertNumQueries(2):
+			changed = identity.backfill_range(appointments[0].pk, appointments[-1].pk + 1)
+		self.assertEqual(changed, 10)
+		self.assertEqual(
+			sorted(set(Appointment.objects.values_list('patient_key', flat=True))),
+			sorted(['fill0@example.com', f'user:{users[1].pk}', f'user:{users[2].pk}']),
+		)
+
+
+class DoctorDashboardTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = CustomUser.objects.create_user('drdash', password='pw', role=CustomUser.ROLE_DOCTOR)
+		self.doctor = Doctor.objects.create(user=self.user, name='Dash')
+		self.today = timezone.localdate()
+		self.client.force_login(self.user)
+
+	def book(self, offset, hour, **fields):
+		return Appointment.objects.create(
+			doctor=self.doctor, appointment_date=self.today + datetime.timedelta(days=offset),
+			appointment_time=datetime.time(hour, 0), **fields
+		)
+
+	def test_dashboard_shows_upcoming_in_fixed_queries(self):
+		self.book(-3, 9, patient_name='Old visit')
+		for hour in range(9, 13):
+			patient = CustomUser.objects.create_user(f'p{hour}', email=f'p{hour}@example.com', password='pw')
+			self.book(hour - 9, hour, patient_profile=patient.patient_profile)
+		self.client.get(reverse('doctor_dashboard'))
+		# session + user, then the appointments; the doctor comes from the cache
+		with self.assertNumQueries(3):
+			resp = self.client.get(reverse('doctor_dashboard'))
+		self.assertEqual(len(resp.context['appointments']), 4)
+		self.assertContains(resp, 'p12')
+		self.assertNotContains(resp, 'Old visit')
+
+	def test_doctor_cache_follows_profile_changes(self):
+		self.assertEqual(schedules.doctor_for_user(self.user).name, 'Dash')
+		self.doctor.name = 'Renamed'
+		self.doctor.save()
+		self.assertEqual(schedules.doctor_for_user(self.user).name, 'Renamed')
+
+	def test_history_pages_past_appointments(self):
+		for day in range(1, schedules.HISTORY_PER_PAGE + 3):
+			self.book(-day, 9, patient_name=f'Old {day}')
+		self.book(1, 9, patient_name='Soon')
+		resp = self.client.get(reverse('doctor_appointment_history'))
+		first = resp.context['appointments']
+		self.assertEqual(len(first), schedules.HISTORY_PER_PAGE)
+		self.assertEqual(first[0].patient_name, 'Old 1')
+		resp = self.client.get(reverse('doctor_appointment_history') + '?' + resp.context['next_query'])
+		self.assertEqual([a.patient_name for a in resp.context['appointments']], ['Old 26', 'Old 27'])
+
+
+class PublicPageCacheTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.service = Service.objects.create(title='Radiology', short_description='Scans')
+
+	def test_anonymous_pages_served_from_cache(self):
+		for name in ('index', 'services', 'doctors', 'departments', 'about', 'facility'):
+			self.client.get(reverse(name))
+			with self.assertNumQueries(0):
+				resp = self.client.get(reverse(name))
+			self.assertEqual(resp.status_code, 200)
+
+	def test_edits_show_immediately(self):
+		self.assertContains(self.client.get(reverse('services')), 'Radiology')
+		self.service.title = 'Imaging'
+		self.service.save()
+		self.assertContains(self.client.get(reverse('services')), 'Imaging')
+
+		doctor = Doctor.objects.create(name='Cached')
+		self.assertContains(self.client.get(reverse('doctors')), 'Dr. Cached')
+		doctor.delete()
+		self.assertNotContains(self.client.get(reverse('doctors')), 'Dr. Cached')
+
+		self.assertContains(self.client.get(reverse('facility')), 'No facilities available')
+		Facility.objects.create(name='North Wing')
+		self.assertContains(self.client.get(reverse('facility')), 'North Wing')
+		self.assertContains(self.client.get(reverse('index')), 'North Wing')
+
+	def test_logged_in_pages_not_page_cached(self):
+		user = CustomUser.objects.create_user('viewer', password='pw')
+		self.client.get(reverse('services'))
+		self.client.force_login(user)
+		self.assertContains(self.client.get(reverse('services')), 'viewer')
+
+
+class ConditionalRequestTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.service = Service.objects.create(title='Physio', short_description='Rehab')
+
+	def test_services_revalidates_with_304(self):
+		resp = self.client.get(reverse('services'))
+		etag, last_modified = resp['ETag'], resp['Last-Modified']
+		with self.assertNumQueries(0):
+			resp = self.client.get(reverse('services'), HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 304)
+		resp = self.client.get(reverse('services'), HTTP_IF_MODIFIED_SINCE=last_modified)
+		self.assertEqual(resp.status_code, 304)
+
+		self.service.delete()
+		resp = self.client.get(reverse('services'), HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 200)
+		self.assertNotEqual(resp['ETag'], etag)
+
+	def test_etag_differs_per_user(self):
+		anonymous = self.client.get(reverse('doctors'))['ETag']
+		self.client.force_login(CustomUser.objects.create_user('etag', password='pw'))
+		resp = self.client.get(reverse('doctors'), HTTP_IF_NONE_MATCH=anonymous)
+		self.assertEqual(resp.status_code, 200)
+		self.assertFalse(resp.has_header('Last-Modified'))
+
+	def test_detail_views(self):
+		url = reverse('service_detail', args=[self.service.slug])
+		etag = self.client.get(url)['ETag']
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+		self.service.description = 'Updated'
+		self.service.save()
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+		facility = Facility.objects.create(name='East Wing')
+		url = reverse('facility_detail', args=[facility.pk])
+		resp = self.client.get(url)
+		self.assertContains(resp, 'East Wing')
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag']).status_code, 304)
+		self.assertEqual(self.client.get(reverse('facility_detail', args=[facility.pk + 1])).status_code, 404)
+
+
+class SearchTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.heart = Service.objects.create(title='Cardiology', short_description='Heart care')
+		self.teeth = Service.objects.create(title='Dentistry', short_description='Tooth care')
+		self.smith = Doctor.objects.create(name='Alice Smith', specialty='Cardiologist')
+		self.jones = Doctor.objects.create(name='Bob Jones', specialty='General')
+		self.jones.services.add(self.heart)
+
+	def test_ranked_prefix_search(self):
+		hits = search.search('cardio')
+		self.assertEqual({(hit.kind, hit.obj.pk) for hit in hits}, {
+			(search.DOCTOR, self.smith.pk), (search.DOCTOR, self.jones.pk), (search.SERVICE, self.heart.pk),
+		})
+		self.assertEqual(search.search('cardiology')[0].obj, self.heart)
+		self.assertEqual([hit.obj for hit in search.search('alice cardio')], [self.smith])
+
+	def test_index_follows_changes(self):
+		self.heart.title = 'Cardiac Surgery'
+		self.heart.save()
+		self.assertEqual(search.matching_ids(search.DOCTOR, 'surgery'), [self.jones.pk])
+		self.jones.services.clear()
+		self.assertEqual(search.matching_ids(search.DOCTOR, 'surgery'), [])
+		self.smith.delete()
+		self.assertEqual(search.matching_ids(search.DOCTOR, 'cardiologist'), [])
+
+	def test_public_page_and_admin(self):
+		resp = self.client.get(reverse('search'), {'q': 'tooth'})
+		self.assertEqual(list(resp.context['service_hits']), [self.teeth])
+		self.assertContains(resp, 'Dentistry')
+
+		admin_user = CustomUser.objects.create_superuser('root', 'root@example.com', 'pw')
+		self.client.force_login(admin_user)
+		resp = self.client.get(reverse('admin:medifiti_doctor_changelist'), {'q': 'cardio'})
+		self.assertEqual({d.pk for d in resp.context['cl'].result_list}, {self.smith.pk, self.jones.pk})
+
+	def test_rebuild_command(self):
+		SearchTerm.objects.all().delete()
+		call_command('rebuild_search_index', stdout=StringIO())
+		self.assertEqual(search.matching_ids(search.SERVICE, 'dentistry'), [self.teeth.pk])
+
+
+class PatientLookupTests(TestCase):
+	def setUp(self):
+		self.legacy = Patient.objects.create(first_name='Grace', last_name='Wanjiru', email='grace@example.com', phone_number='0712345678')
+		self.user = CustomUser.objects.create_user('gwen', email='Gwen@Example.com', password='pw', first_name='Gwen', last_name='Otieno')
+		self.user.patient_profile.phone = '+254722000111'
+		self.user.patient_profile.save()
+
+	def test_prefix_lookup_across_tables(self):
+		found = {(match.source, match.obj.pk) for match in patient_lookup.lookup('g')}
+		self.assertEqual(found, set())  # single letters are too broad
+		found = {(match.source, match.obj.pk) for match in patient_lookup.lookup('gr')}
+		self.assertEqual(found, {(patient_lookup.PATIENT, self.legacy.pk)})
+		self.assertEqual(patient_lookup.matching_ids(patient_lookup.PROFILE, 'gwen oti'), [self.user.patient_profile.pk])
+		self.assertEqual(patient_lookup.matching_ids(patient_lookup.PROFILE, '0722 000'), [self.user.patient_profile.pk])
+		self.assertEqual(patient_lookup.matching_ids(patient_lookup.PROFILE, '+254 722'), [self.user.patient_profile.pk])
+		self.assertEqual(patient_lookup.matching_ids(patient_lookup.PATIENT, 'grace@'), [self.legacy.pk])
+
+	def test_keys_follow_changes(self):
+		self.user.last_name = 'Achieng'
+		self.user.save()
+		self.assertEqual(patient_lookup.matching_ids(patient_lookup.PROFILE, 'achieng'), [self.user.patient_profile.pk])
+		self.assertEqual(patient_lookup.matching_ids(patient_lookup.PROFILE, 'otieno'), [])
+		self.legacy.delete()
+		self.assertEqual(patient_lookup.matching_ids(patient_lookup.PATIENT, 'grace'), [])
+
+		imports.import_patients(io.BytesIO(b'first_name,last_name\nHassan,Ali\n'), 'csv')
+		self.assertEqual(len(patient_lookup.matching_ids(patient_lookup.PATIENT, 'hassan')), 1)
+
+		PatientLookupKey.objects.all().delete()
+		call_command('rebuild_patient_lookup', stdout=StringIO())
+		self.assertEqual(len(patient_lookup.lookup('hassan')), 1)
+
+	def test_common_first_name_is_not_capped(self):
+		# the longest word is searched first; here that is the common first name
+		Patient.objects.bulk_create([Patient(first_name='Margaret', last_name=f'Aa{n}') for n in range(5)])
+		margaret = Patient.objects.create(first_name='Margaret', last_name='Oti')
+		with mock.patch.object(patient_lookup, 'CANDIDATE_LIMIT', 3):
+			patient_lookup.rebuild()
+			self.assertEqual(patient_lookup.matching_ids(patient_lookup.PATIENT, 'margaret oti'), [margaret.pk])
+			self.assertEqual([match.obj for match in patient_lookup.lookup('margaret oti')], [margaret])
+
+	def test_typeahead_and_admin_search(self):
+		admin = CustomUser.objects.create_superuser('desk', 'desk@example.com', 'pw', role=CustomUser.ROLE_ADMIN)
+		self.client.force_login(admin)
+		resp = self.client.get(reverse('patient_lookup'), {'q': 'gwen'})
+		self.assertEqual([(r['source'], r['name']) for r in resp.json()['results']], [('profile', 'Gwen Otieno')])
+
+		resp = self.client.get(reverse('admin:medifiti_patient_changelist'), {'q': 'wanj'})
+		self.assertEqual(list(resp.context['cl'].result_list), [self.legacy])
+		resp = self.client.get(reverse('admin:medifiti_patientprofile_changelist'), {'q': 'gwen@'})
+		self.assertEqual(list(resp.context['cl'].result_list), [self.user.patient_profile])
+
+
+@override_settings(LAB_API_TOKEN='secret')
+class LabTrackingTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.sample = LabSample.objects.create(sample_id='ab-100', status='Received')
+
+	def post(self, payload, token='secret'):
+		return self.client.post(
+			reverse('lab_status_updates'), json.dumps(payload), content_type='application/json',
+			HTTP_AUTHORIZATION=f'Bearer {token}',
+		)
+
+	def test_status_changes_build_timeline(self):
+		self.assertEqual(self.sample.sample_key, 'AB-100')
+		sample = LabSample.objects.get(pk=self.sample.pk)
+		sample.status = 'Processing'
+		sample.save()
+		sample.notes = 'no status change'
+		sample.save()
+		self.assertEqual(list(sample.events.values_list('status', flat=True)), ['Received', 'Processing'])
+
+	def test_rename_drops_old_id_from_lookup_cache(self):
+		self.assertIsNotNone(lab.lookup('AB-100'))
+		self.assertIsNone(lab.lookup('AB-200'))
+		sample = LabSample.objects.get(pk=self.sample.pk)
+		sample.sample_id = 'ab-200'
+		sample.save()
+		self.assertIsNone(lab.lookup('AB-100'))
+		self.assertIsNotNone(lab.lookup('AB-200'))
+
+	def test_bulk_api(self):
+		self.assertEqual(self.post({'updates': []}, token='wrong').status_code, 403)
+		updates = [
+			{'sample_id': ' ab-100 ', 'status': 'Processing'},
+			{'sample_id': 'AB-100', 'status': 'Complete', 'notes': 'Normal'},
+			{'sample_id': 'zz-1', 'status': 'Received'},
+			{'status': 'Missing id'},
+		]
+		with self.assertNumQueries(5):
+			resp = self.post({'updates': updates})
+		self.assertEqual(resp.json(), {
+			'updated': 1, 'created': 0, 'events': 2,
+			'errors': [{'index': 2, 'error': "unknown sample 'zz-1'"}, {'index': 3, 'error': 'sample_id and status are required'}],
+		})
+		self.sample.refresh_from_db()
+		self.assertEqual((self.sample.status, self.sample.notes), ('Complete', 'Normal'))
+		self.assertEqual(self.sample.events.count(), 3)
+
+		resp = self.post({'updates': [{'sample_id': 'zz-1', 'status': 'Received'}], 'create_missing': True})
+		self.assertEqual(resp.json()['created'], 1)
+		self.assertEqual(LabSample.objects.get(sample_key='ZZ-1').events.count(), 1)
+
+	def test_batch_keeps_latest_status(self):
+		result = lab.apply_status_updates([
+			{'sample_id': 'new-1', 'status': 'Received', 'recorded_at': '2030-01-01T08:00:00Z'},
+			{'sample_id': 'new-1', 'status': 'Complete', 'notes': 'Done', 'recorded_at': '2030-01-01T10:00:00Z'},
+		], create_missing=True)
+		self.assertEqual((result.created, result.updated, result.events), (1, 0, 2))
+		sample = LabSample.objects.get(sample_key='NEW-1')
+		self.assertEqual((sample.status, sample.notes, sample.status_changed_at.hour), ('Complete', 'Done', 10))
+
+		# an instrument update that arrives late only extends the timeline
+		lab.apply_status_updates([
+			{'sample_id': 'NEW-1', 'status': 'Processing', 'notes': 'Stale', 'recorded_at': '2030-01-01T09:00:00Z'},
+		])
+		sample.refresh_from_db()
+		self.assertEqual((sample.status, sample.notes, sample.status_changed_at.hour), ('Complete', 'Done', 10))
+		self.assertEqual(list(sample.events.values_list('status', flat=True)), ['Received', 'Processing', 'Complete'])
+
+	def test_public_lookup_cached_and_refreshed(self):
+		self.assertEqual(lab.lookup('Ab-100')['status'], 'Received')
+		with self.assertNumQueries(0):
+			lab.lookup('AB-100')
+		with self.captureOnCommitCallbacks(execute=True):
+			lab.apply_status_updates([{'sample_id': 'AB-100', 'status': 'Complete'}])
+		result = lab.lookup('ab-100')
+		self.assertEqual(result['status'], 'Complete')
+		self.assertEqual([status for status, _at in result['timeline']], ['Received', 'Complete'])
+
+		service = Service.objects.create(title='Lab Services', slug='lab-services')
+		resp = self.client.post(reverse('service_detail', args=[service.slug]), {'sample_id': ' ab-100 '})
+		self.assertContains(resp, 'status=Complete')
+
+
+class TriageTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.cardiology = Service.objects.create(title='Cardiology')
+		self.doctor = Doctor.objects.create(name='Heart', specialty='Cardiologist')
+		self.doctor.services.add(self.cardiology)
+		Department.objects.filter(name='Cardiology').update(service=self.cardiology)
+		caching.invalidate(caching.TRIAGE)
+
+	def test_seeded_rules_rank_departments_with_doctors(self):
+		rules = triage.engine()
+		self.assertEqual([key for key, _label in rules.symptoms], ['respiratory', 'dental', 'cardiac', 'abdominal'])
+		ranked = triage.recommend(['cardiac', 'respiratory'])
+		self.assertEqual([(rec.department, rec.score) for rec in ranked], [
+			('Cardiology', 2), ('Emergency', 2), ('Respiratory', 2), ('General Physician', 1),
+		])
+		self.assertEqual([doctor.name for doctor in ranked[0].doctors], ['Heart'])
+		self.assertEqual(triage.recommend(['unknown']), ())
+
+	def test_compiled_once_and_rebuilt_on_edit(self):
+		triage.engine()
+		with self.assertNumQueries(0):
+			triage.recommend(['dental'])
+		rule = TriageRule.objects.get(symptom__key='dental')
+		rule.weight = 5
+		rule.save()
+		self.assertEqual(triage.recommend(['dental'])[0].score, 5)
+
+	def test_service_page_form(self):
+		service = Service.objects.create(title='General Consultation', slug='general-consultation')
+		url = reverse('service_detail', args=[service.slug])
+		self.assertContains(self.client.get(url), 'Chest pain or shortness of breath')
+		resp = self.client.post(url, {'triage_submit': '1', 'symptoms': ['cardiac']})
+		self.assertContains(resp, 'Recommended departments: Cardiology, Emergency')
+		self.assertContains(resp, reverse('book_appointment', args=[self.doctor.pk]))
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_FLUSH_EVERY=1)
+class ProfilingTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		Service.objects.create(title='Profiled')
+
+	def test_requests_recorded_per_view(self):
+		resp = self.client.get(reverse('services'))
+		self.assertIn('db;dur=', resp['Server-Timing'])
+		self.client.get(reverse('services'))
+		profile = ViewProfile.objects.get(view_name='services')
+		self.assertEqual(profile.requests, 2)
+		self.assertGreater(profile.max_queries, 0)
+		self.assertGreater(profile.total_template_ms, 0)
+
+		out = StringIO()
+		call_command('perf_report', '--order', 'time', stdout=out)
+		self.assertIn('services', out.getvalue())
+
+		admin_user = CustomUser.objects.create_superuser('perf', 'perf@example.com', 'pw')
+		self.client.force_login(admin_user)
+		resp = self.client.get(reverse('admin:medifiti_viewprofile_changelist'))
+		self.assertContains(resp, 'services')
+
+	def test_flush_waits_for_request_finished(self):
+		middleware = profiling.ProfilingMiddleware(lambda request: HttpResponse('ok'))
+		middleware(RequestFactory().get('/'))
+		self.assertFalse(ViewProfile.objects.exists())
+		request_finished.send(sender=self.__class__)
+		self.assertEqual(ViewProfile.objects.get().view_name, profiling.UNRESOLVED)
+
+	def test_cprofile_dump_for_staff(self):
+		staff = CustomUser.objects.create_user('staffer', password='pw', is_staff=True)
+		self.client.force_login(staff)
+		with tempfile.TemporaryDirectory() as directory, override_settings(PROFILING_CPROFILE_DIR=directory):
+			self.client.get(reverse('services'), {'_profile': '1'})
+			self.assertEqual(len([name for name in os.listdir(directory) if name.endswith('.prof')]), 1)
+
+
+class BenchmarkTests(TestCase):
+	def test_seed_run_and_compare(self):
+		call_command(
+			'seed_benchmark_data', '--doctors', '3', '--patient-users', '4', '--patients', '20',
+			'--appointments', '60', '--contacts', '5', '--batch-size', '7', '--index', stdout=StringIO(),
+		)
+		self.assertEqual(Appointment.objects.count(), 60)
+		self.assertEqual(Patient.objects.count(), 20)
+		self.assertFalse(Appointment.objects.filter(patient_key='').exists())
+		# the patient scenarios must render the seeded patient's bookings, not an empty page
+		patient = benchmarking._users()['patient']
+		self.client.force_login(patient)
+		for name in ('patient_dashboard', 'appointments'):
+			self.assertTrue(self.client.get(reverse(name)).context['appointments'], name)
+		self.client.logout()
+
+		with tempfile.TemporaryDirectory() as directory:
+			baseline = os.path.join(directory, 'baseline.json')
+			call_command('run_benchmarks', '--repeat', '2', '--output', baseline, stdout=StringIO())
+			with open(baseline) as src:
+				report = json.load(src)
+			self.assertEqual(report['rows']['Appointment'], 60)
+			self.assertEqual(
+				{name: result['status'] for name, result in report['results'].items()},
+				{scenario.name: 200 for scenario in benchmarking.scenarios()},
+			)
+
+			report['results']['appointments']['queries'] -= 1
+			with open(baseline, 'w') as out:
+				json.dump(report, out)
+			with self.assertRaises(CommandError):
+				call_command(
+					'run_benchmarks', '--repeat', '1', '--only', 'appointments', '--baseline', baseline,
+					'--fail-on-regression', stdout=StringIO(),
+				)
+
+		benchmarking.clear()
+		self.assertFalse(Appointment.objects.exists())
+		self.assertFalse(CustomUser.objects.filter(username__startswith='bench_').exists())
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+	"""Every listed page runs a bounded number of queries that does not grow with its rows."""
+
+	def setUp(self):
+		self.admin = CustomUser.objects.create_superuser(
+			'budget_admin', 'budget@example.com', None, role=CustomUser.ROLE_ADMIN,
+		)
+		self.doctor_user = CustomUser.objects.create_user('budget_doc', role=CustomUser.ROLE_DOCTOR)
+		self.doctor = Doctor.objects.create(user=self.doctor_user, name='Budget Doc')
+		self.patient = CustomUser.objects.create_user(
+			'budget_patient', email='budget.patient@example.com', first_name='Bea', last_name='Udget',
+		)
+		self.rows = 0
+
+	def _next(self):
+		self.rows += 1
+		return self.rows
+
+	def _appointments(self, rows, doctor=None, days_ahead=1):
+		"""Alternate profile, user and guest bookings, each with a doctor of its own so `doctor.name` is a join."""
+		for _ in range(rows):
+			n = self._next()
+			user = CustomUser.objects.create_user(f'budget_p{n}', email=f'p{n}@example.com', first_name=f'P{n}')
+			booked_by = {0: {'patient_profile': user.patient_profile}, 1: {'patient_user': self.patient}}.get(
+				n % 3, {'patient_name': f'Guest {n}', 'patient_email': self.patient.email},
+			)
+			Appointment.objects.create(
+				doctor=doctor or Doctor.objects.create(name=f'Doc {n}'),
+				appointment_date=timezone.localdate() + datetime.timedelta(days=days_ahead * (1 + n // 10)),
+				appointment_time=datetime.time(8 + n % 10, 0),
+				**booked_by,
+			)
+
+	def _services(self, rows):
+		for _ in range(rows):
+			n = self._next()
+			service = Service.objects.create(title=f'Service {n}', short_description='Care')
+			doctor = Doctor.objects.create(name=f'Doc {n}', specialty='General')
+			doctor.services.add(service)
+			Department.objects.create(name=f'Department {n}', service=service)
+			Facility.objects.create(name=f'Facility {n}')
+
+	def _login(self, user):
+		self.client.force_login(user)
+
+	# public pages
+
+	@query_budget(2)
+	def test_index(self, rows):
+		self._services(rows)
+		return reverse('index')
+
+	@query_budget(2)
+	def test_services(self, rows):
+		self._services(rows)
+		return reverse('services')
+
+	@query_budget(2)
+	def test_service_detail(self, rows):
+		self._services(rows)
+		Service.objects.get_or_create(slug='budget', defaults={'title': 'Budget'})
+		return reverse('service_detail', args=['budget'])
+
+	@query_budget(2)
+	def test_doctors(self, rows):
+		self._services(rows)
+		return reverse('doctors')
+
+	@query_budget(0)
+	def test_departments(self, rows):
+		self._services(rows)
+		return reverse('departments')
+
+	@query_budget(2)
+	def test_facility(self, rows):
+		self._services(rows)
+		return reverse('facility')
+
+	@query_budget(3)
+	def test_search(self, rows):
+		self._services(rows)
+		return reverse('search') + '?q=service'
+
+	@query_budget(4)
+	def test_free_slots(self, rows):
+		self._appointments(rows, doctor=self.doctor)
+		day = timezone.localdate() + datetime.timedelta(days=1)
+		return reverse('free_slots') + f'?doctor={self.doctor.pk}&date={day.isoformat()}'
+
+	# dashboards and listings
+
+	@query_budget(8)
+	def test_admin_dashboard(self, rows):
+		self._login(self.admin)
+		for _ in range(rows):
+			n = self._next()
+			Patient.objects.create(first_name=f'P{n}', last_name='Budget')
+			Contact.objects.create(full_name=f'C{n}', email=f'c{n}@example.com', message='Hi')
+		return reverse('admin_dashboard')
+
+	@query_budget(4)
+	def test_admin_appointments(self, rows):
+		self._login(self.admin)
+		self._appointments(rows)
+		return reverse('admin_appointments')
+
+	@query_budget(4)
+	def test_doctor_dashboard(self, rows):
+		self._login(self.doctor_user)
+		self._appointments(rows, doctor=self.doctor)
+		return reverse('doctor_dashboard')
+
+	@query_budget(4)
+	def test_doctor_history(self, rows):
+		self._login(self.doctor_user)
+		self._appointments(rows, doctor=self.doctor, days_ahead=-1)
+		return reverse('doctor_appointment_history')
+
+	@query_budget(4)
+	def test_patient_dashboard(self, rows):
+		self._login(self.patient)
+		self._appointments(rows)
+		self._services(rows)
+		return reverse('patient_dashboard')
+
+	@query_budget(3)
+	def test_appointments(self, rows):
+		self._login(self.patient)
+		self._appointments(rows)
+		return reverse('appointments')
+
+	@query_budget(3)
+	def test_export_patients_csv(self, rows):
+		self._login(self.admin)
+		for _ in range(rows):
+			Patient.objects.create(first_name=f'P{self._next()}', last_name='Budget')
+		return reverse('export_patients_csv')
+
+	@query_budget(3)
+	def test_export_jobs(self, rows):
+		self._login(self.admin)
+		for _ in range(rows):
+			ExportJob.objects.create(dataset='patients', requested_by=self.admin)
+		return reverse('export_jobs')
+
+	@query_budget(4)
+	def test_rollup_report(self, rows):
+		self._login(self.admin)
+		self._appointments(rows)
+		rollups.build(full=True)
+		return reverse('rollup_report') + '?dimension=doctor'
+
+	# admin changelists and change pages with inlines
+
+	def _changelist(self, model_name):
+		self._login(self.admin)
+		return reverse(f'admin:medifiti_{model_name}_changelist')
+
+	@query_budget(8)
+	def test_admin_appointment_changelist(self, rows):
+		self._appointments(rows)
+		return self._changelist('appointment')
+
+	@query_budget(7)
+	def test_admin_doctor_changelist(self, rows):
+		self._services(rows)
+		return self._changelist('doctor')
+
+	@query_budget(5)
+	def test_admin_patient_changelist(self, rows):
+		for _ in range(rows):
+			Patient.objects.create(first_name=f'P{self._next()}', last_name='Budget')
+		return self._changelist('patient')
+
+	@query_budget(5)
+	def test_admin_patientprofile_changelist(self, rows):
+		self._appointments(rows)
+		return self._changelist('patientprofile')
+
+	@query_budget(5)
+	def test_admin_service_changelist(self, rows):
+		self._services(rows)
+		return self._changelist('service')
+
+	@query_budget(5)
+	def test_admin_department_changelist(self, rows):
+		self._services(rows)
+		return self._changelist('department')
+
+	@query_budget(6)
+	def test_admin_exportjob_changelist(self, rows):
+		for _ in range(rows):
+			ExportJob.objects.create(dataset='patients', requested_by=self.admin)
+		return self._changelist('exportjob')
+
+	@query_budget(6)
+	def test_admin_doctorforecast_changelist(self, rows):
+		for _ in range(rows):
+			DoctorForecast.objects.create(
+				doctor=Doctor.objects.create(name=f'Doc {self._next()}'), weekday=0, hour=9,
+				expected_bookings=1.0, no_show_rate=0.1, built_at=timezone.now(),
+			)
+		return self._changelist('doctorforecast')
+
+	@query_budget(6)
+	def test_admin_maintenancerun_changelist(self, rows):
+		for _ in range(rows):
+			MaintenanceRun.objects.create(job=f'job_{self._next()}', chunk_size=10)
+		return self._changelist('maintenancerun')
+
+	@query_budget(7)
+	def test_admin_contact_changelist(self, rows):
+		for _ in range(rows):
+			n = self._next()
+			Contact.objects.create(full_name=f'C{n}', email=f'c{n}@example.com', message='Hi')
+		return self._changelist('contact')
+
+	@query_budget(5)
+	def test_admin_user_changelist(self, rows):
+		self._appointments(rows)
+		return self._changelist('customuser')
+
+	@query_budget(8)
+	def test_admin_rollup_report(self, rows):
+		self._login(self.admin)
+		self._appointments(rows)
+		self._services(rows)
+		rollups.build(full=True)
+		return reverse('admin:medifiti_dailyrollup_report')
+
+	@query_budget(8)
+	def test_admin_doctor_change_with_inlines(self, rows):
+		self._login(self.admin)
+		self._appointments(rows, doctor=self.doctor)
+		for _ in range(rows):
+			DoctorWorkingHours.objects.create(
+				doctor=self.doctor, weekday=self._next() % 7, start_time=datetime.time(9), end_time=datetime.time(17),
+			)
+		return reverse('admin:medifiti_doctor_change', args=[self.doctor.pk])
+
+	@query_budget(4)
+	def test_admin_labsample_change_with_inline(self, rows):
+		self._login(self.admin)
+		sample, _ = LabSample.objects.get_or_create(sample_id='BUDGET-1')
+		for _ in range(rows):
+			sample.status = f'Step {self._next()}'
+			sample.save()
+		return reverse('admin:medifiti_labsample_change', args=[sample.pk])
+
+	@query_budget(6)
+	def test_admin_symptom_change_with_inline(self, rows):
+		self._login(self.admin)
+		symptom, _ = Symptom.objects.get_or_create(key='budget', defaults={'label': 'Budget'})
+		for _ in range(rows):
+			department = Department.objects.create(name=f'Department {self._next()}')
+			TriageRule.objects.create(symptom=symptom, department=department)
+		return reverse('admin:medifiti_symptom_change', args=[symptom.pk])
+
+
+class DoctorAdminTests(TestCase):
+	def setUp(self):
+		self.admin = CustomUser.objects.create_superuser('doc_admin', 'doc_admin@example.com', None)
+		self.client.force_login(self.admin)
+		self.doctor = Doctor.objects.create(name='Windowed')
+		today = timezone.localdate()
+		for name, days in (('Long Ago', -60), ('Last Week', -3), ('Next Week', 5), ('Next Year', 300)):
+			Appointment.objects.create(
+				doctor=self.doctor, patient_name=name, appointment_date=today + datetime.timedelta(days=days),
+				appointment_time=datetime.time(9),
+			)
+
+	def test_inline_shows_only_the_recent_window(self):
+		with CaptureQueriesContext(connection) as ctx:
+			resp = self.client.get(reverse('admin:medifiti_doctor_change', args=[self.doctor.pk]))
+		# the service count annotation is for the changelist only
+		self.assertFalse([query for query in ctx.captured_queries if 'GROUP BY' in query['sql']])
+		self.assertContains(resp, 'Last Week')
+		self.assertContains(resp, 'Next Week')
+		self.assertNotContains(resp, 'Long Ago')
+		self.assertNotContains(resp, 'Next Year')
+		self.assertContains(resp, reverse('admin:medifiti_appointment_changelist') + f'?doctor__id__exact={self.doctor.pk}')
+
+	def test_changelist_sorts_by_service_count(self):
+		busy = Doctor.objects.create(name='Busy')
+		busy.services.add(Service.objects.create(title='X-ray'), Service.objects.create(title='Ultrasound'))
+		resp = self.client.get(reverse('admin:medifiti_doctor_changelist'), {'o': '-4'})
+		self.assertEqual([doctor.name for doctor in resp.context['cl'].result_list], ['Busy', 'Windowed'])
+		self.assertContains(resp, 'X-ray, Ultrasound')
+
+
+class BulkTransitionTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.doctor = Doctor.objects.create(name='Day Off')
+		self.day = timezone.localdate()
+
+	def _book(self, n, status=Appointment.STATUS_PENDING):
+		return Appointment.objects.create(
+			doctor=self.doctor, patient_name=f'Patient {n}', patient_email=f'p{n}@example.com',
+			appointment_date=self.day, appointment_time=datetime.time(8 + n // 4, 15 * (n % 4)), status=status,
+		)
+
+	def test_cancel_day_in_chunks(self):
+		for n in range(7):
+			self._book(n)
+		confirmed = self._book(7, Appointment.STATUS_CONFIRMED)
+		done = self._book(8, Appointment.STATUS_COMPLETED)
+		self.assertEqual(stats.dashboard_counts()['appointments_today'], 9)
+		OutboundEmail.objects.all().delete()
+
+		result = transitions.apply(
+			Appointment.objects.filter(doctor=self.doctor, appointment_date=self.day), Appointment.STATUS_CANCELLED,
+			chunk_size=4,
+		)
+		self.assertEqual((result.changed, result.rejected, result.notified), (8, 1, 8))
+		self.assertEqual(Appointment.objects.filter(status=Appointment.STATUS_CANCELLED).count(), 8)
+		self.assertEqual(AppointmentStatusChange.objects.filter(to_code=4).count(), 8)
+		self.assertEqual(
+			AppointmentStatusChange.objects.get(appointment=confirmed, to_code=4).from_status, Appointment.STATUS_CONFIRMED,
+		)
+		done.refresh_from_db()
+		self.assertEqual(done.status, Appointment.STATUS_COMPLETED)
+		self.assertEqual(OutboundEmail.objects.count(), 8)
+		self.assertIn('cancelled', OutboundEmail.objects.first().subject)
+
+		counts = stats.dashboard_counts()
+		self.assertEqual(counts['appointments_today'], 1)
+		self.assertEqual(dict((s, n) for s, _label, n in counts['appointments_by_status'])['cancelled'], 8)
+
+	def test_queries_per_chunk_not_per_row(self):
+		def cancel_all():
+			with CaptureQueriesContext(connection) as captured:
+				transitions.apply(Appointment.objects.all(), Appointment.STATUS_CANCELLED, chunk_size=50)
+			Appointment.objects.update(status=Appointment.STATUS_PENDING)
+			return len(captured)
+
+		self._book(0)
+		few = cancel_all()
+		for n in range(1, 12):
+			self._book(n)
+		self.assertEqual(cancel_all(), few)
+
+	def test_admin_action_select_across(self):
+		for n in range(3):
+			self._book(n)
+		admin_user = CustomUser.objects.create_superuser('bulk', 'bulk@example.com', None)
+		self.client.force_login(admin_user)
+		resp = self.client.post(reverse('admin:medifiti_appointment_changelist'), {
+			'action': 'mark_as_confirmed', 'select_across': '1', 'index': '0',
+			'_selected_action': [Appointment.objects.first().pk],
+		}, follow=True)
+		self.assertContains(resp, '3 appointment(s) marked as confirmed.')
+		self.assertEqual(AppointmentStatusChange.objects.filter(changed_by=admin_user).count(), 3)
+
+
+class AppointmentStateMachineTests(TestCase):
+	def setUp(self):
+		self.doctor = Doctor.objects.create(name='State')
+		self.appt = Appointment.objects.create(
+			doctor=self.doctor, patient_name='Sam', appointment_date=timezone.localdate(), appointment_time=datetime.time(9),
+		)
+
+	def test_transitions_are_enforced_and_logged(self):
+		self.assertEqual(
+			list(self.appt.status_changes.values_list('from_code', 'to_code', 'source')),
+			[(AppointmentStatusChange.CODE_NEW, 1, AppointmentStatusChange.SOURCE_BOOKING)],
+		)
+		with self.assertRaises(transitions.InvalidTransition):
+			transitions.transition(self.appt, Appointment.STATUS_COMPLETED)
+		transitions.transition(self.appt, Appointment.STATUS_CONFIRMED)
+		transitions.transition(self.appt, Appointment.STATUS_COMPLETED)
+		self.assertEqual(
+			[(c.from_status, c.to_status) for c in self.appt.status_changes.all()],
+			[(None, 'pending'), ('pending', 'confirmed'), ('confirmed', 'completed')],
+		)
+
+		appt = Appointment.objects.get(pk=self.appt.pk)
+		appt.status = Appointment.STATUS_PENDING
+		with self.assertRaises(ValueError):
+			appt.save()
+		appt.reason = 'Follow-up'
+		appt.save(update_fields=['reason'])
+
+	def test_public_form_cannot_set_status(self):
+		self.assertNotIn('status', AppointmentForm().fields)
+
+	def test_admin_timeline_and_throughput(self):
+		admin_user = CustomUser.objects.create_superuser('states', 'states@example.com', None)
+		self.client.force_login(admin_user)
+		url = reverse('admin:medifiti_appointment_change', args=[self.appt.pk])
+		resp = self.client.get(url)
+		self.assertEqual(
+			[value for value, _label in resp.context['adminform'].form.fields['status'].choices],
+			['pending', 'confirmed', 'cancelled'],
+		)
+		self.assertContains(resp, 'Status timeline')
+
+		data = {
+			'doctor': self.doctor.pk, 'patient_name': 'Sam', 'appointment_date': self.appt.appointment_date.isoformat(),
+			'appointment_time': '09:00', 'status': 'confirmed', 'reason': 'Checked in',
+			'status_changes-TOTAL_FORMS': '1', 'status_changes-INITIAL_FORMS': '1',
+			'status_changes-MIN_NUM_FORMS': '0', 'status_changes-MAX_NUM_FORMS': '0',
+			'status_changes-0-id': self.appt.status_changes.get().pk, 'status_changes-0-appointment': self.appt.pk,
+		}
+		resp = self.client.post(url, data)
+		self.assertEqual(resp.status_code, 302)
+		self.appt.refresh_from_db()
+		self.assertEqual((self.appt.status, self.appt.reason), ('confirmed', 'Checked in'))
+		self.assertEqual(self.appt.status_changes.last().changed_by, admin_user)
+
+		resp = self.client.get(reverse('admin:medifiti_appointment_throughput'), {'days': 3})
+		today = resp.context['rows'][0]
+		self.assertEqual(today, (timezone.localdate(), [1, 0, 1, 0, 0]))
+		self.assertEqual(len(resp.context['rows']), 3)
+
+
+class RollupTests(TestCase):
+	def setUp(self):
+		self.service = Service.objects.create(title='Dental', short_description='Teeth')
+		self.doctor = Doctor.objects.create(name='Roll')
+		self.doctor.services.add(self.service)
+		self.today = timezone.localdate()
+		self.appts = [
+			Appointment.objects.create(
+				doctor=self.doctor, patient_name=f'P{i}', appointment_date=self.today, appointment_time=datetime.time(9 + i),
+			)
+			for i in range(3)
+		]
+		Contact.objects.create(full_name='X', email='x@example.com', message='m')
+
+	def counts(self, metric, dimension=DailyRollup.DIMENSION_TOTAL):
+		return dict(DailyRollup.objects.filter(metric=metric, dimension=dimension, day=self.today).values_list('key', 'count'))
+
+	def test_build_and_incremental_refresh(self):
+		self.assertEqual(rollups.build(), {'appointments': 'all', 'contacts': 'all', 'registrations': 'all'})
+		self.assertEqual(self.counts('appointments'), {'': 3})
+		self.assertEqual(self.counts('appointments', 'doctor'), {str(self.doctor.pk): 3})
+		self.assertEqual(self.counts('appointments', 'service'), {str(self.service.pk): 3})
+		self.assertEqual(self.counts('appointments', 'status'), {'pending': 3})
+		self.assertEqual(self.counts('contacts'), {'': 1})
+
+		# move the watermarks past the fixture so only the changes below are picked up
+		RollupWatermark.objects.update(value=timezone.now())
+		transitions.transition(self.appts[0], Appointment.STATUS_CONFIRMED)
+		Contact.objects.create(full_name='Y', email='y@example.com', message='m')
+		self.assertEqual(rollups.build(), {'appointments': 1, 'contacts': 1, 'registrations': 0})
+		self.assertEqual(self.counts('appointments', 'status'), {'pending': 2, 'confirmed': 1})
+		self.assertEqual(self.counts('contacts'), {'': 2})
+
+		call_command('build_rollups', '--full', stdout=StringIO())
+		self.assertEqual(self.counts('appointments', 'status'), {'pending': 2, 'confirmed': 1})
+
+	def test_report_api_and_admin_page(self):
+		rollups.build()
+		admin = CustomUser.objects.create_user('boss', password='pw', role=CustomUser.ROLE_ADMIN)
+		self.client.force_login(admin)
+		resp = self.client.get(reverse('rollup_report'), {'dimension': 'doctor', 'period': 'month'})
+		self.assertEqual(resp.status_code, 200)
+		series = resp.json()['series']
+		self.assertEqual(
+			series, [{'key': str(self.doctor.pk), 'label': 'Dr. Roll', 'points': [[self.today.replace(day=1).isoformat(), 3]]}],
+		)
+		self.assertEqual(self.client.get(reverse('rollup_report'), {'metric': 'bogus'}).status_code, 400)
+
+		superuser = CustomUser.objects.create_superuser('rollups', 'rollups@example.com', None)
+		self.client.force_login(superuser)
+		resp = self.client.get(reverse('admin:medifiti_dailyrollup_report'), {'days': 7})
+		self.assertEqual(resp.context['rows'][0], (self.today, [3, 1, 0]))
+		self.assertEqual(resp.context['services'], [('Dental', 3)])
+
+
+class ForecastTests(TestCase):
+	def setUp(self):
+		self.doctor = Doctor.objects.create(name='Cast')
+		DoctorWorkingHours.objects.create(
+			doctor=self.doctor, weekday=0, start_time=datetime.time(9, 0), end_time=datetime.time(10, 0),
+		)
+		# 2030-01-07 is a Monday; twelve weeks of history end on 2030-04-01
+		self.today = datetime.date(2030, 4, 1)
+		statuses = ['completed'] * 6 + ['pending'] * 4 + ['cancelled'] * 2
+		for n, status in enumerate(statuses):
+			Appointment.objects.create(
+				doctor=self.doctor, patient_name=f'P{n}', status=status,
+				appointment_date=datetime.date(2030, 1, 7) + datetime.timedelta(weeks=n // 2),
+				appointment_time=datetime.time(9, 30 * (n % 2)),
+			)
+
+	def test_build_counts_demand_and_no_shows(self):
+		self.assertEqual(forecasting.build(today=self.today, chunk_size=5), 1)
+		forecast = DoctorForecast.objects.get()
+		self.assertEqual((forecast.doctor, forecast.weekday, forecast.hour, forecast.samples), (self.doctor, 0, 9, 10))
+		# 12 bookings over 12 Mondays; 4 of the 10 not cancelled were missed
+		self.assertAlmostEqual(forecast.expected_bookings, 1.0)
+		self.assertAlmostEqual(forecast.no_show_rate, 0.4)
+		self.assertTrue(forecasting.should_overbook(forecast))
+
+		call_command('build_forecasts', '--weeks', '1', stdout=StringIO())
+		self.assertFalse(DoctorForecast.objects.exists())
+
+	def test_open_bookings_before_completion_tracking_are_not_no_shows(self):
+		# a second doctor whose bookings were never closed, and older open ones for the first
+		idle = Doctor.objects.create(name='Idle')
+		for n in range(10):
+			Appointment.objects.create(
+				doctor=idle, patient_name=f'I{n}', appointment_date=datetime.date(2030, 1, 7) + datetime.timedelta(weeks=n),
+				appointment_time=datetime.time(9, 0),
+			)
+		# the first doctor's completed bookings move from weeks 0-2 to weeks 6-8, after the open ones
+		for appointment in Appointment.objects.filter(doctor=self.doctor, status='completed'):
+			appointment.appointment_date += datetime.timedelta(weeks=6)
+			appointment.save(update_fields=['appointment_date'])
+		forecasting.build(today=self.today)
+
+		forecast = DoctorForecast.objects.get(doctor=idle)
+		self.assertEqual((forecast.samples, forecast.expected_bookings), (0, 10 / 12))
+		self.assertFalse(forecasting.should_overbook(forecast))
+		# only the six completed bookings are tracked; the open ones are all earlier
+		forecast = DoctorForecast.objects.get(doctor=self.doctor)
+		self.assertEqual(forecast.samples, 6)
+		self.assertAlmostEqual(forecast.no_show_rate, 0.0)
+		self.assertFalse(forecasting.should_overbook(forecast))
+
+	def test_compute_query_count_does_not_grow_with_rows(self):
+		for n in range(20):
+			Appointment.objects.create(
+				doctor=Doctor.objects.create(name=f'Open {n}'), patient_name=f'O{n}',
+				appointment_date=datetime.date(2030, 2, 4), appointment_time=datetime.time(11, 0),
+			)
+		start = self.today - datetime.timedelta(weeks=forecasting.HISTORY_WEEKS)
+		with CaptureQueriesContext(connection) as ctx:
+			forecasting.compute(start, self.today, chunk_size=5)
+		# doctor ids, first completed dates, and the streamed columns, none with a per-row subquery
+		self.assertEqual(len(ctx.captured_queries), 3)
+		self.assertEqual([query['sql'].count('SELECT') for query in ctx.captured_queries], [1, 1, 1])
+
+	def test_free_slots_carry_hints(self):
+		forecasting.build(today=self.today)
+		payload = self.client.get(reverse('free_slots'), {'doctor': self.doctor.pk, 'count': 2}).json()
+		self.assertEqual(
+			[(slot['time'], slot['no_show_rate'], slot['overbook']) for slot in payload['slots']],
+			[('09:00', 0.4, True), ('09:30', 0.4, True)],
+		)
+
+
+class MaintenanceTests(TestCase):
+	def setUp(self):
+		self.patients = [Patient.objects.create(first_name=f'Maint{n}', last_name='Ops') for n in range(5)]
+		PatientLookupKey.objects.all().delete()
+
+	def test_failed_run_resumes_from_last_finished_chunk(self):
+		job = maintenance.JOBS['patient_lookup_keys']
+		third = self.patients[2].pk
+
+		def flaky(start_pk, end_pk):
+			if start_pk <= third < end_pk:
+				raise RuntimeError('worker died')
+			return job.handler(start_pk, end_pk)
+
+		with mock.patch.dict(maintenance.JOBS, {job.name: job._replace(handler=flaky)}):
+			with self.assertRaises(RuntimeError):
+				maintenance.run(job.name, workers=1, chunk_size=2)
+		failed = MaintenanceRun.objects.get()
+		self.assertEqual((failed.status, failed.chunks_total, failed.chunks_done), ('failed', 3, 1))
+
+		seen = []
+		run = maintenance.run(job.name, workers=1, progress=seen.append)
+		self.assertEqual(run.pk, failed.pk)
+		self.assertEqual((run.status, run.chunks_done, run.rows_processed), ('done', 3, 5))
+		# only the failed chunk and the one after it were run again
+		self.assertEqual([progress.chunks for progress in seen], [1, 2])
+		self.assertEqual(
+			set(PatientLookupKey.objects.values_list('object_id', flat=True)), {patient.pk for patient in self.patients},
+		)
+
+	def test_identity_chunk_queries_do_not_grow_with_rows(self):
+		doctor = Doctor.objects.create(name='Chunked')
+		users = [CustomUser.objects.create_user(f'chunk{n}', email=f'chunk{n}@example.com', password='pw') for n in range(3)]
+		for n in range(12):
+			Appointment.objects.create(
+				doctor=doctor, patient_user=users[n % 3], appointment_date=datetime.date(2030, 1, 7),
+				appointment_time=datetime.time(8 + n),
+			)
+		Appointment.objects.update(patient_key='')
+		run = maintenance.plan(maintenance.JOBS['appointment_identity'], chunk_size=100)
+		chunk = run.chunks.get()
+		# the chunk, the appointments with their users, one bulk update and the chunk's own save, in a savepoint
+		with self.assertNumQueries(6):
+			self.assertEqual(maintenance.run_chunk(chunk.pk)[1], 12)
+
+	def test_command_lists_and_runs_jobs(self):
+		out = StringIO()
+		call_command('run_maintenance', stdout=out)
+		self.assertIn('appointment_identity', out.getvalue())
+		with self.assertRaises(CommandError):
+			call_command('run_maintenance', 'nope')
+		out = StringIO()
+		call_command('run_maintenance', 'patient_lookup_keys', '--workers', '1', '--chunk-size', '2', stdout=out)
+		self.assertIn('patient_lookup_keys done: 5 rows in 3 chunks', out.getvalue())
+		call_command('run_maintenance', 'patient_lookup_keys', '--workers', '1', stdout=StringIO())
+		self.assertEqual(MaintenanceRun.objects.filter(status='done').count(), 2)
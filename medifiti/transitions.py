@@ -0,0 +1,168 @@
+"""
+Appointment status transitions.
+
+This module is the only writer of `Appointment.status` after booking
+(`Appointment.save` refuses to change it). `ALLOWED` is the state machine:
+pending -> confirmed -> completed, with cancellation from either open state.
+
+`apply` moves any number of appointments in chunks of `CHUNK_SIZE`: each
+chunk is one transaction that locks its rows, updates the allowed ones with
+a single UPDATE, appends one `AppointmentStatusChange` per row and queues
+the patients' emails with one insert. Rows whose current status does not
+allow the move are left alone and counted as rejected; `transition` is the
+single-appointment form and raises `InvalidTransition` instead.
+
+`QuerySet.update` skips signals, so the dashboard counters are adjusted
+here as well.
+"""
+import datetime
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import notifications, stats
+from .models import Appointment, AppointmentStatusChange
+
+CHUNK_SIZE = 500
+CODES = AppointmentStatusChange.STATUS_CODES
+
+ALLOWED = {
+    Appointment.STATUS_PENDING: {Appointment.STATUS_CONFIRMED, Appointment.STATUS_CANCELLED},
+    Appointment.STATUS_CONFIRMED: {Appointment.STATUS_PENDING, Appointment.STATUS_COMPLETED, Appointment.STATUS_CANCELLED},
+    # cancelled rows have released their slot, which may have been booked again
+    Appointment.STATUS_CANCELLED: set(),
+    Appointment.STATUS_COMPLETED: set(),
+}
+
+
+class InvalidTransition(Exception):
+    """Raised by `transition` when the appointment's current status does not allow the move."""
+
+    def __init__(self, from_status, to_status):
+        labels = dict(Appointment.STATUS_CHOICES)
+        self.message = f'A {labels[from_status].lower()} appointment cannot be marked as {labels[to_status].lower()}.'
+        super().__init__(self.message)
+
+
+def can_transition(from_status, to_status):
+    return to_status in ALLOWED.get(from_status, ())
+
+
+def allowed_statuses(from_status):
+    """`from_status` and the statuses it may move to, in `STATUS_CHOICES` order (for form choices)."""
+    return [status for status, _label in Appointment.STATUS_CHOICES
+            if status == from_status or can_transition(from_status, status)]
+
+
+@dataclass
+class TransitionResult:
+    status: str
+    changed: int = 0
+    # already in the target status
+    unchanged: int = 0
+    # current status does not allow the move
+    rejected: int = 0
+    notified: int = 0
+
+    def summary(self):
+        label = dict(Appointment.STATUS_CHOICES)[self.status].lower()
+        parts = [f'{self.changed} appointment(s) marked as {label}']
+        if self.unchanged:
+            parts.append(f'{self.unchanged} already {label}')
+        if self.rejected:
+            parts.append(f'{self.rejected} skipped because their status cannot change to {label}')
+        return '; '.join(parts) + '.'
+
+
+def _apply_chunk(ids, to_status, user, source, notify, result):
+    with transaction.atomic():
+        rows = list(
+            Appointment.objects.select_for_update(of=('self',))
+            .select_related('doctor', 'patient_user', 'patient_profile__user')
+            .filter(pk__in=ids)
+        )
+        moving = []
+        for appointment in rows:
+            if appointment.status == to_status:
+                result.unchanged += 1
+            elif can_transition(appointment.status, to_status):
+                moving.append(appointment)
+            else:
+                result.rejected += 1
+        if not moving:
+            return
+
+        Appointment.objects.filter(pk__in=[a.pk for a in moving]).update(status=to_status)
+        now = timezone.now()
+        AppointmentStatusChange.objects.bulk_create([
+            AppointmentStatusChange(
+                appointment=a, from_code=CODES[a.status], to_code=CODES[to_status], changed_by=user, source=source, at=now,
+            )
+            for a in moving
+        ])
+        stats.appointments_moved([(a.status, a.appointment_date) for a in moving], to_status)
+        for appointment in moving:
+            appointment.status = appointment._loaded_status = to_status
+        if notify:
+            result.notified += notifications.queue_status_notifications(moving)
+        result.changed += len(moving)
+
+
+def apply(queryset, to_status, user=None, source=AppointmentStatusChange.SOURCE_ADMIN, notify=True,
+          chunk_size=CHUNK_SIZE):
+    """Move every appointment in `queryset` to `to_status`; returns a `TransitionResult`."""
+    if to_status not in ALLOWED:
+        raise ValueError(f'Unknown appointment status: {to_status}')
+    result = TransitionResult(status=to_status)
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    while True:
+        chunk = list(ids.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return result
+        _apply_chunk(chunk, to_status, user, source, notify, result)
+        last_pk = chunk[-1]
+
+
+def transition(appointment, to_status, user=None, source=AppointmentStatusChange.SOURCE_ADMIN, notify=True):
+    """Move one appointment; raises `InvalidTransition` if its current status does not allow it."""
+    result = apply(Appointment.objects.filter(pk=appointment.pk), to_status, user, source, notify)
+    if result.rejected:
+        current = Appointment.objects.values_list('status', flat=True).get(pk=appointment.pk)
+        raise InvalidTransition(current, to_status)
+    appointment.status = appointment._loaded_status = to_status
+    return result
+
+
+def record_created(appointment, source=AppointmentStatusChange.SOURCE_BOOKING, user=None):
+    """Open the appointment's timeline with its initial status."""
+    AppointmentStatusChange.objects.create(
+        appointment=appointment, from_code=AppointmentStatusChange.CODE_NEW, to_code=CODES[appointment.status],
+        changed_by=user, source=source, at=appointment.created_at or timezone.now(),
+    )
+
+
+def daily_throughput(start, end):
+    """
+    {day: {status: count}} of moves into each status per day between `start` and
+    `end` (dates, inclusive); bookings are counted under 'booked'.
+    """
+    tz = timezone.get_current_timezone()
+    rows = (
+        AppointmentStatusChange.objects
+        .filter(at__gte=datetime.datetime.combine(start, datetime.time.min, tz),
+                at__lt=datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min, tz))
+        .annotate(day=TruncDate('at', tzinfo=tz))
+        .values_list('day', 'from_code', 'to_code')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    days = defaultdict(lambda: defaultdict(int))
+    for day, from_code, to_code, n in rows:
+        key = 'booked' if from_code == AppointmentStatusChange.CODE_NEW else AppointmentStatusChange.CODE_STATUSES[to_code]
+        days[day][key] += n
+    return {day: dict(counts) for day, counts in sorted(days.items())}
@@ -0,0 +1,113 @@
+"""
+Symptom triage.
+
+The rule tables (`Symptom`, `Department`, `TriageRule`) are compiled into
+a `CompiledTriage`: each active symptom gets a bit, and each bit maps to the
+(department, weight) pairs it contributes. A selection of symptoms is a
+single integer bitset, so ranking costs one pass over the selected
+symptoms' rules however large the rule set is, and results are memoized per
+bitset. The compiled table lives in process memory and is rebuilt when the
+triage, service or doctor cache groups change version (see
+`medifiti.caching`), so admin edits apply on the next request.
+"""
+from collections import namedtuple
+
+from . import caching
+from .models import Department, Doctor, Symptom, TriageRule
+
+GROUPS = [caching.TRIAGE, caching.SERVICES, caching.DOCTORS]
+MEMO_SIZE = 4096
+
+DoctorLink = namedtuple('DoctorLink', 'id name specialty')
+Recommendation = namedtuple('Recommendation', 'department score doctors')
+
+
+class CompiledTriage:
+    def __init__(self, symptoms, rules, departments, doctors):
+        # [(key, label)] in bit order
+        self.symptoms = symptoms
+        self.bits = {key: 1 << index for index, (key, _label) in enumerate(symptoms)}
+        # per bit position: ((department index, weight), ...)
+        self.rules = rules
+        self.departments = departments
+        # per department index: (DoctorLink, ...)
+        self.doctors = doctors
+        self._memo = {}
+
+    def bitset(self, keys):
+        bits = 0
+        for key in keys:
+            bits |= self.bits.get(key, 0)
+        return bits
+
+    def rank(self, bits):
+        """Recommendations for a symptom bitset, highest score first."""
+        ranked = self._memo.get(bits)
+        if ranked is None:
+            scores = {}
+            position = 0
+            remaining = bits
+            while remaining:
+                if remaining & 1:
+                    for department, weight in self.rules[position]:
+                        scores[department] = scores.get(department, 0) + weight
+                remaining >>= 1
+                position += 1
+            ranked = tuple(
+                Recommendation(self.departments[department], score, self.doctors[department])
+                for department, score in sorted(scores.items(), key=lambda item: (-item[1], self.departments[item[0]]))
+            )
+            if len(self._memo) >= MEMO_SIZE:
+                self._memo.clear()
+            self._memo[bits] = ranked
+        return ranked
+
+    def recommend(self, keys):
+        return self.rank(self.bitset(keys))
+
+
+def compile_rules():
+    """Build a `CompiledTriage` from the database (four queries)."""
+    symptoms = list(Symptom.objects.filter(active=True).values_list('id', 'key', 'label'))
+    position = {symptom_id: index for index, (symptom_id, _key, _label) in enumerate(symptoms)}
+
+    departments = list(Department.objects.values_list('id', 'name', 'service_id'))
+    department_index = {department_id: index for index, (department_id, _name, _service) in enumerate(departments)}
+
+    rules = [[] for _symptom in symptoms]
+    for symptom_id, department_id, weight in TriageRule.objects.values_list('symptom_id', 'department_id', 'weight'):
+        if symptom_id in position and weight:
+            rules[position[symptom_id]].append((department_index[department_id], weight))
+
+    service_ids = {service_id for _id, _name, service_id in departments if service_id}
+    by_service = {}
+    doctor_rows = (
+        Doctor.objects.filter(services__in=service_ids, services__active=True)
+        .order_by('name', 'id')
+        .values_list('services', 'id', 'name', 'specialty')
+    )
+    for service_id, doctor_id, name, specialty in doctor_rows:
+        by_service.setdefault(service_id, []).append(DoctorLink(doctor_id, name, specialty))
+
+    return CompiledTriage(
+        symptoms=[(key, label) for _id, key, label in symptoms],
+        rules=[tuple(symptom_rules) for symptom_rules in rules],
+        departments=[name for _id, name, _service in departments],
+        doctors=[tuple(by_service.get(service_id, ())) for _id, _name, service_id in departments],
+    )
+
+
+_compiled = (None, None)
+
+
+def engine():
+    """The compiled triage table, rebuilt when any of its source groups changed."""
+    global _compiled
+    version = tuple(caching.versions(GROUPS))
+    if _compiled[0] != version:
+        _compiled = (version, compile_rules())
+    return _compiled[1]
+
+
+def recommend(keys):
+    return engine().recommend(keys)
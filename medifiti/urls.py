@@ -10,6 +10,9 @@ urlpatterns = [
 
     # moved app admin utilities under `manage/` to avoid collision with Django admin
     path('manage/export/patients/csv/', views.export_patients_csv, name='export_patients_csv'),
+    path('manage/export/jobs/', views.export_jobs, name='export_jobs'),
+    path('manage/export/jobs/<int:pk>/download/', views.export_job_download, name='export_job_download'),
+    path('manage/export/<slug:dataset>/', views.export_dataset, name='export_dataset'),
     path('manage/contacts/<int:id>/', views.contact_detail, name='contact_detail'),
     path('manage/contacts/<int:id>/delete/', views.delete_contact, name='delete_contact'),
     path('manage/facility/', views.edit_facility, name='edit_facility'),
@@ -29,6 +32,7 @@ urlpatterns = [
     path('accounts/logout/', RedirectView.as_view(url='/logout/', permanent=False)),
 
     path('services/', views.services, name='services'),
+    path('search/', views.site_search, name='search'),
     path('services/<slug:slug>/', views.service_detail, name='service_detail'),
     path('doctors/', views.doctors, name='doctors'),
     path('departments/', views.departments, name='departments'),
@@ -36,10 +40,15 @@ urlpatterns = [
     # Appointment booking
     path('book-appointment/<int:doctor_id>/', views.book_appointment, name='book_appointment'),
     path('appointment/', views.book_appointment, name='appointment'),
+    path('appointment/slots/', views.free_slots, name='free_slots'),
     path('admin_appointments/', views.admin_appointments, name='admin_appointments'),
 
     # Patient management + admin routes
     path('add/', views.create_patient, name='create_patient'),
+    path('manage/patients/import/', views.import_patients, name='import_patients'),
+    path('manage/patients/lookup/', views.lookup_patients, name='patient_lookup'),
+    path('manage/reports/rollups/', views.rollup_report, name='rollup_report'),
+    path('api/lab/samples/status/', views.lab_status_updates, name='lab_status_updates'),
     path('update/<int:id>/', views.update_patient, name='update_patient'),
     path('delete/<int:id>/', views.delete_patient, name='delete_patient'),
     path('admin_dashboard/', views.admin_dashboard, name='admin_dashboard'),
@@ -48,9 +57,12 @@ urlpatterns = [
     # Authentication + dashboards
     path('register/', views.register, name='register'),
     path('login/', views.login_user, name='login'),
+    path('verify-email/<uidb64>/<token>/', views.verify_email, name='verify_email'),
+    path('verify-email/resend/', views.resend_verification, name='resend_verification'),
     path('profile/', views.profile, name='profile'),
     path('logout/', views.logout_user, name='logout'),
     path('doctor-dashboard/', views.doctor_dashboard, name='doctor_dashboard'),
+    path('doctor-dashboard/history/', views.doctor_appointment_history, name='doctor_appointment_history'),
     path('patient-dashboard/', views.patient_dashboard, name='patient_dashboard'),
     path('doctor/profile/', views.doctor_profile, name='doctor_profile'),
 
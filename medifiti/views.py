@@ -1,13 +1,13 @@
 # python
+import datetime
+import json
+import os
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.template.loader import render_to_string
-from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
 from django.contrib import messages
-from django.db.models import Q
 
-import csv
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 
@@ -15,26 +15,40 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 
 from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date, parse_time
+from django.utils.http import urlsafe_base64_decode
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout, update_session_auth_hash
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, PasswordChangeForm
 from django.contrib.auth.decorators import login_required
 
+from . import (
+    availability, booking, caching, conditional, exports, forecasting, identity, imports, lab, patient_lookup, rollups,
+    schedules, search, stats, triage,
+)
 from .decorators import admin_required, doctor_required, patient_required
+from .pagination import keyset_page
 from .models import (
-    CustomUser, Contact, Doctor, Appointment, Service, LabSample,
-    Patient, PatientProfile, Facility,
+    CustomUser, Contact, Doctor, Appointment, Service,
+    Patient, PatientProfile, Facility, ExportJob, DailyRollup,
 )
 from .forms import (
-    PatientForm, AppointmentForm, PatientProfileForm, DoctorProfileForm, FacilityForm,
+    PatientForm, AppointmentForm, PatientProfileForm, DoctorProfileForm, FacilityForm, PatientImportForm,
 )
 
 
 # --- Public pages ---
+@caching.cached_page(caching.SERVICES, caching.FACILITY)
 def index(request):
-    services_qs = Service.objects.filter(active=True).order_by('-created_at')[:6]
-    facility = Facility.objects.first()  # returns None if not created
-    return render(request, 'index.html', {'services': services_qs, 'facility': facility})
+    facilities = caching.facilities()
+    return render(request, 'index.html', {
+        'services': caching.newest_services(),
+        'facility': facilities[0] if facilities else None,
+    })
 
 
 @admin_required
@@ -52,36 +66,48 @@ def delete_contact(request, id):
     messages.success(request, 'Contact message deleted.')
     return redirect('admin_dashboard')
 
+@conditional.conditional(conditional.services_stamp)
+@caching.cached_page(caching.SERVICES)
 def services(request):
-    services_qs = Service.objects.filter(active=True).order_by('-updated_at')
-    return render(request, 'services.html', {'services': services_qs})
-
-
+    return render(request, 'services.html', {'services': caching.active_services()})
+
+
+def _triage(request, slug):
+    """(symptom options, summary message, ranked recommendations) for the triage form."""
+    if slug != 'general-consultation':
+        return [], None, []
+    rules = triage.engine()
+    if request.method != 'POST' or not request.POST.get('triage_submit'):
+        return rules.symptoms, None, []
+    recommendations = rules.recommend(request.POST.getlist('symptoms'))
+    if not recommendations:
+        return rules.symptoms, 'No symptoms selected; please select at least one symptom.', []
+    summary = 'Recommended departments: ' + ', '.join(rec.department for rec in recommendations)
+    return rules.symptoms, summary, recommendations
+
+
+def _lab_sample_result(sample_id):
+    """(public sample data or None, one-line summary) for the lab tracking box."""
+    sample_id = (sample_id or '').strip()
+    if not sample_id:
+        return None, None
+    sample = lab.lookup(sample_id)
+    if sample is None:
+        return None, f'No tracking record found for sample id "{sample_id}".'
+    return sample, f"Sample {sample['sample_id']}: status={sample['status']}. Notes: {sample['notes']}"
+
+
+@conditional.conditional(conditional.service_stamp, detail=True, csrf=True, groups=[caching.TRIAGE])
 def service_detail(request, slug):
     service_obj = Service.objects.filter(slug=slug, active=True).first()
     sample_result = None
+    sample = None
 
     if service_obj:
-        triage_options = [
-            ('respiratory', 'Fever, cough, sore throat', 'Respiratory / General Physician'),
-            ('dental', 'Tooth pain or bleeding gums', 'Dentistry'),
-            ('cardiac', 'Chest pain or shortness of breath', 'Cardiology / Emergency'),
-            ('abdominal', 'Abdominal pain, nausea', 'General Surgery / Gastroenterology'),
-        ]
-        triage_result = None
-        if request.method == 'POST' and slug == 'general-consultation' and request.POST.get('triage_submit'):
-            selected = request.POST.getlist('symptoms')
-            depts = [dept for key, label, dept in triage_options if key in selected]
-            triage_result = ('Recommended departments: ' + ', '.join(sorted(set(depts)))) if depts else 'No symptoms selected; please select at least one symptom.'
+        triage_options, triage_result, recommendations = _triage(request, slug)
 
         if request.method == 'POST' and slug == 'lab-services':
-            sample_id = (request.POST.get('sample_id') or '').strip()
-            if sample_id:
-                try:
-                    sample = LabSample.objects.get(sample_id__iexact=sample_id)
-                    sample_result = f'Sample {sample.sample_id}: status={sample.status}. Notes: {sample.notes}'
-                except LabSample.DoesNotExist:
-                    sample_result = f'No tracking record found for sample id "{sample_id}".'
+            sample, sample_result = _lab_sample_result(request.POST.get('sample_id'))
 
         context = {
             'service': {
@@ -92,8 +118,10 @@ def service_detail(request, slug):
             'service_obj': service_obj,
             'slug': slug,
             'sample_result': sample_result,
+            'sample': sample,
             'triage_options': triage_options,
             'triage_result': triage_result,
+            'recommendations': recommendations,
         }
         return render(request, 'service_detail.html', context)
 
@@ -137,18 +165,22 @@ def service_detail(request, slug):
         return render(request, 'services.html', {'error': 'Service not found.'})
 
     if request.method == 'POST' and slug == 'lab-services':
-        sample_id = (request.POST.get('sample_id') or '').strip()
-        if sample_id:
-            sample_result = f'No tracking record found for sample id "{sample_id}" (placeholder).'
+        sample, sample_result = _lab_sample_result(request.POST.get('sample_id'))
+    triage_options, triage_result, recommendations = _triage(request, slug)
 
     context = {
         'service': svc,
         'sample_result': sample_result,
+        'sample': sample,
+        'triage_options': triage_options,
+        'triage_result': triage_result,
+        'recommendations': recommendations,
         'slug': slug,
     }
     return render(request, 'service_detail.html', context)
 
 
+@caching.cached_page()
 def about(request):
     return render(request, 'about.html')
 
@@ -160,31 +192,8 @@ def contact(request):
         message = request.POST.get('message')
 
         if full_name and email and message:
-            contact = Contact.objects.create(full_name=full_name, email=email, message=message)
-
-            subject = f"New contact message from {contact.full_name}"
-            context = {'contact': contact}
-            text_content = render_to_string('emails/contact_admin.txt', context)
-            html_content = render_to_string('emails/contact_admin.html', context)
-            recipients = [email for (_name, email) in getattr(settings, 'ADMINS', [])]
-            if recipients:
-                try:
-                    msg = EmailMultiAlternatives(subject, text_content, settings.DEFAULT_FROM_EMAIL, recipients)
-                    msg.attach_alternative(html_content, 'text/html')
-                    msg.send(fail_silently=True)
-                except Exception:
-                    pass
-
-            try:
-                user_subject = 'Thanks for contacting HospitalCare'
-                user_ctx = {'contact': contact}
-                user_text = render_to_string('emails/contact_user.txt', user_ctx)
-                user_html = render_to_string('emails/contact_user.html', user_ctx)
-                user_msg = EmailMultiAlternatives(user_subject, user_text, settings.DEFAULT_FROM_EMAIL, [contact.email])
-                user_msg.attach_alternative(user_html, 'text/html')
-                user_msg.send(fail_silently=True)
-            except Exception:
-                pass
+            # admin and confirmation emails are queued by the Contact post_save signal
+            Contact.objects.create(full_name=full_name, email=email, message=message)
 
             messages.success(request, 'Thank you for your message! We will get back to you soon.')
             return render(request, 'contact.html')
@@ -194,15 +203,27 @@ def contact(request):
     return render(request, 'contact.html')
 
 
+@conditional.conditional(conditional.doctors_stamp)
+@caching.cached_page(caching.DOCTORS)
 def doctors(request):
-    doctors_qs = Doctor.objects.all()
-    return render(request, 'doctors.html', {'doctors': doctors_qs})
+    return render(request, 'doctors.html', {'doctors': caching.doctor_list()})
 
 
+@caching.cached_page()
 def departments(request):
     return render(request, 'departments.html')
 
 
+def site_search(request):
+    query = (request.GET.get('q') or '').strip()
+    hits = search.search(query) if query else []
+    return render(request, 'search.html', {
+        'query': query,
+        'doctor_hits': [hit.obj for hit in hits if hit.kind == search.DOCTOR],
+        'service_hits': [hit.obj for hit in hits if hit.kind == search.SERVICE],
+    })
+
+
 # --- Appointment booking ---
 def book_appointment(request, doctor_id=None):
     doctor = None
@@ -219,15 +240,30 @@ def book_appointment(request, doctor_id=None):
             reason = request.POST.get('reason')
 
             if all([patient_name, patient_email, patient_phone, appointment_date, appointment_time, reason]):
-                Appointment.objects.create(
-                    doctor=doctor,
-                    patient_name=patient_name,
-                    patient_email=patient_email,
-                    patient_phone=patient_phone,
-                    appointment_date=appointment_date,
-                    appointment_time=appointment_time,
-                    reason=reason
-                )
+                try:
+                    parsed_date = parse_date(appointment_date)
+                    parsed_time = parse_time(appointment_time)
+                except ValueError:
+                    parsed_date = parsed_time = None
+                if not (parsed_date and parsed_time):
+                    messages.error(request, 'Please enter a valid appointment date and time.')
+                    return render(request, 'book_appointment.html', {'doctor': doctor})
+                try:
+                    booking.book(Appointment(
+                        doctor=doctor,
+                        patient_name=patient_name,
+                        patient_email=patient_email,
+                        patient_phone=patient_phone,
+                        appointment_date=parsed_date,
+                        appointment_time=parsed_time,
+                        reason=reason
+                    ))
+                except booking.SlotUnavailable as exc:
+                    messages.error(request, exc.message)
+                    return render(request, 'book_appointment.html', {
+                        'doctor': doctor,
+                        'free_slots': availability.doctor_free_slots(doctor),
+                    })
                 messages.success(request, 'Your appointment has been booked successfully! We will confirm it shortly.')
                 return redirect('doctors')
             else:
@@ -236,17 +272,63 @@ def book_appointment(request, doctor_id=None):
         else:
             form = AppointmentForm(request.POST)
             if form.is_valid():
-                form.save()
-                messages.success(request, 'Your appointment has been booked successfully!')
-                return redirect('index')
+                try:
+                    form.save()
+                except booking.SlotUnavailable as exc:
+                    form.add_error(None, exc.message)
+                else:
+                    messages.success(request, 'Your appointment has been booked successfully!')
+                    return redirect('index')
             return render(request, 'appointment.html', {'form': form})
     else:
         if doctor:
-            return render(request, 'book_appointment.html', {'doctor': doctor})
+            return render(request, 'book_appointment.html', {
+                'doctor': doctor,
+                'free_slots': availability.doctor_free_slots(doctor),
+            })
         form = AppointmentForm()
         return render(request, 'appointment.html', {'form': form})
 
 
+def free_slots(request):
+    """
+    JSON list of the next free appointment slots for `?doctor=<id>` or `?specialty=<name>`.
+    """
+    try:
+        count = min(max(int(request.GET.get('count', 5)), 1), 50)
+    except ValueError:
+        count = 5
+
+    doctor_id = request.GET.get('doctor')
+    specialty = (request.GET.get('specialty') or '').strip()
+    if doctor_id and not doctor_id.isdigit():
+        return JsonResponse({'error': 'doctor must be a numeric id.'}, status=400)
+    if doctor_id:
+        doctor = get_object_or_404(Doctor, id=doctor_id)
+        slots = availability.doctor_free_slots(doctor, count=count, forecasts=True)
+    elif specialty:
+        slots = availability.specialty_free_slots(specialty, count=count, forecasts=True)
+    else:
+        return JsonResponse({'error': 'Provide a doctor or specialty.'}, status=400)
+
+    return JsonResponse({
+        'slot_minutes': availability.slot_minutes(),
+        'slots': [
+            {
+                'doctor_id': slot.doctor.id,
+                'doctor': slot.doctor.name,
+                'specialty': slot.doctor.specialty,
+                'date': slot.date.isoformat(),
+                'time': slot.time.strftime('%H:%M'),
+                'expected_bookings': round(slot.forecast.expected_bookings, 2) if slot.forecast else None,
+                'no_show_rate': round(slot.forecast.no_show_rate, 3) if slot.forecast else None,
+                'overbook': forecasting.should_overbook(slot.forecast),
+            }
+            for slot in slots
+        ],
+    })
+
+
 # --- Authentication & Dashboards ---
 class CustomUserCreationForm(UserCreationForm):
     class Meta:
@@ -262,6 +344,9 @@ def register(request):
         if form.is_valid():
             user = form.save()
             auth_login(request, user)
+            if identity.send_verification(user, request):
+                messages.info(request, f'We sent a confirmation link to {user.email}. '
+                                       'Earlier bookings under that address appear once it is confirmed.')
             if user.role == CustomUser.ROLE_ADMIN:
                 return redirect('admin_dashboard')
             elif user.role == CustomUser.ROLE_DOCTOR:
@@ -273,6 +358,30 @@ def register(request):
     return render(request, 'register.html', {'form': form})
 
 
+def verify_email(request, uidb64, token):
+    """Target of the emailed confirmation link."""
+    try:
+        user = CustomUser.objects.get(pk=urlsafe_base64_decode(uidb64).decode())
+    except (ValueError, CustomUser.DoesNotExist):
+        user = None
+    if user is not None and identity.verify_email(user, token):
+        messages.success(request, 'Your email address is confirmed.')
+    elif user is not None and user.email_verified:
+        messages.info(request, 'Your email address is already confirmed.')
+    else:
+        messages.error(request, 'This confirmation link is invalid or has expired, '
+                                'or the address is already confirmed by another account.')
+    return redirect('dashboard' if request.user.is_authenticated else 'login')
+
+
+@login_required
+@require_POST
+def resend_verification(request):
+    if identity.send_verification(request.user, request):
+        messages.info(request, f'We sent a new confirmation link to {request.user.email}.')
+    return redirect('dashboard')
+
+
 def login_user(request):
     # kept name `login_user` so it matches `medifiti/urls.py`; uses `auth_login` to avoid name clash
     if request.user.is_authenticated:
@@ -296,11 +405,19 @@ def logout_user(request):
     return redirect('index')
 
 
+RECENT_PER_PAGE = 10
+
+
+def _next_page_query(request, param, cursor):
+    if not cursor:
+        return ''
+    query = request.GET.copy()
+    query[param] = cursor
+    return query.urlencode()
+
+
 @admin_required
 def admin_dashboard(request):
-    contacts = Contact.objects.all().order_by('-created_at')
-    patients = Patient.objects.all()
-
     if request.method == 'POST':
         admin = request.user
         admin.notification_email = request.POST.get('notification_email', admin.notification_email)
@@ -309,9 +426,20 @@ def admin_dashboard(request):
         messages.success(request, 'Notification settings updated!')
         return redirect('admin_dashboard')
 
+    patients = keyset_page(
+        Patient.objects.all(), ('created_at', 'id'),
+        cursor=request.GET.get('patients_cursor'), per_page=RECENT_PER_PAGE,
+    )
+    contacts = keyset_page(
+        Contact.objects.all(), ('created_at', 'id'),
+        cursor=request.GET.get('contacts_cursor'), per_page=RECENT_PER_PAGE,
+    )
     context = {
-        'contacts': contacts,
-        'patients': patients,
+        'counts': stats.dashboard_counts(),
+        'contacts': contacts.items,
+        'patients': patients.items,
+        'patients_next_query': _next_page_query(request, 'patients_cursor', patients.next_cursor),
+        'contacts_next_query': _next_page_query(request, 'contacts_cursor', contacts.next_cursor),
         'admin': request.user,
     }
     return render(request, 'admin_dashboard.html', context)
@@ -319,16 +447,28 @@ def admin_dashboard(request):
 
 @doctor_required
 def doctor_dashboard(request):
-    doctor_obj, _ = Doctor.objects.get_or_create(user=request.user, defaults={'name': request.user.get_full_name() or request.user.username})
-    # Prefetch patient profiles to avoid N+1 and include patient_user
-    appointments = Appointment.objects.filter(doctor=doctor_obj).select_related('patient_user', 'patient_profile').order_by('appointment_date', 'appointment_time')
+    doctor_obj = schedules.doctor_for_user(request.user)
     return render(request, 'doctor_dashboard.html', {
         'doctor': doctor_obj,
-        'appointments': appointments,
+        'appointments': schedules.upcoming(doctor_obj),
+        'upcoming_days': schedules.UPCOMING_DAYS,
+    })
+
+
+@doctor_required
+def doctor_appointment_history(request):
+    doctor_obj = schedules.doctor_for_user(request.user)
+    page = schedules.history_page(doctor_obj, cursor=request.GET.get('cursor'))
+    return render(request, 'doctor_history.html', {
+        'doctor': doctor_obj,
+        'appointments': page.items,
+        'next_query': _next_page_query(request, 'cursor', page.next_cursor),
     })
+
+
 @doctor_required
 def doctor_profile(request):
-    doctor_obj, created = Doctor.objects.get_or_create(user=request.user, defaults={'name': request.user.get_full_name() or request.user.username})
+    doctor_obj = schedules.doctor_for_user(request.user)
     if request.method == 'POST':
         form = DoctorProfileForm(request.POST, request.FILES, instance=doctor_obj)
         if form.is_valid():
@@ -342,7 +482,7 @@ def doctor_profile(request):
     return render(request, 'doctor_profile.html', {'form': form, 'doctor': doctor_obj})
 @patient_required
 def patient_dashboard(request):
-    user_appointments = Appointment.objects.filter(Q(patient_email=request.user.email) | Q(patient_user=request.user) | Q(patient_profile__user=request.user)).distinct()
+    user_appointments = Appointment.objects.filter(patient_key=request.user.identity_key).select_related('doctor')
     services_qs = Service.objects.all()
     return render(request, 'patient_dashboard.html', {'appointments': user_appointments, 'services': services_qs})
 
@@ -359,6 +499,81 @@ def create_patient(request):
     return render(request, 'patient_form.html', {'form': form})
 
 
+@admin_required
+def lookup_patients(request):
+    """
+    Typeahead for reception: top matches by name, email or phone prefix
+    across patient records and registered patients, as JSON.
+    """
+    try:
+        limit = int(request.GET.get('limit', patient_lookup.TOP_K))
+    except ValueError:
+        limit = patient_lookup.TOP_K
+    matches = patient_lookup.lookup(request.GET.get('q', ''), limit=limit)
+    return JsonResponse({'results': [patient_lookup.as_json(match) for match in matches]})
+
+
+@admin_required
+def rollup_report(request):
+    """
+    Report series for charts as JSON, read only from the daily rollups:
+    `?metric=appointments&dimension=doctor&period=week&start=YYYY-MM-DD&end=YYYY-MM-DD`.
+    """
+    metric = request.GET.get('metric', DailyRollup.METRIC_APPOINTMENTS)
+    dimension = request.GET.get('dimension', DailyRollup.DIMENSION_TOTAL)
+    period = request.GET.get('period', 'day')
+    if metric not in dict(DailyRollup.METRIC_CHOICES) or dimension not in dict(DailyRollup.DIMENSION_CHOICES) \
+            or period not in rollups.PERIODS:
+        return JsonResponse({'error': 'unknown metric, dimension or period'}, status=400)
+    end = _date_param(request, 'end') or timezone.localdate()
+    start = _date_param(request, 'start') or end - datetime.timedelta(days=rollups.DEFAULT_DAYS - 1)
+    data = rollups.series(metric, dimension, start, end, period, keys=request.GET.getlist('key'))
+    names = rollups.labels(dimension, data)
+    return JsonResponse({
+        'metric': metric,
+        'dimension': dimension,
+        'period': period,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'series': [
+            {'key': key, 'label': names[key], 'points': [[when.isoformat(), n] for when, n in points]}
+            for key, points in data.items()
+        ],
+    })
+
+
+@admin_required
+def import_patients(request):
+    """
+    Upload a CSV/NDJSON file of legacy patient records and show the import report.
+    """
+    result = None
+    if request.method == 'POST':
+        form = PatientImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                result = imports.import_patients(
+                    request.FILES['file'], form.cleaned_data['format'], dry_run=form.cleaned_data['dry_run'],
+                )
+            except imports.InvalidFile as exc:
+                result = exc.result
+                form.add_error('file', exc.message)
+                if result.created and not form.cleaned_data['dry_run']:
+                    messages.warning(request, f'{result.created} patient(s) before the unreadable part were imported.')
+            else:
+                if form.cleaned_data['dry_run']:
+                    messages.info(request, f'Dry run: {result.created} patient(s) would be imported.')
+                else:
+                    messages.success(request, f'Imported {result.created} patient(s).')
+    else:
+        form = PatientImportForm()
+    return render(request, 'patient_import.html', {
+        'form': form,
+        'result': result,
+        'errors': result.errors[:200] if result else [],
+    })
+
+
 def update_patient(request, id):
     patient = get_object_or_404(Patient, id=id)
     if request.method == "POST":
@@ -378,10 +593,55 @@ def delete_patient(request, id):
 
 
 # --- Admin appointments listing ---
+APPOINTMENTS_PER_PAGE = 50
+
+
+def _date_param(request, name):
+    try:
+        return parse_date(request.GET.get(name) or '')
+    except ValueError:
+        return None
+
+
 @admin_required
 def admin_appointments(request):
-    appointments = Appointment.objects.all().order_by('-appointment_date', '-appointment_time')
-    return render(request, 'admin_appointments.html', {'appointments': appointments})
+    """
+    Appointments newest first, filtered by status, doctor and date range, paged by
+    keyset cursor on (appointment_date, appointment_time, id).
+    """
+    appointments = Appointment.objects.select_related('doctor', 'patient_user', 'patient_profile__user')
+
+    status = request.GET.get('status', '')
+    doctor_id = request.GET.get('doctor', '')
+    date_from = _date_param(request, 'date_from')
+    date_to = _date_param(request, 'date_to')
+
+    if status in dict(Appointment.STATUS_CHOICES):
+        appointments = appointments.filter(status=status)
+    if doctor_id.isdigit():
+        appointments = appointments.filter(doctor_id=doctor_id)
+    if date_from:
+        appointments = appointments.filter(appointment_date__gte=date_from)
+    if date_to:
+        appointments = appointments.filter(appointment_date__lte=date_to)
+
+    page = keyset_page(
+        appointments, ('appointment_date', 'appointment_time', 'id'),
+        cursor=request.GET.get('cursor'), per_page=APPOINTMENTS_PER_PAGE,
+    )
+    next_query = _next_page_query(request, 'cursor', page.next_cursor)
+    first_query = request.GET.copy()
+    first_query.pop('cursor', None)
+
+    return render(request, 'admin_appointments.html', {
+        'appointments': page.items,
+        'next_query': next_query,
+        'first_query': first_query.urlencode(),
+        'is_first_page': not request.GET.get('cursor'),
+        'doctors': Doctor.objects.order_by('name').values_list('id', 'name'),
+        'status_choices': Appointment.STATUS_CHOICES,
+        'filters': {'status': status, 'doctor': doctor_id, 'date_from': date_from, 'date_to': date_to},
+    })
 
 
 # --- Patient profile & account views ---
@@ -401,11 +661,11 @@ def profile(request):
 
 @login_required
 def appointments(request):
-    appointments_qs = Appointment.objects.filter(
-        Q(patient_user=request.user) |
-        Q(patient_profile__user=request.user) |
-        Q(patient_email__iexact=(request.user.email or ''))
-    ).distinct().order_by('-appointment_date', '-appointment_time')
+    appointments_qs = (
+        Appointment.objects.filter(patient_key=request.user.identity_key)
+        .select_related('doctor', 'patient_user', 'patient_profile__user')
+        .order_by('-appointment_date', '-appointment_time')
+    )
     return render(request, 'appointments.html', {'appointments': appointments_qs})
 
 
@@ -465,15 +725,23 @@ def facilities_list(request):
     facilities = Facility.objects.all().order_by('-updated_at')
     return render(request, 'facilities.html', {'facilities': facilities})
 
+@conditional.conditional(conditional.facility_stamp, detail=True)
 def facility_detail(request, pk):
     facility = get_object_or_404(Facility, pk=pk)
-    return render(request, 'facility.html', {'facility': facility})
+    return render(request, 'facility.html', {'facility': facility, 'facilities': [facility]})
+
+
+@conditional.conditional(conditional.facilities_stamp)
+@caching.cached_page(caching.FACILITY)
 def facility(request):
     """
-    Public facility page showing the single Facility instance (if any).
+    Public facility page listing the facilities added by the admin.
     """
-    facility = Facility.objects.first()
-    return render(request, 'facility.html', {'facility': facility})
+    facilities = caching.facilities()
+    return render(request, 'facility.html', {
+        'facilities': facilities,
+        'facility': facilities[0] if facilities else None,
+    })
 
 
 @admin_required
@@ -496,13 +764,51 @@ def export_patients_csv(request):
     """
     Export patients as CSV for admin.
     """
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="patients.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['id', 'first_name', 'last_name', 'age', 'email', 'phone_number', 'location', 'created_at'])
-    for p in Patient.objects.all().order_by('-created_at'):
-        writer.writerow([p.id, p.first_name, p.last_name, p.age or '', p.email or '', p.phone_number or '', p.location or '', p.created_at])
-    return response
+    return exports.export_response('patients', 'csv')
+
+
+@admin_required
+def export_dataset(request, dataset):
+    """
+    Stream an export of `dataset` (patients, appointments, contacts) as
+    `?format=csv|ndjson`, gzip-compressed when `?gzip=1`.
+    """
+    format_name = request.GET.get('format', 'csv')
+    if dataset not in exports.DATASETS or format_name not in exports.FORMATS:
+        raise Http404('Unknown export.')
+    return exports.export_response(dataset, format_name, compress=request.GET.get('gzip') == '1')
+
+@admin_required
+def export_jobs(request):
+    """
+    Queue a background export (POST) and list recent export jobs.
+    """
+    if request.method == 'POST':
+        dataset = request.POST.get('dataset')
+        format_name = request.POST.get('format', 'csv')
+        if dataset in exports.DATASETS and format_name in exports.FORMATS:
+            job = ExportJob.objects.create(
+                dataset=dataset, format=format_name,
+                compress=request.POST.get('compress') == '1', requested_by=request.user,
+            )
+            messages.success(request, f'Export #{job.pk} queued. It will be ready for download here once finished.')
+        else:
+            messages.error(request, 'Unknown export.')
+        return redirect('export_jobs')
+
+    return render(request, 'export_jobs.html', {
+        'jobs': ExportJob.objects.select_related('requested_by')[:20],
+        'datasets': sorted(exports.DATASETS),
+        'formats': sorted(exports.FORMATS),
+    })
+
+
+@admin_required
+def export_job_download(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, status=ExportJob.STATUS_DONE)
+    # FileResponse hands the open file to the server's wsgi.file_wrapper (sendfile where available)
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=os.path.basename(job.file.name))
+
 
 @login_required
 def dashboard_redirect(request):
@@ -517,4 +823,33 @@ def dashboard_redirect(request):
     if role == CustomUser.ROLE_DOCTOR:
         return redirect('doctor_dashboard')
     # default for patients and anonymous fallback
-    return redirect('patient_dashboard' if user.is_authenticated else 'index')
\ No newline at end of file
+    return redirect('patient_dashboard' if user.is_authenticated else 'index')
+
+
+@csrf_exempt
+@require_POST
+def lab_status_updates(request):
+    """
+    Bulk status updates pushed by lab instruments.
+
+    Authenticated with `Authorization: Bearer <LAB_API_TOKEN>`. The body is
+    {"updates": [{"sample_id", "status", "notes"?, "recorded_at"?}, ...],
+    "create_missing": false}; the response reports counts and per-item errors.
+    """
+    token = getattr(settings, 'LAB_API_TOKEN', '')
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not token or not constant_time_compare(supplied, token):
+        return JsonResponse({'error': 'invalid or missing token'}, status=403)
+
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'body must be JSON'}, status=400)
+    updates = payload.get('updates') if isinstance(payload, dict) else None
+    if not isinstance(updates, list):
+        return JsonResponse({'error': '"updates" must be a list'}, status=400)
+    if len(updates) > lab.max_batch():
+        return JsonResponse({'error': f'at most {lab.max_batch()} updates per request'}, status=413)
+
+    result = lab.apply_status_updates(updates, create_missing=bool(payload.get('create_missing')))
+    return JsonResponse(result.as_dict())